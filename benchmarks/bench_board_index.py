@@ -0,0 +1,68 @@
+"""
+Micro-benchmark for dot lookups on large boards.
+
+Compares scanning ``GameBoard.dots`` for every cell (what ``draw_path.ts``
+did on each mouse move) with ``BoardIndex`` lookups, and reports the size
+of the stored encoding against the JSON list.
+
+    python -m benchmarks.bench_board_index --size 200 --pairs 500
+"""
+import argparse
+import json
+import random
+
+from benchmarks.common import configure_django, timed
+
+
+def random_dots(size, pairs, seed=1):
+    rng = random.Random(seed)
+    cells = rng.sample(range(size * size), 2 * pairs)
+    return [
+        {"row": cell // size, "col": cell % size, "color": f"#{i // 2:06x}"}
+        for i, cell in enumerate(cells)
+    ]
+
+
+def scan_every_cell(size, dots):
+    for row in range(size):
+        for col in range(size):
+            next((dot for dot in dots if dot["row"] == row and dot["col"] == col), None)
+
+
+def index_every_cell(size, index):
+    for row in range(size):
+        for col in range(size):
+            index.dot_at(row, col)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=100)
+    parser.add_argument("--pairs", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    configure_django()
+    from routes.board_index import BoardIndex
+
+    dots = random_dots(args.size, args.pairs)
+    cells = args.size * args.size
+
+    build = timed(BoardIndex.from_dots, args.size, args.size, dots, repeat=args.repeat)
+    index = BoardIndex.from_dots(args.size, args.size, dots)
+    encoded = index.encode()
+    decode = timed(BoardIndex.decode, args.size, args.size, encoded, repeat=args.repeat)
+    scan = timed(scan_every_cell, args.size, dots, repeat=args.repeat)
+    lookup = timed(index_every_cell, args.size, index, repeat=args.repeat)
+
+    print(f"{args.size}x{args.size} board, {len(dots)} dots")
+    print(f"build index from dots   {build * 1000:9.3f}ms")
+    print(f"decode stored cells     {decode * 1000:9.3f}ms")
+    print(f"scan dots, every cell   {scan / cells * 1e6:9.3f}us/cell")
+    print(f"index, every cell       {lookup / cells * 1e6:9.3f}us/cell  ({scan / lookup:,.0f}x)")
+    print(f"dots JSON               {len(json.dumps(dots)):9,d} bytes")
+    print(f"cells JSON              {len(json.dumps(encoded)):9,d} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Throughput benchmark for media file serving.
+
+Calls the WSGI applications in-process, without a network, and compares
+the previous setup (the full Django stack routing ``/media/`` to the view
+``static()`` installs) with ``FileServingWSGI`` answering before Django.
+Covers whole small and large files, conditional requests (304) and byte
+ranges (206).
+
+    python -m benchmarks.bench_media --requests 2000
+"""
+import argparse
+import io
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.common import configure_django, report
+
+# ROOT_URLCONF while benchmarking the previous setup; filled in by main()
+urlpatterns = []
+
+SIZES = (("small", 8 * 1024), ("large", 4 * 1024 * 1024))
+
+
+def environ(path, **headers):
+    env = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": "",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "HTTP_HOST": "localhost",
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": io.StringIO(),
+    }
+    env.update(("HTTP_" + name.upper(), value) for name, value in headers.items())
+    return env
+
+
+def run(application, env, requests):
+    statuses = []
+
+    def start_response(status, headers):
+        statuses.append(status)
+
+    samples = []
+    size = 0
+    for _ in range(requests):
+        start = time.perf_counter()
+        body = application(dict(env), start_response)
+        try:
+            size = sum(len(chunk) for chunk in body)
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+        samples.append(time.perf_counter() - start)
+    return samples, statuses[-1], size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    configure_django()
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test import override_settings
+    from django.urls import re_path
+    from django.views.static import serve
+
+    from django_project.file_serving import FileServingWSGI
+
+    root = tempfile.mkdtemp()
+    try:
+        for name, size in SIZES:
+            with open(os.path.join(root, f"{name}.png"), "wb") as f:
+                f.write(os.urandom(size))
+        # What static(MEDIA_URL, document_root=MEDIA_ROOT) installs
+        urlpatterns[:] = [re_path(r"^media/(?P<path>.*)$", serve, {"document_root": root})]
+        with override_settings(ROOT_URLCONF=__name__, MEDIA_ROOT=root):
+            django = WSGIHandler()
+            applications = (("static()", django), ("FileServingWSGI", FileServingWSGI(django)))
+            for name, size in SIZES:
+                path = f"/media/{name}.png"
+                cases = (
+                    (f"{name} 200", environ(path)),
+                    (f"{name} 304", environ(path, if_modified_since="Fri, 01 Jan 2100 00:00:00 GMT")),
+                    (f"{name} 206", environ(path, range="bytes=0-1023")),
+                )
+                for case, env in cases:
+                    requests = args.requests if size < 1024 ** 2 else max(args.requests // 10, 1)
+                    for label, application in applications:
+                        samples, status, sent = run(application, env, requests)
+                        total = sum(samples)
+                        report(f"{case} {label}", samples)
+                        print(f"{'':<32} {status}, {sent} bytes, {requests / total:,.0f} req/s")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark for exporting every point of a large route.
+
+Compares peak traced memory and time of the plain point list (one JSON
+document built in memory) with the streamed NDJSON and JSON-array modes.
+
+    python -m benchmarks.bench_route_export --points 200000
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.common import setup_django
+
+
+def consume(response):
+    content = getattr(response, "streaming_content", None)
+    if content is None:
+        return len(response.content)
+    return sum(len(chunk) for chunk in content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--points", type=int, default=200_000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIClient
+    from routes.bulk import insert_points
+    from routes.models import BackgroundImage, Route
+
+    user = User.objects.create_user(username="bench", password="bench")
+    background = BackgroundImage.objects.create(title="Benchmark", image="backgrounds/bench.png")
+    route = Route.objects.create(user=user, background=background)
+    insert_points(route, [(i / args.points, 0.5) for i in range(args.points)], batch_size=5000)
+    client = APIClient()
+    client.force_authenticate(user)
+    url = f"/api/routes/{route.id}/points/"
+    client.get(url)  # build the packed geometry so the plain list is at its fastest
+
+    print(f"route of {args.points} points")
+    for label, params in (("plain list", {}), ("stream ndjson", {"stream": "ndjson"}),
+                          ("stream json", {"stream": "json"})):
+        tracemalloc.start()
+        start = time.perf_counter()
+        size = consume(client.get(url, params))
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {label:<14} {elapsed * 1000:9.1f}ms  {size / 2**20:7.1f} MiB body  "
+              f"peak {peak / 2**20:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark for reading route geometry.
+
+For each route size, compares the per-row path (RoutePoint instances run
+through RoutePointSerializer) with decoding the packed Route.geometry
+blob, reporting best-of latency and peak traced memory.
+
+    python -m benchmarks.bench_route_geometry --sizes 1000 100000 1000000
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.common import setup_django
+
+
+def build_route(user, background, points):
+    from routes.bulk import insert_points
+    from routes.models import Route
+
+    route = Route.objects.create(user=user, background=background, name=f"{points} points")
+    insert_points(route, [(i / points, 1 - i / points) for i in range(points)], batch_size=5000)
+    return route
+
+
+def per_row(route):
+    from routes.serializers import RoutePointSerializer
+
+    return RoutePointSerializer(route.points.order_by("order"), many=True).data
+
+
+def packed(route):
+    from routes.geometry import route_points_data
+
+    return route_points_data(route)
+
+
+def measure(func, route, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(route)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func(route)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from routes.geometry import route_points
+    from routes.models import BackgroundImage, Route
+
+    user = User.objects.create_user(username="bench", password="bench")
+    background = BackgroundImage.objects.create(title="Benchmark", image="backgrounds/bench.png")
+
+    for size in args.sizes:
+        route = build_route(user, background, size)
+        route_points(route)  # build the blob once
+        blob = Route.objects.values_list("geometry", flat=True).get(pk=route.pk)
+        print(f"{size} points, packed blob {len(blob) / 1024:.0f} KiB")
+        for label, func in (("per-row serializer", per_row), ("packed geometry", packed)):
+            best, peak = measure(func, route, args.repeat)
+            print(f"  {label:<20} {best * 1000:10.1f}ms  peak {peak / 2**20:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
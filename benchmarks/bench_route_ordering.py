@@ -0,0 +1,78 @@
+"""
+Benchmark for deleting and moving points on large routes.
+
+Compares the old delete (remove the point, then load the route and save()
+every point whose index changed) with routes.ordering, where a delete or
+a move writes only the affected point.
+
+    python -m benchmarks.bench_route_ordering --points 50000
+"""
+import argparse
+import time
+
+from benchmarks.common import setup_django
+
+
+def build_route(user, background, points):
+    from routes.models import Route, RoutePoint
+    from routes.ordering import next_orders
+
+    route = Route.objects.create(user=user, background=background, name="Benchmark route")
+    RoutePoint.objects.bulk_create(
+        (RoutePoint(route=route, x=i / points, y=0.5, order=order)
+         for i, order in enumerate(next_orders(route, points))),
+        batch_size=1000,
+    )
+    return route
+
+
+def renumbering_delete(point):
+    """The previous RoutePointViewSet.destroy."""
+    route = point.route
+    point.delete()
+    for i, other in enumerate(route.points.all().order_by('order')):
+        if other.order != i:
+            other.order = i
+            other.save()
+
+
+def measure(label, func, *args):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    # The query log is a bounded deque; start each measurement empty
+    connection.queries_log.clear()
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1000:10.1f}ms  {len(queries.captured_queries):>7} queries")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--points", type=int, default=50_000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from routes.models import BackgroundImage
+    from routes.ordering import delete_point, move_point, rebalance
+
+    user = User.objects.create_user(username="bench", password="bench")
+    background = BackgroundImage.objects.create(title="Benchmark", image="backgrounds/bench.png")
+    print(f"route of {args.points} points")
+
+    route = build_route(user, background, args.points)
+    measure("delete first (renumbering)", renumbering_delete, route.points.first())
+
+    route = build_route(user, background, args.points)
+    measure("delete first (sparse keys)", delete_point, route.points.first())
+    measure("move last to front", move_point, route.points.last(), 0)
+    measure("move first to middle", move_point, route.points.first(), args.points // 2)
+    # Only needed once ORDER_STEP moves have landed in the same gap
+    measure("rebalance whole route", rebalance, route)
+
+
+if __name__ == "__main__":
+    main()
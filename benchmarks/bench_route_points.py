@@ -0,0 +1,90 @@
+"""
+Benchmark for route point ingestion through the REST API.
+
+Inserts the same trace into a fresh route twice: one POST per point (the
+single-point RoutePointViewSet.create path), then one bulk POST of the
+whole trace as a JSON array, NDJSON and CSV.
+
+    python -m benchmarks.bench_route_points --points 10000
+"""
+import argparse
+import json
+import math
+import time
+
+from benchmarks.common import setup_django
+
+
+def trace(points):
+    """A spiral of normalised coordinates, like an imported GPS track."""
+    return [
+        {"x": 0.5 + 0.4 * math.cos(i / 50) * i / points,
+         "y": 0.5 + 0.4 * math.sin(i / 50) * i / points}
+        for i in range(points)
+    ]
+
+
+def fresh_route(user, background):
+    from routes.models import Route
+
+    return Route.objects.create(user=user, background=background, name="Benchmark trace")
+
+
+def one_by_one(client, route, points):
+    url = f"/api/routes/{route.id}/points/"
+    for point in points:
+        response = client.post(url, point, format="json")
+        assert response.status_code == 201, response.content
+
+
+def bulk(client, route, body, content_type):
+    url = f"/api/routes/{route.id}/points/"
+    response = client.generic("POST", url, body, content_type=content_type)
+    assert response.status_code == 201, response.content
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--points", type=int, default=10_000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.core.files.base import ContentFile
+    from rest_framework.test import APIClient
+    from routes.models import BackgroundImage
+
+    user = User.objects.create_user(username="bench", password="bench")
+    background = BackgroundImage(title="Benchmark")
+    background.image.save("bench.png", ContentFile(b""), save=True)
+    client = APIClient()
+    client.force_authenticate(user)
+    points = trace(args.points)
+
+    bodies = {
+        "json array": (json.dumps(points), "application/json"),
+        "ndjson": ("\n".join(json.dumps(p) for p in points), "application/x-ndjson"),
+        "csv": ("x,y\n" + "\n".join(f"{p['x']},{p['y']}" for p in points), "text/csv"),
+    }
+
+    route = fresh_route(user, background)
+    start = time.perf_counter()
+    one_by_one(client, route, points)
+    baseline = time.perf_counter() - start
+    print(f"{'one by one':<12} {args.points} points {baseline * 1000:10.1f}ms")
+
+    for label, (body, content_type) in bodies.items():
+        route = fresh_route(user, background)
+        start = time.perf_counter()
+        bulk(client, route, body, content_type)
+        elapsed = time.perf_counter() - start
+        assert route.points.count() == args.points
+        print(
+            f"{label:<12} {args.points} points {elapsed * 1000:10.1f}ms  "
+            f"speedup {baseline / elapsed:6.1f}x"
+        )
+    background.image.delete(save=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark for the fast serialization path of the hot read endpoints.
+
+Times the route detail, the points action and the background list with
+ROUTES_FAST_SERIALIZERS on and off, and checks the bodies are identical.
+
+    python -m benchmarks.bench_serializers --points 100000 --repeat 5
+"""
+import argparse
+import time
+
+from benchmarks.common import report, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--points", type=int, default=100_000)
+    parser.add_argument("--backgrounds", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.test import override_settings
+    from rest_framework.test import APIClient
+    from routes.bulk import insert_points
+    from routes.models import BackgroundImage, Route
+
+    user = User.objects.create_user(username="bench", password="bench")
+    BackgroundImage.objects.bulk_create(
+        BackgroundImage(title=f"Background {i}", image=f"backgrounds/bench-{i}.png")
+        for i in range(args.backgrounds)
+    )
+    background = BackgroundImage.objects.first()
+    route = Route.objects.create(user=user, background=background)
+    insert_points(route, [(i / args.points, (i % 977) / 977) for i in range(args.points)], batch_size=5000)
+    client = APIClient()
+    client.force_authenticate(user)
+    client.get(f"/api/routes/{route.id}/points/")  # build the packed geometry
+
+    print(f"route of {args.points} points, {args.backgrounds} backgrounds")
+    for label, url, params in (
+        ("route detail", f"/api/routes/{route.id}/", {}),
+        ("points", f"/api/routes/{route.id}/points/", {}),
+        ("points zoom 8", f"/api/routes/{route.id}/points/", {"zoom": 8}),
+        ("background list", "/api/backgrounds/", {}),
+    ):
+        bodies = {}
+        for fast in (False, True):
+            samples = []
+            with override_settings(ROUTES_FAST_SERIALIZERS=fast):
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    response = client.get(url, params)
+                    samples.append(time.perf_counter() - start)
+            bodies[fast] = response.content
+            report(f"{label} ({'fast' if fast else 'drf'})", samples)
+        if bodies[True] != bodies[False]:
+            print(f"  MISMATCH: {label} bodies differ")
+
+
+if __name__ == "__main__":
+    main()
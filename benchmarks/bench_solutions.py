@@ -0,0 +1,75 @@
+"""
+Benchmark for server-side solution validation on generated boards.
+
+Each board is a grid whose boustrophedon walk is cut into pairs of dots
+joined by the walk between them, so the generated solution is valid
+and covers every cell. Times ``validate_paths`` with coverage required,
+a submission rejected at its last step, and rebuilding the index from
+the stored encoding.
+
+    python -m benchmarks.bench_solutions --sizes 50 100 200 --repeat 20
+"""
+import argparse
+
+from benchmarks.common import configure_django, report
+
+
+def generate(rows, cols, pairs):
+    walk = [
+        (row, col)
+        for row in range(rows)
+        for col in (range(cols) if row % 2 == 0 else range(cols - 1, -1, -1))
+    ]
+    length = len(walk) // pairs
+    dots, paths = [], {}
+    for i in range(pairs):
+        cells = walk[i * length:(i + 1) * length if i < pairs - 1 else len(walk)]
+        color = f"#{i:06x}"
+        dots += [{"row": r, "col": c, "color": color} for r, c in (cells[0], cells[-1])]
+        paths[color] = [{"row": r, "col": c} for r, c in cells]
+    return dots, paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 100, 200])
+    parser.add_argument("--pairs", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    configure_django()
+    import time
+
+    from routes.board_index import BoardIndex
+    from routes.solutions import validate_paths
+
+    for size in args.sizes:
+        dots, paths = generate(size, size, args.pairs)
+        encoded = BoardIndex.from_dots(size, size, dots).encode()
+        index = BoardIndex.decode(size, size, encoded)
+        # The last path ends one cell short of its dot
+        broken = dict(paths)
+        last = list(paths)[-1]
+        broken[last] = paths[last][:-1]
+
+        result = validate_paths(index, paths, require_coverage=True)
+        assert result.complete and result.covered == size * size, result.errors
+        assert not validate_paths(index, broken).valid
+
+        cases = (
+            ("decode index", lambda: BoardIndex.decode(size, size, encoded)),
+            ("validate complete", lambda: validate_paths(index, paths, require_coverage=True)),
+            ("validate rejected", lambda: validate_paths(index, broken)),
+        )
+        print(f"{size}x{size} board, {args.pairs} pairs, {size * size} path cells")
+        for label, func in cases:
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                func()
+                samples.append(time.perf_counter() - start)
+            report(f"  {label}", samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Micro-benchmark for SSE fan-out encoding.
+
+Compares the original path (every client's stream json.dumps-ing its own
+copy of each message) with the shared path (each message encoded once
+into a frame that all queues reference) for 1k and 10k in-process
+subscribers.
+
+    python -m benchmarks.bench_sse_encoding
+"""
+import argparse
+import json
+from collections import deque
+
+from benchmarks.common import configure_django, timed
+
+
+def board_message(rows=20, cols=20):
+    dots = [
+        {"row": r, "col": c, "color": f"#{(r * cols + c) % 0xFFFFFF:06x}"}
+        for r in range(rows) for c in range(cols) if (r + c) % 4 == 0
+    ]
+    return {
+        "type": "board_updated",
+        "user": "bench",
+        "board_id": 1,
+        "title": "Benchmark board",
+        "rows": rows,
+        "cols": cols,
+        "dots": dots,
+        "updated": "2025-01-01T00:00:00+00:00",
+    }
+
+
+def per_client_path(subscribers, message):
+    """The pre-encoding pipeline: share the dict, encode in every stream."""
+    queues = [deque() for _ in range(subscribers)]
+    for queue in queues:
+        queue.append(message)
+    for queue in queues:
+        for queued in queue:
+            f"event: boardUpdated\ndata: {json.dumps(queued)}\n\n".encode()
+        queue.clear()
+
+
+def shared_frame_path(subscribers, message):
+    from django_project import sse_engine
+
+    sse_engine.clients.clear()
+    queues = [sse_engine.ClientQueue() for _ in range(subscribers)]
+    sse_engine.clients.update(queues)
+    sse_engine.deliver_local([message])
+    for queue in queues:
+        b"".join(event.frame for event in queue.pop_all())
+    sse_engine.clients.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    configure_django()
+    message = board_message()
+    print(f"payload: {len(json.dumps(message))} bytes")
+    for subscribers in (1_000, 10_000):
+        before = timed(per_client_path, subscribers, message, repeat=args.repeat)
+        after = timed(shared_frame_path, subscribers, message, repeat=args.repeat)
+        print(
+            f"{subscribers:>6} subscribers: per-client {before * 1000:8.2f}ms  "
+            f"shared {after * 1000:8.2f}ms  speedup {before / after:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
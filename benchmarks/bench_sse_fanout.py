@@ -0,0 +1,138 @@
+"""
+Load benchmark for the ASGI /events/ stream.
+
+Opens N concurrent subscribers against django_project.asgi.application
+in-process, publishes a series of notifications and reports fan-out
+latency percentiles (publish -> frame handed to the ASGI server) and
+the memory held per open connection.
+
+    python -m benchmarks.bench_sse_fanout --subscribers 1000 --rounds 20
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+
+from benchmarks.common import report, setup_django
+
+
+class Subscriber:
+    def __init__(self, cookie, on_frame):
+        self.cookie = cookie
+        self.on_frame = on_frame
+        self.body_sent = False
+        self.disconnected = asyncio.Event()
+        self.status = None
+
+    def scope(self):
+        return {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/events/",
+            "raw_path": b"/events/",
+            "query_string": b"",
+            "root_path": "",
+            "headers": [
+                (b"host", b"localhost"),
+                (b"cookie", self.cookie.encode()),
+            ],
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        }
+
+    async def receive(self):
+        if not self.body_sent:
+            self.body_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+        elif message.get("body"):
+            self.on_frame(message["body"])
+
+
+async def run(subscribers, rounds):
+    from django.contrib.auth.models import User
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.contrib.auth import SESSION_KEY, BACKEND_SESSION_KEY, HASH_SESSION_KEY
+    from asgiref.sync import sync_to_async
+
+    from django_project.asgi import application
+    from django_project import sse_engine
+
+    def make_session():
+        user = User.objects.create_user(username="bench", password="bench")
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = "django.contrib.auth.backends.ModelBackend"
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return f"sessionid={session.session_key}"
+
+    cookie = await sync_to_async(make_session)()
+
+    latencies = []
+    pending = {"count": 0}
+    round_done = asyncio.Event()
+
+    def on_frame(body):
+        received = time.perf_counter()
+        for frame in body.decode().split("\n\n"):
+            if "event: message" not in frame:
+                continue
+            data = json.loads(frame.split("data: ", 1)[1])
+            latencies.append(received - data["sent"])
+            pending["count"] -= 1
+            if pending["count"] == 0:
+                round_done.set()
+
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    clients = [Subscriber(cookie, on_frame) for _ in range(subscribers)]
+    tasks = [
+        asyncio.create_task(application(c.scope(), c.receive, c.send))
+        for c in clients
+    ]
+    while len(sse_engine.clients) < subscribers:
+        await asyncio.sleep(0.01)
+    connected = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    held = sum(s.size_diff for s in connected.compare_to(baseline, "filename"))
+    print(f"subscribers: {subscribers}")
+    print(f"memory per connection: {held / subscribers / 1024:.1f} KiB")
+
+    for seq in range(rounds):
+        pending["count"] = subscribers
+        round_done.clear()
+        sse_engine.push_notification(
+            {"type": "bench", "seq": seq, "sent": time.perf_counter()}
+        )
+        await asyncio.wait_for(round_done.wait(), 60)
+
+    report("fan-out latency", latencies)
+
+    for c in clients:
+        c.disconnected.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    asyncio.run(run(args.subscribers, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import os
+import statistics
+import time
+
+import django
+
+
+def configure_django():
+    """Load settings and apps for benchmarks that never touch the database."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_project.settings")
+    django.setup()
+
+
+def setup_django():
+    """
+    Configure Django and create a throwaway test database so benchmarks
+    never touch db.sqlite3.
+    """
+    configure_django()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(label, samples, unit="ms", scale=1000.0):
+    """Print a one-line latency summary for a list of samples in seconds."""
+    scaled = [s * scale for s in samples]
+    print(
+        f"{label:<32} n={len(scaled):<7} "
+        f"mean={statistics.fmean(scaled):9.3f}{unit} "
+        f"p50={percentile(scaled, 50):9.3f}{unit} "
+        f"p90={percentile(scaled, 90):9.3f}{unit} "
+        f"p99={percentile(scaled, 99):9.3f}{unit} "
+        f"max={max(scaled):9.3f}{unit}"
+    )
+
+
+def timed(func, *args, repeat=5, **kwargs):
+    """Return the best wall-clock time of ``repeat`` calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
@@ -3,6 +3,11 @@ ASGI config for django_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with any ASGI server (e.g. ``uvicorn django_project.asgi:application``)
+so that ``/events/`` streams run as coroutines instead of holding a worker
+thread per connected browser. Media and collected static files are
+answered by ``django_project.file_serving`` before a request reaches Django.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -13,4 +18,8 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_project.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from .file_serving import FileServingASGI  # noqa: E402  (needs settings)
+
+application = FileServingASGI(django_application)
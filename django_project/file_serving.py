@@ -0,0 +1,351 @@
+"""
+Serving media and collected static files without the Django request cycle.
+
+``FileServingWSGI`` and ``FileServingASGI`` wrap the applications in
+``wsgi.py`` and ``asgi.py``. Requests under ``MEDIA_URL`` and
+``STATIC_URL`` are answered straight from ``MEDIA_ROOT`` and
+``STATIC_ROOT``; anything else, including missing files, goes on to
+Django. Responses support:
+
+- ``ETag``/``Last-Modified`` validators and 304 responses
+- single byte ranges (206/416), honouring ``If-Range``
+- ``.gz`` siblings written by ``collectstatic`` for clients that accept gzip
+- ``Cache-Control: immutable`` for fingerprinted names, such as the hashed
+  ``js/dist/*.js`` from ``FingerprintedStaticFilesStorage`` and the
+  content-addressed background files
+- handing the transfer to the web server with ``FILE_SERVING['SENDFILE']``
+  set to ``'x-accel-redirect'`` (nginx) or ``'x-sendfile'`` (Apache,
+  lighttpd)
+
+For nginx, map ``ACCEL_PREFIX`` to the roots with internal locations::
+
+    location /protected/media/ { internal; alias /srv/map_editor/media/; }
+    location /protected/static/ { internal; alias /srv/map_editor/staticfiles/; }
+
+The ``serve`` view does the same inside Django, for servers that do not
+use the wrappers and for the test client.
+"""
+import asyncio
+import gzip
+import mimetypes
+import os
+import re
+import stat
+from typing import NamedTuple
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Django's 12-character manifest hashes and our 64-character content hashes
+FINGERPRINT = re.compile(r'(?:^|[.\-_])[0-9a-f]{12,}(?:[.\-_]|$)')
+COMPRESSIBLE = {'.js', '.css', '.map', '.json', '.svg', '.txt', '.html', '.xml'}
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+STATUS_TEXT = {
+    200: 'OK', 206: 'Partial Content', 304: 'Not Modified', 405: 'Method Not Allowed',
+    416: 'Range Not Satisfiable',
+}
+
+
+def file_serving_settings():
+    config = getattr(settings, 'FILE_SERVING', {})
+    return {
+        'SENDFILE': config.get('SENDFILE'),
+        'ACCEL_PREFIX': config.get('ACCEL_PREFIX', '/protected/'),
+        'MAX_AGE': config.get('MAX_AGE', 60),
+    }
+
+
+def default_mounts():
+    """``(url_prefix, root, name)`` for media and, once collected, static files."""
+    mounts = [('/' + settings.MEDIA_URL.strip('/') + '/', os.fspath(settings.MEDIA_ROOT), 'media')]
+    if getattr(settings, 'STATIC_ROOT', None):
+        mounts.append(('/' + settings.STATIC_URL.strip('/') + '/', os.fspath(settings.STATIC_ROOT), 'static'))
+    return mounts
+
+
+class FileResult(NamedTuple):
+    status: int
+    headers: list
+    # File to send, or None for responses without a body
+    path: str = None
+    offset: int = 0
+    length: int = 0
+
+    @property
+    def status_line(self):
+        return f'{self.status} {STATUS_TEXT[self.status]}'
+
+    @property
+    def whole_file(self):
+        return self.status == 200
+
+    def chunks(self):
+        with open(self.path, 'rb') as file:
+            file.seek(self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+
+def _accepts_gzip(accept_encoding):
+    for coding in (accept_encoding or '').split(','):
+        name, _, params = coding.strip().partition(';')
+        if name.strip().lower() in ('gzip', '*'):
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def _byte_range(header, size):
+    """``(start, end)`` inclusive, ``None`` to send it all, or ``False`` if unsatisfiable."""
+    match = RANGE.match(header.strip())
+    if match is None:
+        # Malformed or multiple ranges: ignoring Range is always allowed
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+class FileServer:
+    def __init__(self, mounts=None):
+        self.mounts = mounts if mounts is not None else default_mounts()
+
+    def locate(self, url_path):
+        """``(mount name, relative path, filesystem path)``, or None."""
+        for prefix, root, name in self.mounts:
+            if url_path.startswith(prefix):
+                relative = url_path[len(prefix):]
+                try:
+                    return name, relative, safe_join(root, relative)
+                except SuspiciousFileOperation:
+                    return None
+        return None
+
+    def respond(self, method, url_path, header):
+        """
+        The response for ``url_path``, or None if it is not a file under
+        one of the mounts. ``header(name)`` returns a request header or None.
+        """
+        located = self.locate(url_path)
+        if located is None:
+            return None
+        mount, relative, path = located
+        try:
+            info = os.stat(path)
+        except (OSError, ValueError):
+            return None
+        if not stat.S_ISREG(info.st_mode):
+            return None
+        if method not in ('GET', 'HEAD'):
+            return FileResult(405, [('Allow', 'GET, HEAD'), ('Content-Length', '0')])
+
+        config = file_serving_settings()
+        content_type, _ = mimetypes.guess_type(path)
+        headers = [('Content-Type', content_type or 'application/octet-stream')]
+        encoding = None
+        if os.path.splitext(path)[1] in COMPRESSIBLE:
+            headers.append(('Vary', 'Accept-Encoding'))
+            if _accepts_gzip(header('Accept-Encoding')):
+                try:
+                    compressed = os.stat(path + '.gz')
+                except OSError:
+                    compressed = None
+                if compressed is not None and compressed.st_mtime >= info.st_mtime:
+                    encoding, path, relative, info = 'gzip', path + '.gz', relative + '.gz', compressed
+
+        etag = f'"{info.st_mtime_ns:x}-{info.st_size:x}"'
+        cache_control = IMMUTABLE if FINGERPRINT.search(os.path.basename(relative)) else \
+            f'public, max-age={config["MAX_AGE"]}'
+        headers += [
+            ('ETag', etag),
+            ('Last-Modified', http_date(info.st_mtime)),
+            ('Cache-Control', cache_control),
+        ]
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+
+        if self.not_modified(header, etag, info.st_mtime):
+            return FileResult(304, [h for h in headers if h[0] != 'Content-Type'])
+
+        if config['SENDFILE'] == 'x-accel-redirect' and method == 'GET':
+            # nginx does ranges and the transfer itself
+            target = f"{config['ACCEL_PREFIX'].rstrip('/')}/{mount}/{relative}"
+            return FileResult(200, headers + [('X-Accel-Redirect', target)])
+        if config['SENDFILE'] == 'x-sendfile' and method == 'GET':
+            return FileResult(200, headers + [('X-Sendfile', path)])
+
+        size = info.st_size
+        status, start, end = 200, 0, size - 1
+        headers.append(('Accept-Ranges', 'none' if encoding else 'bytes'))
+        range_header = header('Range')
+        if range_header and not encoding and self.range_applies(header('If-Range'), etag, info.st_mtime):
+            byte_range = _byte_range(range_header, size)
+            if byte_range is False:
+                return FileResult(416, headers + [('Content-Range', f'bytes */{size}'), ('Content-Length', '0')])
+            if byte_range is not None:
+                status, (start, end) = 206, byte_range
+                headers.append(('Content-Range', f'bytes {start}-{end}/{size}'))
+        length = end - start + 1 if size else 0
+        headers.append(('Content-Length', str(length)))
+        if method == 'HEAD':
+            return FileResult(status, headers)
+        return FileResult(status, headers, path, start, length)
+
+    @staticmethod
+    def not_modified(header, etag, mtime):
+        if_none_match = header('If-None-Match')
+        if if_none_match:
+            tags = parse_etags(if_none_match)
+            return '*' in tags or etag in tags or f'W/{etag}' in tags
+        since = parse_http_date_safe(header('If-Modified-Since') or '')
+        return since is not None and int(mtime) <= since
+
+    @staticmethod
+    def range_applies(if_range, etag, mtime):
+        if not if_range:
+            return True
+        if if_range.startswith(('"', 'W/')):
+            return if_range == etag
+        return parse_http_date_safe(if_range) == int(mtime)
+
+
+class FileServingWSGI:
+    """WSGI middleware answering file requests before they reach ``application``."""
+    def __init__(self, application, mounts=None):
+        self.application = application
+        self.server = FileServer(mounts)
+
+    def __call__(self, environ, start_response):
+        def header(name):
+            return environ.get('HTTP_' + name.upper().replace('-', '_'))
+
+        result = self.server.respond(environ['REQUEST_METHOD'], environ.get('PATH_INFO', ''), header)
+        if result is None:
+            return self.application(environ, start_response)
+        start_response(result.status_line, result.headers)
+        if result.path is None:
+            return []
+        if result.whole_file and 'wsgi.file_wrapper' in environ:
+            # Lets servers such as gunicorn use sendfile(2)
+            return environ['wsgi.file_wrapper'](open(result.path, 'rb'), CHUNK_SIZE)
+        return result.chunks()
+
+
+class FileServingASGI:
+    """ASGI middleware answering file requests before they reach ``application``."""
+    def __init__(self, application, mounts=None):
+        self.application = application
+        self.server = FileServer(mounts)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.application(scope, receive, send)
+        headers = {}
+        for name, value in scope['headers']:
+            headers.setdefault(name.decode('latin-1').lower(), value.decode('latin-1'))
+        result = self.server.respond(scope['method'], scope['path'], lambda name: headers.get(name.lower()))
+        if result is None:
+            return await self.application(scope, receive, send)
+        await send({
+            'type': 'http.response.start',
+            'status': result.status,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in result.headers],
+        })
+        if result.path is None:
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        extensions = scope.get('extensions') or {}
+        if result.whole_file and 'http.response.pathsend' in extensions:
+            await send({'type': 'http.response.pathsend', 'path': os.path.abspath(result.path)})
+            return
+        loop = asyncio.get_running_loop()
+        chunks = result.chunks()
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        finally:
+            chunks.close()
+        await send({'type': 'http.response.body', 'body': b''})
+
+
+_server = None
+
+
+def serve(request, path):
+    """
+    Django view for the same files, for use in ``urls.py``. The wrappers
+    answer these requests first when they are installed.
+    """
+    global _server
+    if _server is None:
+        _server = FileServer()
+    result = _server.respond(request.method, request.path_info, request.headers.get)
+    if result is None:
+        raise Http404("File not found")
+    if result.path is None:
+        response = HttpResponse(status=result.status)
+    elif result.whole_file:
+        response = FileResponse(open(result.path, 'rb'), status=result.status)
+    else:
+        response = StreamingHttpResponse(result.chunks(), status=result.status)
+    for name, value in result.headers:
+        response[name] = value
+    return response
+
+
+class FingerprintedStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ``collectstatic`` writes content-hashed copies such as
+    ``js/dist/route_editor.3f2a9c1b7d4e.js`` and a ``.gz`` beside each
+    text asset. Until it has been run, URLs use the plain names, so
+    development and tests need no collected files.
+    """
+    def url(self, name, force=False):
+        try:
+            return super().url(name, force)
+        except ValueError:
+            return FileSystemStorage.url(self, name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        written = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                written.update((name, hashed_name))
+            yield name, hashed_name, processed
+        if not dry_run:
+            for name in written:
+                if os.path.splitext(name)[1] in COMPRESSIBLE:
+                    self.precompress(name)
+
+    def precompress(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as source:
+            data = source.read()
+        # mtime=0 keeps the output byte-identical between runs
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) < len(data):
+            with open(path + '.gz', 'wb') as target:
+                target.write(compressed)
@@ -143,3 +143,91 @@ SWAGGER_SETTINGS = {
     'DEFAULT_INFO': 'django_project.urls.schema_info',
     'USE_SESSION_AUTH': True,
 }
+
+# Server-Sent Events
+# Seconds an idle /events/ stream waits before sending a heartbeat
+SSE_HEARTBEAT_INTERVAL = 15
+
+# Pub/sub backend carrying notifications to SSE clients in every worker.
+# See django_project/sse_brokers.py for UnixSocketBroker and RedisBroker.
+SSE_BROKER = {
+    'BACKEND': 'django_project.sse_brokers.InProcessBroker',
+}
+
+# Limits for each SSE client's pending messages. POLICY decides what happens
+# when a slow browser hits a limit: 'drop_oldest', 'coalesce' (by type,
+# board_id and user, then a 'resync' so the browser refetches) or 'disconnect'.
+SSE_CLIENT_QUEUE = {
+    'MAX_DEPTH': 1000,
+    'MAX_BYTES': 4 * 1024 * 1024,
+    'POLICY': 'coalesce',
+}
+
+# Recent events kept per worker so reconnecting clients can resume from
+# their Last-Event-ID; older gaps get a single 'resync' event instead.
+SSE_REPLAY = {
+    'MAX_EVENTS': 1000,
+    'MAX_AGE': 300,  # seconds
+}
+
+# Notifications are published from a background thread after the saving
+# transaction commits. MODE 'inline' publishes on the request thread.
+SSE_DISPATCHER = {
+    'MODE': 'thread',
+    'MAX_PENDING': 10000,
+}
+
+# Seconds during which repeated saves of one player's paths on one board are
+# merged into a single notification. 0 disables debouncing.
+SSE_DEBOUNCE_INTERVAL = 0.5
+
+# Bulk route point uploads: rows per INSERT and points accepted per request
+ROUTE_POINTS_BULK = {
+    'BATCH_SIZE': 1000,
+    'MAX_POINTS': 100000,
+}
+
+# Build the route detail, route point and background list responses directly
+# from packed columns and values() rows instead of through DRF serializers.
+# The output is identical either way.
+ROUTES_FAST_SERIALIZERS = True
+
+# Thumbnail, medium and full-size WebP/JPEG copies of background images.
+# MODE 'thread' renders them in a pool of WORKERS threads after the upload
+# commits, 'inline' on the uploading request, 'lazy' on first request only.
+BACKGROUND_DERIVATIVES = {
+    'MODE': 'thread',
+    'WORKERS': 2,
+}
+
+# Deep Zoom tile pyramids of background images, built once per upload by a
+# pool of WORKERS processes (MODE 'inline' builds on the request, 'lazy'
+# on first tile request). Least recently used pyramids are deleted once
+# they exceed MAX_BYTES. Tile requests wait up to WAIT seconds for a build.
+BACKGROUND_TILES = {
+    'ROOT': BASE_DIR / 'tile_cache',
+    'TILE_SIZE': 256,
+    'FORMAT': 'jpg',
+    'MODE': 'process',
+    'WORKERS': 2,
+    'MAX_BYTES': 2 * 1024 ** 3,
+    'WAIT': 10,
+}
+
+# collectstatic writes fingerprinted copies (js/dist/route_editor.<hash>.js)
+# and gzipped siblings here; file_serving answers them with immutable caching
+STATIC_ROOT = BASE_DIR / "staticfiles"
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django_project.file_serving.FingerprintedStaticFilesStorage"},
+}
+
+# Media and static file serving in wsgi.py/asgi.py. SENDFILE hands the
+# transfer to the web server: 'x-accel-redirect' (nginx, with internal
+# locations under ACCEL_PREFIX), 'x-sendfile' (Apache), or None to send
+# from Python. Names without a fingerprint are cached for MAX_AGE seconds.
+FILE_SERVING = {
+    'SENDFILE': None,
+    'ACCEL_PREFIX': '/protected/',
+    'MAX_AGE': 60,
+}
@@ -0,0 +1,279 @@
+"""
+Pub/sub backends that carry SSE notifications between processes.
+
+A broker is built with a ``deliver`` callback that hands a batch of
+messages to the clients connected to *this* process. ``publish`` takes
+the whole batch produced by one save and costs a single broker write no
+matter how many browsers are subscribed.
+
+Select a backend with the ``SSE_BROKER`` setting::
+
+    SSE_BROKER = {
+        'BACKEND': 'django_project.sse_brokers.UnixSocketBroker',
+        'OPTIONS': {'path': '/run/map_editor/sse'},
+    }
+"""
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+import uuid
+
+FRAME_HEADER = struct.Struct('!I')
+
+
+def encode_batch(messages):
+    return json.dumps(messages).encode()
+
+
+def decode_batch(payload):
+    return json.loads(payload)
+
+
+logger = logging.getLogger(__name__)
+
+
+class BaseBroker:
+    def __init__(self, deliver, **options):
+        self.deliver = deliver
+
+    def _receive(self, payload):
+        """Deliver a batch read off the wire, without letting it end the reader."""
+        try:
+            self.deliver(decode_batch(payload))
+        except Exception:
+            logger.exception("SSE broker could not deliver a batch")
+
+    def publish(self, messages):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class InProcessBroker(BaseBroker):
+    """Delivers straight to local clients. Suitable for a single process."""
+    def publish(self, messages):
+        self.deliver(messages)
+
+
+def _recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("peer closed the connection")
+        data += chunk
+    return bytes(data)
+
+
+class UnixSocketBroker(BaseBroker):
+    """
+    Fan-out between worker processes on one host.
+
+    Every process listens on its own Unix stream socket inside ``path``.
+    A publish delivers locally and writes one length-prefixed frame to
+    each peer socket found in the directory.
+    """
+    def __init__(self, deliver, path='/tmp/map_editor_sse', **options):
+        super().__init__(deliver, **options)
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.address = os.path.join(path, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock")
+        self.peers = {}
+        self.lock = threading.Lock()
+        self.closed = False
+
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.address)
+        self.listener.listen()
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        while not self.closed:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._read_loop, args=(conn,), daemon=True).start()
+
+    def _read_loop(self, conn):
+        with conn:
+            try:
+                while True:
+                    (size,) = FRAME_HEADER.unpack(_recv_exactly(conn, FRAME_HEADER.size))
+                    self._receive(_recv_exactly(conn, size))
+            except (ConnectionError, OSError):
+                pass
+
+    def _peer_addresses(self):
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        return [
+            os.path.join(self.path, name) for name in names
+            if name.endswith('.sock') and os.path.join(self.path, name) != self.address
+        ]
+
+    def _connect(self, address):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(address)
+        except (ConnectionRefusedError, FileNotFoundError):
+            sock.close()
+            # Nobody is listening any more: the owning worker has exited
+            try:
+                os.unlink(address)
+            except OSError:
+                pass
+            return None
+        return sock
+
+    def publish(self, messages):
+        self.deliver(messages)
+        payload = encode_batch(messages)
+        frame = FRAME_HEADER.pack(len(payload)) + payload
+        with self.lock:
+            for address in self._peer_addresses():
+                sock = self.peers.get(address) or self._connect(address)
+                if sock is None:
+                    continue
+                try:
+                    sock.sendall(frame)
+                    self.peers[address] = sock
+                except OSError as e:
+                    logger.warning("SSE broker dropped peer %s: %s", address, e)
+                    sock.close()
+                    self.peers.pop(address, None)
+
+    def close(self):
+        self.closed = True
+        try:
+            # Wakes the accept thread; close() alone leaves it blocked
+            self.listener.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.listener.close()
+        with self.lock:
+            for sock in self.peers.values():
+                sock.close()
+            self.peers.clear()
+        try:
+            os.unlink(self.address)
+        except OSError:
+            pass
+
+
+class RESPError(Exception):
+    pass
+
+
+def encode_command(*args):
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+def read_reply(stream):
+    """Read one RESP2 reply from a buffered socket file."""
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("connection closed")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode()
+    if kind == b"-":
+        raise RESPError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        size = int(rest)
+        if size < 0:
+            return None
+        data = stream.read(size + 2)
+        return data[:-2]
+    if kind == b"*":
+        size = int(rest)
+        if size < 0:
+            return None
+        return [read_reply(stream) for _ in range(size)]
+    raise RESPError(f"unexpected reply type {kind!r}")
+
+
+class RedisBroker(BaseBroker):
+    """
+    Fan-out through a Redis (or protocol-compatible) server using PUBLISH
+    and SUBSCRIBE. Every process, including the publisher, receives the
+    batch through its subscription, so delivery order is the same
+    everywhere.
+    """
+    def __init__(self, deliver, host='localhost', port=6379,
+                 channel='map_editor:sse', reconnect_delay=1.0, **options):
+        super().__init__(deliver, **options)
+        self.host = host
+        self.port = port
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.lock = threading.Lock()
+        self.publisher = None
+        self.subscriber = None
+        self.closed = False
+        self.subscribed = threading.Event()
+        threading.Thread(target=self._subscribe_loop, daemon=True).start()
+
+    def _open(self):
+        sock = socket.create_connection((self.host, self.port))
+        return sock, sock.makefile('rb')
+
+    def _subscribe_loop(self):
+        while not self.closed:
+            try:
+                sock, stream = self._open()
+                self.subscriber = sock
+                sock.sendall(encode_command('SUBSCRIBE', self.channel))
+                read_reply(stream)
+                self.subscribed.set()
+                while True:
+                    reply = read_reply(stream)
+                    if reply and reply[0] == b'message':
+                        self._receive(reply[2])
+            except (OSError, ConnectionError, RESPError) as e:
+                self.subscribed.clear()
+                if self.closed:
+                    return
+                logger.warning("SSE broker subscription lost: %s", e)
+                time.sleep(self.reconnect_delay)
+
+    def publish(self, messages):
+        command = encode_command('PUBLISH', self.channel, encode_batch(messages))
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.publisher is None:
+                        self.publisher = self._open()
+                    sock, stream = self.publisher
+                    sock.sendall(command)
+                    return read_reply(stream)
+                except (OSError, ConnectionError) as e:
+                    if self.publisher is not None:
+                        self.publisher[0].close()
+                    self.publisher = None
+                    if attempt:
+                        logger.warning("SSE broker publish failed: %s", e)
+
+    def close(self):
+        self.closed = True
+        for sock in (self.subscriber, self.publisher and self.publisher[0]):
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                sock.close()
@@ -1,27 +1,640 @@
-from collections import deque
+import asyncio
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict, deque, namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .sse_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BROKER = 'django_project.sse_brokers.InProcessBroker'
+
+DROP_OLDEST = 'drop_oldest'
+COALESCE = 'coalesce'
+DISCONNECT = 'disconnect'
+QUEUE_POLICIES = (DROP_OLDEST, COALESCE, DISCONNECT)
+
+
+class QueueStats:
+    """Process-wide counters for messages the client queues had to shed."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.dropped = 0
+        self.coalesced = 0
+        self.evicted = 0
+
+    def record(self, dropped=0, coalesced=0, evicted=0):
+        with self.lock:
+            self.dropped += dropped
+            self.coalesced += coalesced
+            self.evicted += evicted
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                'dropped': self.dropped,
+                'coalesced': self.coalesced,
+                'evicted': self.evicted,
+            }
+
+    def reset(self):
+        with self.lock:
+            self.dropped = self.coalesced = self.evicted = 0
+
+
+queue_stats = QueueStats()
+
+
+# Maps message types to the SSE event names the browser listens for
+SSE_EVENT_NAMES = {
+    "board_created": "newBoard",
+    "board_updated": "boardUpdated",
+    "paths_created": "newPaths",
+    "paths_updated": "pathsUpdated",
+}
+
+# A published message encoded once into its wire frame. Every subscribed
+# queue holds a reference to the same Event, never a copy.
+Event = namedtuple('Event', ['id', 'type', 'board_id', 'board_owner', 'frame', 'published_at', 'user'])
+
+# Subscription topics. A client subscribes to the whole site, to given
+# boards, or to every board of given owners.
+ALL_TOPIC = ('all',)
+
+
+def board_topic(board_id):
+    return ('board', board_id)
+
+
+def owner_topic(username):
+    return ('owner', username)
+
+
+def event_topics(event):
+    return (ALL_TOPIC, board_topic(event.board_id), owner_topic(event.board_owner))
+
+def encode_event(message, event_id=None, name=None):
+    """Encode ``message`` into an immutable SSE frame."""
+    if name is None:
+        name = SSE_EVENT_NAMES.get(message.get("type"), "message")
+    id_line = f"id: {event_id}\n" if event_id is not None else ""
+    frame = f"event: {name}\n{id_line}data: {json.dumps(message)}\n\n".encode()
+    return Event(
+        event_id,
+        message.get("type"),
+        message.get("board_id"),
+        message.get("board_owner"),
+        frame,
+        time.time(),
+        message.get("user"),
+    )
+
+
+HEARTBEAT_FRAME = (
+    f"event: heartbeat\ndata: {json.dumps({'type': 'heartbeat', 'msg': 'still alive'})}\n\n"
+).encode()
+
+
+class ReplayBuffer:
+    """
+    Recently published events, kept so that a reconnecting browser can
+    resume from its ``Last-Event-ID``.
+
+    Event ids look like ``<token>:<seq>``. The token is unique to this
+    process, so an id handed out by another worker or before a restart
+    is recognised as unknown rather than misread as a position here.
+    The buffer keeps at most ``max_events`` events, none older than
+    ``max_age`` seconds.
+    """
+    def __init__(self, max_events=1000, max_age=300):
+        self.max_events = max_events
+        self.max_age = max_age
+        self.token = uuid.uuid4().hex[:8]
+        self.sequence = itertools.count(1)
+        self.last_seq = 0
+        self.events = deque()
+        self.lock = threading.Lock()
+
+    def next_id(self):
+        self.last_seq = next(self.sequence)
+        return self.last_seq, f"{self.token}:{self.last_seq}"
+
+    def append(self, seq, event):
+        now = time.monotonic()
+        self.events.append((seq, now, event))
+        self._trim(now)
+
+    def _trim(self, now):
+        while len(self.events) > self.max_events:
+            self.events.popleft()
+        while self.events and now - self.events[0][1] > self.max_age:
+            self.events.popleft()
+
+    def since(self, last_event_id):
+        """
+        Return the events published after ``last_event_id``, or None when
+        they can no longer be replayed and the client must resync.
+        """
+        token, _, seq = str(last_event_id).partition(':')
+        if token != self.token or not seq.isdigit():
+            return None
+        seq = int(seq)
+        self._trim(time.monotonic())
+        if seq > self.last_seq:
+            return None
+        oldest = self.events[0][0] if self.events else self.last_seq + 1
+        if seq + 1 < oldest:
+            return None
+        return [event for event_seq, _, event in self.events if event_seq > seq]
+
+    def resync_event(self):
+        """Tells the client to refetch state; carries the current id to resume from."""
+        return encode_event(
+            {"type": "resync"},
+            event_id=f"{self.token}:{self.last_seq}",
+            name="resync",
+        )
+
+
+class Dispatcher:
+    """
+    Background thread that publishes notifications handed over by request
+    threads, so saving a board never waits on the fan-out.
+
+    The hand-off queue holds at most ``max_pending`` batches; when it is
+    full new batches are dropped and counted rather than blocking the
+    request. Batches that queue up while a publish is running are merged
+    into a single broker write.
+    """
+    def __init__(self, publish, max_pending=10000):
+        self.publish = publish
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name='sse-dispatcher', daemon=True)
+        self.thread.start()
+
+    def submit(self, messages):
+        try:
+            self.pending.put_nowait((time.monotonic(), messages))
+        except queue.Full:
+            self.dropped += len(messages)
+            logger.warning("SSE dispatcher queue full; dropping notification")
+
+    def _run(self):
+        while True:
+            batches = [self.pending.get()]
+            while True:
+                try:
+                    batches.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            now = time.monotonic()
+            metrics.dispatch_delay.observe_many([now - submitted for submitted, _ in batches])
+            try:
+                self.publish([message for _, batch in batches for message in batch])
+            except Exception:
+                logger.exception("SSE dispatcher failed to publish")
+            finally:
+                for _ in batches:
+                    self.pending.task_done()
+
+    def flush(self):
+        """Block until everything submitted so far has been published."""
+        self.pending.join()
+
+
+class Debouncer:
+    """
+    Holds keyed notifications for ``interval`` seconds after the first one
+    arrives, merging any later ones for the same key with ``merge(older,
+    newer)``, then publishes a single message. The published message
+    records how many notifications were folded into it under ``merged``.
+    """
+    def __init__(self, publish, interval):
+        self.publish = publish
+        self.interval = interval
+        # key -> [deadline, message, merged]; insertion order is deadline order
+        self.pending = {}
+        self.merged = 0
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name='sse-debouncer', daemon=True)
+        self.thread.start()
+
+    def submit(self, key, message, merge):
+        with self.condition:
+            entry = self.pending.get(key)
+            if entry is None:
+                self.pending[key] = [time.monotonic() + self.interval, message, 0]
+                self.condition.notify()
+            else:
+                entry[1] = merge(entry[1], message)
+                entry[2] += 1
+                self.merged += 1
+
+    def _take_due(self, now):
+        due = []
+        while self.pending:
+            key = next(iter(self.pending))
+            if self.pending[key][0] > now:
+                break
+            due.append(self.pending.pop(key))
+        return due
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                now = time.monotonic()
+                due = self._take_due(now)
+                if not due:
+                    first = next(iter(self.pending.values()))
+                    self.condition.wait(first[0] - now)
+                    continue
+            try:
+                self._publish(due)
+            except Exception:
+                # Keep the thread alive for the next window
+                logger.exception("SSE debouncer failed to publish")
+
+    def _publish(self, entries):
+        messages = []
+        for _, message, merged in entries:
+            if merged:
+                message = dict(message, merged=merged)
+            messages.append(message)
+        self.publish(messages)
+
+    def flush(self):
+        """Publish everything pending without waiting for the interval."""
+        with self.condition:
+            entries = list(self.pending.values())
+            self.pending.clear()
+        if entries:
+            self._publish(entries)
+
 
 # Each client has its own queue
 class ClientQueue:
-    def __init__(self):
+    """
+    Pending events for one connected SSE client.
+
+    A queue created with an event loop wakes an async consumer through
+    ``wait()``; a queue created without one wakes a blocking consumer
+    through ``wait_sync()``. Producers may call ``add()`` from any thread.
+
+    The queue holds at most ``max_depth`` events and ``max_bytes`` of
+    encoded frames. When a new event would exceed either limit,
+    ``policy`` decides what gives way: ``drop_oldest`` discards from the
+    head, ``coalesce`` first replaces queued messages of the same type from
+    the same user for the same board, and ``disconnect`` evicts the client
+    altogether. Messages are deltas, so once ``coalesce`` has shed any, a
+    single ``resync`` event follows the newest one and the client refetches
+    the state it missed.
+    """
+    def __init__(self, loop=None, max_depth=None, max_bytes=None, policy=DROP_OLDEST,
+                 topics=None):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.topics = frozenset(topics or [ALL_TOPIC])
         self.queue = deque()
+        self.loop = loop
+        self.ready = asyncio.Event() if loop is not None else threading.Event()
+        self.max_depth = max_depth
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.bytes = 0
+        self.closed = False
+        self.dropped = 0
+        self.coalesced = 0
+        self.lock = threading.Lock()
 
-    def add(self, message):
-        self.queue.append(message)
+    @classmethod
+    def from_settings(cls, loop=None, topics=None):
+        config = getattr(settings, 'SSE_CLIENT_QUEUE', {})
+        return cls(
+            loop=loop,
+            topics=topics,
+            max_depth=config.get('MAX_DEPTH'),
+            max_bytes=config.get('MAX_BYTES'),
+            policy=config.get('POLICY', DROP_OLDEST),
+        )
 
-    def pop_all(self):
-        items = list(self.queue)
+    def wants(self, event):
+        return not self.topics.isdisjoint(event_topics(event))
+
+    def _over_limit(self, size):
+        return (
+            (self.max_depth is not None and len(self.queue) + 1 > self.max_depth)
+            or (self.max_bytes is not None and self.bytes + size > self.max_bytes)
+        )
+
+    def add(self, event):
+        size = len(event.frame)
+        with self.lock:
+            if self.closed:
+                return
+            if self._over_limit(size):
+                if self.policy == DISCONNECT:
+                    self._evict()
+                    return
+                resync = self.policy == COALESCE
+                if resync:
+                    self._coalesce(event)
+                dropped = 0
+                while self.queue and self._over_limit(size):
+                    self.bytes -= len(self.queue.popleft().frame)
+                    dropped += 1
+                if dropped:
+                    self.dropped += dropped
+                    queue_stats.record(dropped=dropped)
+            else:
+                resync = False
+            self.queue.append(event)
+            self.bytes += size
+            if resync:
+                # Outside the limits: one small frame, replaced on every shed
+                marker = encode_event({"type": "resync"}, event_id=event.id, name="resync")
+                self.queue.append(marker)
+                self.bytes += len(marker.frame)
+        self._wake()
+
+    def _coalesce(self, event):
+        """Drop queued events superseded by ``event``, and any earlier resync marker."""
+        key = (event.type, event.board_id, event.user)
+        kept = deque()
+        merged = 0
+        for queued in self.queue:
+            if queued.type == 'resync':
+                self.bytes -= len(queued.frame)
+            elif event.board_id is not None and (queued.type, queued.board_id, queued.user) == key:
+                self.bytes -= len(queued.frame)
+                merged += 1
+            else:
+                kept.append(queued)
+        self.queue = kept
+        if merged:
+            self.coalesced += merged
+            queue_stats.record(coalesced=merged)
+
+    def _evict(self):
+        self.closed = True
         self.queue.clear()
+        self.bytes = 0
+        queue_stats.record(evicted=1)
+        unregister_client(self)
+        self._wake()
+
+    def _wake(self):
+        if self.loop is None:
+            self.ready.set()
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.ready.set)
+        except RuntimeError:
+            # The consumer's loop is already closed; it will be unregistered.
+            pass
+
+    def pop_all(self):
+        with self.lock:
+            items = list(self.queue)
+            self.queue.clear()
+            self.bytes = 0
         return items
 
-# Global set of all connected clients
+    async def wait(self, timeout=None):
+        """Wait until a message arrives or ``timeout`` seconds pass."""
+        if not self.queue:
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self.ready.clear()
+        return bool(self.queue) or self.closed
+
+    def wait_sync(self, timeout=None):
+        """Blocking counterpart of ``wait()`` for WSGI consumers."""
+        if not self.queue:
+            self.ready.wait(timeout)
+        self.ready.clear()
+        return bool(self.queue) or self.closed
+
+# Global set of all clients connected to this process
 clients = set()
+# Topic -> clients subscribed to it, so a publish only visits the
+# clients that want the event
+subscriptions = defaultdict(set)
+_subscriptions_lock = threading.RLock()
+
+_broker = None
+_broker_pid = None
+_broker_lock = threading.Lock()
+
+_replay = None
+_replay_pid = None
+
+_dispatcher = None
+_dispatcher_pid = None
+
+_debouncer = None
+_debouncer_pid = None
+
+def get_broker():
+    """
+    Return this process's broker, building it from ``settings.SSE_BROKER``
+    on first use. A forked worker gets its own broker rather than sharing
+    the parent's sockets and threads.
+    """
+    global _broker, _broker_pid
+    with _broker_lock:
+        if _broker is None or _broker_pid != os.getpid():
+            config = getattr(settings, 'SSE_BROKER', {})
+            backend = import_string(config.get('BACKEND', DEFAULT_BROKER))
+            _broker = backend(deliver_local, **config.get('OPTIONS', {}))
+            _broker_pid = os.getpid()
+        return _broker
+
+def close_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is not None and _broker_pid == os.getpid():
+            _broker.close()
+        _broker = None
+
+def get_replay_buffer():
+    global _replay, _replay_pid
+    with _broker_lock:
+        if _replay is None or _replay_pid != os.getpid():
+            config = getattr(settings, 'SSE_REPLAY', {})
+            _replay = ReplayBuffer(
+                max_events=config.get('MAX_EVENTS', 1000),
+                max_age=config.get('MAX_AGE', 300),
+            )
+            _replay_pid = os.getpid()
+        return _replay
+
+def subscribers(event):
+    """Clients subscribed to any of the event's topics."""
+    targets = set()
+    with _subscriptions_lock:
+        for topic in event_topics(event):
+            subscribed = subscriptions.get(topic)
+            if subscribed:
+                targets.update(subscribed)
+    return targets
+
+def deliver_local(messages):
+    replay = get_replay_buffer()
+    with replay.lock:
+        # Encode each message once; every client shares the same frame
+        deliveries = []
+        for message in messages:
+            seq, event_id = replay.next_id()
+            event = encode_event(message, event_id)
+            replay.append(seq, event)
+            # Resolve targets under the lock so a client registering
+            # concurrently gets each event exactly once: either replayed
+            # or delivered here.
+            deliveries.append((event, subscribers(event)))
+    metrics.record_published([event for event, _ in deliveries])
+    for event, targets in deliveries:
+        for client in targets:
+            client.add(event)
 
-def register_client(client):
-    clients.add(client)
+def register_client(client, last_event_id=None):
+    """
+    Start delivering to ``client``. When the browser is reconnecting with
+    ``last_event_id``, the events it missed are queued first, or a single
+    resync event if they have already left the replay buffer.
+    """
+    # Make sure this process is listening before it has anyone to serve
+    get_broker()
+    replay = get_replay_buffer()
+    with replay.lock:
+        if last_event_id:
+            missed = replay.since(last_event_id)
+            if missed is None:
+                client.add(replay.resync_event())
+            else:
+                for event in missed:
+                    if client.wants(event):
+                        client.add(event)
+        with _subscriptions_lock:
+            clients.add(client)
+            for topic in client.topics:
+                subscriptions[topic].add(client)
 
 def unregister_client(client):
-    clients.discard(client)
+    with _subscriptions_lock:
+        clients.discard(client)
+        for topic in client.topics:
+            subscribed = subscriptions.get(topic)
+            if subscribed is not None:
+                subscribed.discard(client)
+                if not subscribed:
+                    del subscriptions[topic]
+
+def unregister_all():
+    for client in list(clients):
+        unregister_client(client)
+
+def get_dispatcher():
+    global _dispatcher, _dispatcher_pid
+    with _broker_lock:
+        if _dispatcher is None or _dispatcher_pid != os.getpid():
+            config = getattr(settings, 'SSE_DISPATCHER', {})
+            _dispatcher = Dispatcher(
+                lambda messages: get_broker().publish(messages),
+                max_pending=config.get('MAX_PENDING', 10000),
+            )
+            _dispatcher_pid = os.getpid()
+        return _dispatcher
+
+def flush_notifications():
+    """Wait for the background dispatcher to publish everything queued."""
+    if _dispatcher is not None and _dispatcher_pid == os.getpid():
+        _dispatcher.flush()
+
+def push_notifications(messages):
+    """
+    Publish a batch of messages with a single broker write. By default the
+    write happens on the dispatcher thread; ``SSE_DISPATCHER['MODE'] =
+    'inline'`` publishes on the calling thread instead.
+    """
+    messages = list(messages)
+    if not messages:
+        return
+    if getattr(settings, 'SSE_DISPATCHER', {}).get('MODE') == 'inline':
+        get_broker().publish(messages)
+    else:
+        get_dispatcher().submit(messages)
 
 def push_notification(message: dict):
-    for client in clients:
-        client.add(message)
\ No newline at end of file
+    push_notifications([message])
+
+def get_debouncer():
+    global _debouncer, _debouncer_pid
+    with _broker_lock:
+        if _debouncer is None or _debouncer_pid != os.getpid():
+            _debouncer = Debouncer(
+                push_notifications,
+                getattr(settings, 'SSE_DEBOUNCE_INTERVAL', 0),
+            )
+            _debouncer_pid = os.getpid()
+        return _debouncer
+
+def push_notification_debounced(key, message: dict, merge):
+    """
+    Publish ``message`` at most once per ``SSE_DEBOUNCE_INTERVAL`` for
+    ``key``; notifications arriving within the window are merged into it.
+    """
+    if getattr(settings, 'SSE_DEBOUNCE_INTERVAL', 0) <= 0:
+        push_notification(message)
+    else:
+        get_debouncer().submit(key, message, merge)
+
+def push_notification_on_commit(message: dict, debounce_key=None, merge=None):
+    """
+    Publish ``message`` once the current transaction commits, and never if
+    it rolls back. Outside a transaction it is published right away. With
+    ``debounce_key`` and ``merge`` it goes through the debouncer.
+    """
+    if debounce_key is None:
+        transaction.on_commit(lambda: push_notification(message))
+    else:
+        transaction.on_commit(lambda: push_notification_debounced(debounce_key, message, merge))
+
+
+def stats():
+    """Point-in-time view of the engine, merged with the running metrics."""
+    with _subscriptions_lock:
+        connected = list(clients)
+        topics = len(subscriptions)
+    depths = [len(client.queue) for client in connected]
+    sizes = [client.bytes for client in connected]
+    dispatcher = _dispatcher if _dispatcher_pid == os.getpid() else None
+    debouncer = _debouncer if _debouncer_pid == os.getpid() else None
+    data = {
+        'clients': len(connected),
+        'topics': topics,
+        'queue_depth': {'total': sum(depths), 'max': max(depths, default=0)},
+        'queue_bytes': {'total': sum(sizes), 'max': max(sizes, default=0)},
+        'queue': queue_stats.as_dict(),
+        'dispatcher': {
+            'pending': dispatcher.pending.qsize() if dispatcher else 0,
+            'dropped': dispatcher.dropped if dispatcher else 0,
+        },
+        'debounce': {'merged': debouncer.merged if debouncer else 0},
+    }
+    data.update(metrics.as_dict())
+    return data
@@ -0,0 +1,157 @@
+"""
+Counters and histograms describing the SSE engine.
+
+Updates are a lock and a couple of integer additions, taken once per
+batch or per client wake-up rather than per byte, so they can stay on in
+production.
+"""
+import threading
+from bisect import bisect_left
+from collections import Counter
+
+# Seconds; roughly log-spaced from sub-millisecond to a missed heartbeat
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 15.0)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def observe_many(self, values):
+        indexes = [bisect_left(self.buckets, value) for value in values]
+        with self.lock:
+            for index in indexes:
+                self.counts[index] += 1
+            self.sum += sum(values)
+            self.count += len(indexes)
+
+    def as_dict(self):
+        """Cumulative bucket counts keyed by upper bound, Prometheus style."""
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        cumulative = {}
+        running = 0
+        for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+            running += bucket_count
+            cumulative[str(bound)] = running
+        return {'buckets': cumulative, 'sum': total, 'count': count}
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.events_published = Counter()
+            self.connections_opened = 0
+            self.frames_delivered = 0
+            self.bytes_delivered = 0
+            self.heartbeats = 0
+            self.heartbeat_bytes = 0
+        self.delivery_latency = Histogram()
+        self.dispatch_delay = Histogram()
+
+    def record_published(self, events):
+        with self.lock:
+            for event in events:
+                self.events_published[event.type or 'message'] += 1
+
+    def record_connection(self):
+        with self.lock:
+            self.connections_opened += 1
+
+    def record_delivered(self, events, now):
+        """``events`` were just written to one client's stream at ``now``."""
+        size = sum(len(event.frame) for event in events)
+        with self.lock:
+            self.frames_delivered += len(events)
+            self.bytes_delivered += size
+        self.delivery_latency.observe_many([now - event.published_at for event in events])
+
+    def record_heartbeat(self, size):
+        with self.lock:
+            self.heartbeats += 1
+            self.heartbeat_bytes += size
+
+    def as_dict(self):
+        with self.lock:
+            data = {
+                'events_published': dict(self.events_published),
+                'connections_opened': self.connections_opened,
+                'frames_delivered': self.frames_delivered,
+                'bytes_delivered': self.bytes_delivered,
+                'heartbeats': self.heartbeats,
+                'heartbeat_bytes': self.heartbeat_bytes,
+            }
+        data['delivery_latency_seconds'] = self.delivery_latency.as_dict()
+        data['dispatch_delay_seconds'] = self.dispatch_delay.as_dict()
+        return data
+
+
+metrics = Metrics()
+
+
+# name, type, help, path into the stats dict
+PROMETHEUS_SCALARS = [
+    ('sse_clients', 'gauge', 'Connected SSE clients in this process.', ('clients',)),
+    ('sse_topics', 'gauge', 'Topics with at least one subscriber.', ('topics',)),
+    ('sse_queue_depth_total', 'gauge', 'Events waiting in all client queues.', ('queue_depth', 'total')),
+    ('sse_queue_depth_max', 'gauge', 'Events waiting in the fullest client queue.', ('queue_depth', 'max')),
+    ('sse_queue_bytes_total', 'gauge', 'Bytes waiting in all client queues.', ('queue_bytes', 'total')),
+    ('sse_queue_dropped_total', 'counter', 'Events dropped by full client queues.', ('queue', 'dropped')),
+    ('sse_queue_coalesced_total', 'counter', 'Events replaced by newer ones for the same board.', ('queue', 'coalesced')),
+    ('sse_queue_evicted_total', 'counter', 'Clients disconnected for falling behind.', ('queue', 'evicted')),
+    ('sse_dispatcher_pending', 'gauge', 'Batches waiting for the dispatcher thread.', ('dispatcher', 'pending')),
+    ('sse_dispatcher_dropped_total', 'counter', 'Messages dropped by a full dispatcher queue.', ('dispatcher', 'dropped')),
+    ('sse_debounce_merged_total', 'counter', 'Notifications merged by the debouncer.', ('debounce', 'merged')),
+    ('sse_connections_opened_total', 'counter', 'SSE connections accepted.', ('connections_opened',)),
+    ('sse_frames_delivered_total', 'counter', 'Event frames written to clients.', ('frames_delivered',)),
+    ('sse_bytes_delivered_total', 'counter', 'Event bytes written to clients.', ('bytes_delivered',)),
+    ('sse_heartbeats_total', 'counter', 'Heartbeat frames written to clients.', ('heartbeats',)),
+    ('sse_heartbeat_bytes_total', 'counter', 'Heartbeat bytes written to clients.', ('heartbeat_bytes',)),
+]
+
+PROMETHEUS_HISTOGRAMS = [
+    ('sse_delivery_latency_seconds', 'Time from encoding an event to writing it to a client.', 'delivery_latency_seconds'),
+    ('sse_dispatch_delay_seconds', 'Time a batch waited for the dispatcher thread.', 'dispatch_delay_seconds'),
+]
+
+
+def _lookup(stats, path):
+    for key in path:
+        stats = stats.get(key, 0) if isinstance(stats, dict) else 0
+    return stats
+
+
+def render_prometheus(stats):
+    """Render engine stats in the Prometheus text exposition format."""
+    lines = []
+    for name, kind, help_text, path in PROMETHEUS_SCALARS:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {_lookup(stats, path)}"]
+
+    name = 'sse_events_published_total'
+    lines += [f"# HELP {name} Events published, by type.", f"# TYPE {name} counter"]
+    for event_type, count in sorted(stats.get('events_published', {}).items()):
+        lines.append(f'{name}{{type="{event_type}"}} {count}')
+
+    for name, help_text, key in PROMETHEUS_HISTOGRAMS:
+        histogram = stats[key]
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for bound, count in histogram['buckets'].items():
+            lines.append(f'{name}_bucket{{le="{bound}"}} {count}')
+        lines += [f"{name}_sum {histogram['sum']}", f"{name}_count {histogram['count']}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,942 @@
+import asyncio
+import gzip
+import json
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils.http import http_date
+
+from django_project import file_serving, sse_engine, views
+from django_project.sse_brokers import (
+    InProcessBroker,
+    RedisBroker,
+    UnixSocketBroker,
+    read_reply,
+)
+from django_project.sse_metrics import Histogram, metrics
+from django_project.sse_engine import (
+    ALL_TOPIC,
+    ClientQueue,
+    ReplayBuffer,
+    board_topic,
+    owner_topic,
+    encode_event,
+    push_notification,
+    queue_stats,
+)
+
+
+def parse_sse_frame(frame):
+    """Split a raw SSE frame into its event name and decoded data."""
+    if isinstance(frame, bytes):
+        frame = frame.decode()
+    fields = dict(line.split(': ', 1) for line in frame.strip().split('\n'))
+    return fields['event'], json.loads(fields['data'])
+
+
+# Publish on the calling thread so tests can inspect queues immediately
+inline_dispatch = override_settings(SSE_DISPATCHER={'MODE': 'inline'})
+
+
+def event(**message):
+    return encode_event(message)
+
+
+def drain(client):
+    """Pop every queued event and decode it back into its message."""
+    return [parse_sse_frame(e.frame)[1] for e in client.pop_all()]
+
+
+@inline_dispatch
+class ClientQueueTests(TestCase):
+    def test_pop_all_drains_queue(self):
+        """Test that pop_all returns messages in order and empties the queue"""
+        client = ClientQueue()
+        client.add(event(n=1))
+        client.add(event(n=2))
+
+        self.assertEqual(drain(client), [{'n': 1}, {'n': 2}])
+        self.assertEqual(drain(client), [])
+
+    def test_wait_sync_times_out_without_messages(self):
+        """Test that a blocking wait returns False when nothing arrives"""
+        client = ClientQueue()
+        self.assertFalse(client.wait_sync(0.01))
+
+    def test_drop_oldest_bounds_depth(self):
+        """Test that a full queue discards its oldest messages"""
+        queue_stats.reset()
+        client = ClientQueue(max_depth=2)
+        for n in range(5):
+            client.add(event(n=n))
+
+        self.assertEqual(drain(client), [{'n': 3}, {'n': 4}])
+        self.assertEqual(client.dropped, 3)
+        self.assertEqual(queue_stats.as_dict()['dropped'], 3)
+
+    def test_byte_budget_is_enforced(self):
+        """Test that queued payload never exceeds the byte budget"""
+        size = len(encode_event({'n': 0}, event_id=0).frame)
+        client = ClientQueue(max_bytes=size * 3 + 1)
+        for n in range(10):
+            client.add(encode_event({'n': n}, event_id=n))
+
+        self.assertLessEqual(client.bytes, size * 3 + 1)
+        self.assertEqual(drain(client), [{'n': 7}, {'n': 8}, {'n': 9}])
+        self.assertEqual(client.bytes, 0)
+
+    def test_coalesce_replaces_updates_for_same_board(self):
+        """Test that coalescing keeps only the newest update per board"""
+        queue_stats.reset()
+        client = ClientQueue(max_depth=2, policy='coalesce')
+        client.add(event(type='board_updated', board_id=1, v=1))
+        client.add(event(type='board_updated', board_id=2, v=1))
+        client.add(event(type='board_updated', board_id=1, v=2))
+
+        self.assertEqual(drain(client), [
+            {'type': 'board_updated', 'board_id': 2, 'v': 1},
+            {'type': 'board_updated', 'board_id': 1, 'v': 2},
+            {'type': 'resync'},
+        ])
+        self.assertEqual(client.coalesced, 1)
+        self.assertEqual(client.dropped, 0)
+        self.assertEqual(queue_stats.as_dict()['coalesced'], 1)
+
+    def test_coalesce_keeps_other_players_paths(self):
+        """Test that one player's updates never replace another's on the same board"""
+        client = ClientQueue(max_depth=2, policy='coalesce')
+        client.add(event(type='paths_updated', board_id=1, user='alice', v=1))
+        client.add(event(type='paths_updated', board_id=1, user='bob', v=1))
+        client.add(event(type='paths_updated', board_id=1, user='alice', v=2))
+
+        self.assertEqual(drain(client), [
+            {'type': 'paths_updated', 'board_id': 1, 'user': 'bob', 'v': 1},
+            {'type': 'paths_updated', 'board_id': 1, 'user': 'alice', 'v': 2},
+            {'type': 'resync'},
+        ])
+
+    def test_coalesce_sends_one_resync_after_the_newest_event(self):
+        """Test that shed deltas are followed by a single resync carrying the newest id"""
+        client = ClientQueue(max_depth=2, policy='coalesce')
+        for n in range(5):
+            client.add(encode_event({'type': 'board_updated', 'board_id': 1, 'v': n}, event_id=f't:{n}'))
+
+        events = client.pop_all()
+
+        self.assertEqual([e.type for e in events], ['board_updated', 'resync'])
+        self.assertEqual(parse_sse_frame(events[0].frame)[1]['v'], 4)
+        self.assertEqual(parse_sse_frame(events[1].frame)[0], 'resync')
+        self.assertEqual(events[1].id, 't:4')
+
+    def test_disconnect_policy_evicts_slow_client(self):
+        """Test that the disconnect policy unregisters a client over its limit"""
+        queue_stats.reset()
+        client = ClientQueue(max_depth=1, policy='disconnect')
+        sse_engine.register_client(client)
+        client.add(event(n=1))
+        client.add(event(n=2))
+
+        self.assertTrue(client.closed)
+        self.assertTrue(client.wait_sync(0))
+        self.assertEqual(drain(client), [])
+        self.assertNotIn(client, sse_engine.clients)
+        self.assertEqual(queue_stats.as_dict()['evicted'], 1)
+
+    def test_encode_event_frame(self):
+        """Test the wire format of an encoded event"""
+        encoded = encode_event({'type': 'board_created', 'board_id': 4}, event_id=12)
+
+        self.assertEqual(
+            encoded.frame,
+            b'event: newBoard\nid: 12\ndata: {"type": "board_created", "board_id": 4}\n\n'
+        )
+        self.assertEqual((encoded.type, encoded.board_id), ('board_created', 4))
+
+    def test_clients_share_one_encoded_frame(self):
+        """Test that a publish encodes once and every queue shares the bytes"""
+        first, second = ClientQueue(), ClientQueue()
+        sse_engine.register_client(first)
+        sse_engine.register_client(second)
+        try:
+            push_notification({'type': 'board_updated', 'board_id': 1})
+            self.assertIs(first.pop_all()[0].frame, second.pop_all()[0].frame)
+        finally:
+            sse_engine.unregister_all()
+
+    async def test_wait_wakes_on_add(self):
+        """Test that an async consumer is woken as soon as a message is added"""
+        client = ClientQueue(loop=asyncio.get_running_loop())
+        waiter = asyncio.ensure_future(client.wait(5))
+        await asyncio.sleep(0)
+        client.add(event(n=1))
+
+        self.assertTrue(await asyncio.wait_for(waiter, 1))
+        self.assertEqual(drain(client), [{'n': 1}])
+
+
+class ReplayBufferTests(TestCase):
+    def publish(self, replay, count):
+        ids = []
+        for n in range(count):
+            seq, event_id = replay.next_id()
+            replay.append(seq, encode_event({'n': n}, event_id))
+            ids.append(event_id)
+        return ids
+
+    def test_since_returns_only_missed_events(self):
+        """Test that a reconnect replays exactly the events after its id"""
+        replay = ReplayBuffer()
+        ids = self.publish(replay, 5)
+
+        missed = replay.since(ids[2])
+
+        self.assertEqual([e.id for e in missed], ids[3:])
+        self.assertEqual(replay.since(ids[-1]), [])
+
+    def test_gap_beyond_count_limit_requires_resync(self):
+        """Test that ids evicted by the count limit cannot be replayed"""
+        replay = ReplayBuffer(max_events=3)
+        ids = self.publish(replay, 6)
+
+        self.assertIsNone(replay.since(ids[0]))
+        self.assertEqual(len(replay.since(ids[2])), 3)
+
+    def test_gap_beyond_age_limit_requires_resync(self):
+        """Test that expired events cannot be replayed"""
+        replay = ReplayBuffer(max_age=0)
+        ids = self.publish(replay, 2)
+
+        self.assertIsNone(replay.since(ids[0]))
+        self.assertEqual(replay.since(ids[1]), [])
+
+    def test_foreign_ids_require_resync(self):
+        """Test that ids from another worker or an earlier run are rejected"""
+        replay = ReplayBuffer()
+        self.publish(replay, 2)
+
+        self.assertIsNone(replay.since('deadbeef:1'))
+        self.assertIsNone(replay.since(f'{replay.token}:99'))
+        self.assertIsNone(replay.since('garbage'))
+
+    def test_resync_event_carries_current_id(self):
+        """Test that a resync tells the client where to resume from"""
+        replay = ReplayBuffer()
+        ids = self.publish(replay, 3)
+
+        event, data = parse_sse_frame(replay.resync_event().frame)
+
+        self.assertEqual(event, 'resync')
+        self.assertEqual(data, {'type': 'resync'})
+        self.assertEqual(replay.resync_event().id, ids[-1])
+
+
+@inline_dispatch
+class TopicTests(TestCase):
+    def tearDown(self):
+        sse_engine.unregister_all()
+
+    def subscribe(self, *topics):
+        client = ClientQueue(topics=topics)
+        sse_engine.register_client(client)
+        return client
+
+    def test_clients_receive_only_matching_topics(self):
+        """Test that board and owner subscriptions filter the event stream"""
+        everything = self.subscribe(ALL_TOPIC)
+        board_one = self.subscribe(board_topic(1))
+        alice = self.subscribe(owner_topic('alice'))
+
+        push_notification({'type': 'board_updated', 'board_id': 1, 'board_owner': 'bob'})
+        push_notification({'type': 'board_updated', 'board_id': 2, 'board_owner': 'alice'})
+
+        self.assertEqual([m['board_id'] for m in drain(everything)], [1, 2])
+        self.assertEqual([m['board_id'] for m in drain(board_one)], [1])
+        self.assertEqual([m['board_id'] for m in drain(alice)], [2])
+
+    def test_client_with_overlapping_topics_gets_event_once(self):
+        """Test that matching several topics does not duplicate delivery"""
+        client = self.subscribe(board_topic(1), owner_topic('bob'))
+
+        push_notification({'type': 'board_updated', 'board_id': 1, 'board_owner': 'bob'})
+
+        self.assertEqual(len(drain(client)), 1)
+
+    def test_unregister_cleans_up_topic_index(self):
+        """Test that topics with no subscribers leave the index"""
+        client = self.subscribe(board_topic(9))
+        self.assertIn(board_topic(9), sse_engine.subscriptions)
+
+        sse_engine.unregister_client(client)
+
+        self.assertNotIn(board_topic(9), sse_engine.subscriptions)
+
+    def test_replay_is_filtered_by_topic(self):
+        """Test that a reconnecting client only replays events it subscribed to"""
+        push_notification({'type': 'board_updated', 'board_id': 1})
+        last_seen = sse_engine.get_replay_buffer().events[-1][2].id
+        push_notification({'type': 'board_updated', 'board_id': 2})
+        push_notification({'type': 'board_updated', 'board_id': 3})
+
+        client = ClientQueue(topics=[board_topic(3)])
+        sse_engine.register_client(client, last_seen)
+
+        self.assertEqual([m['board_id'] for m in drain(client)], [3])
+
+
+@inline_dispatch
+class SSEViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='sseuser',
+            email='sse@example.com',
+            password='ssepassword'
+        )
+
+    def tearDown(self):
+        sse_engine.unregister_all()
+
+    def test_authentication_required(self):
+        """Test that anonymous users cannot subscribe"""
+        response = self.client.get('/events/')
+        self.assertEqual(response.status_code, 403)
+
+    async def test_async_stream_delivers_pushed_event(self):
+        """Test that the ASGI stream forwards a notification immediately"""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/events/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+
+        read = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        self.assertEqual(len(sse_engine.clients), 1)
+        push_notification({'type': 'board_updated', 'board_id': 7})
+
+        event, data = parse_sse_frame(await asyncio.wait_for(read, 1))
+        self.assertEqual(event, 'boardUpdated')
+        self.assertEqual(data['board_id'], 7)
+
+        # The ASGI handler cancels the pending read when the browser leaves
+        read = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        with self.assertLogs('django_project.views', 'INFO') as logs:
+            read.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await read
+        self.assertEqual(logs.output, ['INFO:django_project.views:SSE client disconnected'])
+        self.assertEqual(len(sse_engine.clients), 0)
+
+    def test_sync_stream_logs_disconnect_and_unregisters(self):
+        """Test that closing the WSGI stream is logged as a disconnect, not an error"""
+        client = ClientQueue()
+        sse_engine.register_client(client)
+        stream = views.sync_event_stream(client, 1)
+        push_notification({'type': 'board_updated', 'board_id': 7})
+        next(stream)
+
+        with self.assertLogs('django_project.views', 'INFO') as logs:
+            stream.close()
+
+        self.assertEqual(logs.output, ['INFO:django_project.views:SSE client disconnected'])
+        self.assertEqual(len(sse_engine.clients), 0)
+
+    @override_settings(SSE_HEARTBEAT_INTERVAL=0.01)
+    async def test_async_stream_sends_heartbeat_when_idle(self):
+        """Test that an idle ASGI stream emits heartbeats"""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/events/')
+        stream = response.streaming_content
+
+        event, data = parse_sse_frame(await asyncio.wait_for(anext(stream), 1))
+        self.assertEqual(event, 'heartbeat')
+        self.assertEqual(data['type'], 'heartbeat')
+
+    def test_invalid_board_topic_is_rejected(self):
+        """Test that a malformed board subscription is a bad request"""
+        self.client.force_login(self.user)
+        response = self.client.get('/events/?board=abc')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(SSE_HEARTBEAT_INTERVAL=0.01)
+    def test_board_subscription_filters_stream(self):
+        """Test that ?board= limits the stream to that board's events"""
+        self.client.force_login(self.user)
+        response = self.client.get('/events/?board=5&mine=1')
+
+        push_notification({'type': 'board_updated', 'board_id': 4, 'board_owner': 'other'})
+        push_notification({'type': 'board_updated', 'board_id': 5, 'board_owner': 'other'})
+        push_notification({'type': 'board_updated', 'board_id': 6, 'board_owner': 'sseuser'})
+        frames = next(response.streaming_content).decode().strip().split('\n\n')
+
+        self.assertEqual([parse_sse_frame(f)[1]['board_id'] for f in frames], [5, 6])
+        response.close()
+
+    @override_settings(SSE_HEARTBEAT_INTERVAL=0.01)
+    def test_reconnect_replays_missed_events(self):
+        """Test that Last-Event-ID resumes the stream after the given event"""
+        replay = sse_engine.get_replay_buffer()
+        push_notification({'type': 'board_updated', 'board_id': 1})
+        last_seen = replay.events[-1][2].id
+        push_notification({'type': 'board_updated', 'board_id': 2})
+        push_notification({'type': 'board_updated', 'board_id': 3})
+
+        self.client.force_login(self.user)
+        response = self.client.get('/events/', HTTP_LAST_EVENT_ID=last_seen)
+        frames = next(response.streaming_content).decode().strip().split('\n\n')
+
+        self.assertEqual([parse_sse_frame(f)[1]['board_id'] for f in frames], [2, 3])
+        response.close()
+
+    @override_settings(SSE_HEARTBEAT_INTERVAL=0.01)
+    def test_reconnect_after_long_gap_gets_resync(self):
+        """Test that an unknown Last-Event-ID yields a single resync event"""
+        self.client.force_login(self.user)
+        response = self.client.get('/events/', HTTP_LAST_EVENT_ID='deadbeef:1')
+
+        event, data = parse_sse_frame(next(response.streaming_content))
+
+        self.assertEqual(event, 'resync')
+        response.close()
+
+    @override_settings(SSE_HEARTBEAT_INTERVAL=0.01)
+    def test_sync_stream_delivers_pushed_event(self):
+        """Test that the WSGI fallback stream still delivers notifications"""
+        self.client.force_login(self.user)
+        response = self.client.get('/events/')
+        stream = response.streaming_content
+
+        push_notification({'type': 'paths_created', 'board_id': 3})
+        event, data = parse_sse_frame(next(stream))
+        self.assertEqual(event, 'newPaths')
+        self.assertEqual(data['board_id'], 3)
+
+        response.close()
+        self.assertEqual(len(sse_engine.clients), 0)
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """
+    Local stand-in for Redis that speaks just enough RESP for pub/sub:
+    SUBSCRIBE and PUBLISH. Counts PUBLISH commands so tests can check
+    how many broker writes a publish costs.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeRedisHandler)
+        self.subscribers = []
+        self.publish_count = 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                command = read_reply(self.rfile)
+            except ConnectionError:
+                return
+            name = command[0].upper()
+            if name == b'SUBSCRIBE':
+                with server.lock:
+                    server.subscribers.append(self.wfile)
+                self.wfile.write(b'*3\r\n$9\r\nsubscribe\r\n$%d\r\n%s\r\n:1\r\n'
+                                 % (len(command[1]), command[1]))
+            elif name == b'PUBLISH':
+                channel, payload = command[1], command[2]
+                with server.lock:
+                    server.publish_count += 1
+                    targets = list(server.subscribers)
+                for target in targets:
+                    target.write(b'*3\r\n$7\r\nmessage\r\n$%d\r\n%s\r\n$%d\r\n%s\r\n'
+                                 % (len(channel), channel, len(payload), payload))
+                self.wfile.write(b':%d\r\n' % len(targets))
+
+
+class Collector:
+    """Deliver callback that records batches and signals their arrival."""
+    def __init__(self):
+        self.batches = []
+        self.arrived = threading.Event()
+
+    def __call__(self, messages):
+        self.batches.append(messages)
+        self.arrived.set()
+
+
+@inline_dispatch
+class BrokerTests(TestCase):
+    def tearDown(self):
+        sse_engine.unregister_all()
+
+    def test_in_process_broker_delivers_locally(self):
+        """Test that the default broker hands messages to local clients"""
+        client = ClientQueue()
+        sse_engine.register_client(client)
+        self.assertIsInstance(sse_engine.get_broker(), InProcessBroker)
+
+        sse_engine.push_notifications([{'n': 1}, {'n': 2}])
+        self.assertEqual(drain(client), [{'n': 1}, {'n': 2}])
+
+    def test_unix_socket_broker_reaches_other_process(self):
+        """Test that a publish on one worker's broker reaches another's"""
+        with tempfile.TemporaryDirectory() as path:
+            local, remote = Collector(), Collector()
+            publisher = UnixSocketBroker(local, path=path)
+            subscriber = UnixSocketBroker(remote, path=path)
+            try:
+                publisher.publish([{'type': 'board_updated', 'board_id': 1}])
+
+                self.assertTrue(remote.arrived.wait(2))
+                self.assertEqual(remote.batches, [[{'type': 'board_updated', 'board_id': 1}]])
+                self.assertEqual(local.batches, remote.batches)
+            finally:
+                publisher.close()
+                subscriber.close()
+
+    def test_unix_socket_broker_forgets_dead_peers(self):
+        """Test that sockets left behind by exited workers are cleaned up"""
+        with tempfile.TemporaryDirectory() as path:
+            broker = UnixSocketBroker(Collector(), path=path)
+            # A worker that died without unlinking its socket
+            stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            stale.bind(os.path.join(path, 'dead.sock'))
+            stale.close()
+            try:
+                broker.publish([{'n': 1}])
+                self.assertEqual(broker._peer_addresses(), [])
+            finally:
+                broker.close()
+
+    def test_redis_broker_uses_one_write_per_publish(self):
+        """Test that a batch costs a single PUBLISH regardless of subscribers"""
+        server = FakeRedisServer()
+        host, port = server.server_address
+        collectors = [Collector() for _ in range(3)]
+        brokers = [RedisBroker(c, host=host, port=port) for c in collectors]
+        try:
+            for broker in brokers:
+                self.assertTrue(broker.subscribed.wait(2))
+
+            brokers[0].publish([{'n': 1}, {'n': 2}])
+
+            for collector in collectors:
+                self.assertTrue(collector.arrived.wait(2))
+                self.assertEqual(collector.batches, [[{'n': 1}, {'n': 2}]])
+            self.assertEqual(server.publish_count, 1)
+        finally:
+            for broker in brokers:
+                broker.close()
+            server.stop()
+
+    def test_redis_broker_survives_delivery_errors(self):
+        """Test that a batch that fails to deliver does not stop the subscription"""
+        server = FakeRedisServer()
+        host, port = server.server_address
+        collector = Collector()
+
+        def deliver(messages):
+            if messages == [{'n': 1}]:
+                raise RuntimeError("client went away")
+            collector(messages)
+
+        broker = RedisBroker(deliver, host=host, port=port)
+        try:
+            self.assertTrue(broker.subscribed.wait(2))
+            with self.assertLogs('django_project.sse_brokers', 'ERROR'):
+                broker.publish([{'n': 1}])
+                broker.publish([{'n': 2}])
+                self.assertTrue(collector.arrived.wait(2))
+
+            self.assertEqual(collector.batches, [[{'n': 2}]])
+            self.assertTrue(broker.subscribed.is_set())
+        finally:
+            broker.close()
+            server.stop()
+
+
+class DispatcherTests(TransactionTestCase):
+    def setUp(self):
+        self.listener = ClientQueue()
+        sse_engine.register_client(self.listener)
+
+    def tearDown(self):
+        sse_engine.unregister_all()
+
+    def test_publish_happens_on_dispatcher_thread(self):
+        """Test that push_notification hands off instead of fanning out inline"""
+        publishing_threads = []
+        dispatcher = sse_engine.Dispatcher(
+            lambda messages: publishing_threads.append(threading.current_thread())
+        )
+
+        dispatcher.submit([{'n': 1}])
+        dispatcher.flush()
+
+        self.assertEqual(len(publishing_threads), 1)
+        self.assertIsNot(publishing_threads[0], threading.current_thread())
+
+    def test_full_hand_off_queue_drops_instead_of_blocking(self):
+        """Test that a saturated dispatcher never blocks the request thread"""
+        started, release = threading.Event(), threading.Event()
+
+        def slow_publish(messages):
+            started.set()
+            release.wait(2)
+
+        dispatcher = sse_engine.Dispatcher(slow_publish, max_pending=1)
+        dispatcher.submit([{'n': 1}])
+        # The first batch is being published; one more fits in the queue
+        self.assertTrue(started.wait(2))
+        dispatcher.submit([{'n': 2}])
+        with self.assertLogs('django_project.sse_engine', 'WARNING'):
+            dispatcher.submit([{'n': 3}])
+
+        self.assertEqual(dispatcher.dropped, 1)
+        release.set()
+        dispatcher.flush()
+
+    def test_notification_waits_for_commit(self):
+        """Test that events are published only after the transaction commits"""
+        with transaction.atomic():
+            sse_engine.push_notification_on_commit({'type': 'board_updated', 'board_id': 1})
+            sse_engine.flush_notifications()
+            self.assertEqual(drain(self.listener), [])
+        sse_engine.flush_notifications()
+
+        self.assertEqual(drain(self.listener), [{'type': 'board_updated', 'board_id': 1}])
+
+    def test_rolled_back_write_is_never_published(self):
+        """Test that listeners never see events for rolled-back writes"""
+        try:
+            with transaction.atomic():
+                sse_engine.push_notification_on_commit({'type': 'board_updated', 'board_id': 1})
+                raise RuntimeError("roll back")
+        except RuntimeError:
+            pass
+        sse_engine.flush_notifications()
+
+        self.assertEqual(drain(self.listener), [])
+
+
+class DebouncerTests(TestCase):
+    def keep_newest(self, older, newer):
+        return newer
+
+    def test_rapid_saves_collapse_into_one_message(self):
+        """Test that messages for one key within the window publish once"""
+        published = []
+        debouncer = sse_engine.Debouncer(published.append, interval=60)
+        for n in range(5):
+            debouncer.submit(('paths', 1, 1), {'n': n}, self.keep_newest)
+        debouncer.submit(('paths', 2, 1), {'n': 'other'}, self.keep_newest)
+
+        debouncer.flush()
+
+        self.assertEqual(published, [[{'n': 4, 'merged': 4}, {'n': 'other'}]])
+        self.assertEqual(debouncer.merged, 4)
+
+    def test_window_expiry_publishes_latest_state(self):
+        """Test that the debouncer publishes on its own once the window ends"""
+        published = threading.Event()
+        received = []
+
+        def publish(messages):
+            received.extend(messages)
+            published.set()
+
+        debouncer = sse_engine.Debouncer(publish, interval=0.01)
+        debouncer.submit('key', {'n': 1}, self.keep_newest)
+        debouncer.submit('key', {'n': 2}, self.keep_newest)
+
+        self.assertTrue(published.wait(2))
+        self.assertEqual(received, [{'n': 2, 'merged': 1}])
+
+    def test_failed_publish_does_not_stop_later_windows(self):
+        """Test that an error publishing one window is logged and the next still flushes"""
+        published = threading.Event()
+        received = []
+
+        def publish(messages):
+            if messages == [{'n': 1}]:
+                raise RuntimeError("broker unavailable")
+            received.extend(messages)
+            published.set()
+
+        debouncer = sse_engine.Debouncer(publish, interval=0.01)
+        with self.assertLogs('django_project.sse_engine', 'ERROR') as logs:
+            debouncer.submit('key', {'n': 1}, self.keep_newest)
+            deadline = time.monotonic() + 2
+            while not logs.records and time.monotonic() < deadline:
+                time.sleep(0.01)
+        debouncer.submit('key', {'n': 2}, self.keep_newest)
+
+        self.assertTrue(published.wait(2))
+        self.assertEqual(received, [{'n': 2}])
+        self.assertTrue(debouncer.thread.is_alive())
+
+
+@inline_dispatch
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='player', password='playerpassword')
+        cls.staff = User.objects.create_user(username='staff', password='staffpassword', is_staff=True)
+
+    def setUp(self):
+        metrics.reset()
+
+    def tearDown(self):
+        sse_engine.unregister_all()
+
+    def test_metrics_require_staff(self):
+        """Test that only staff can read the metrics endpoints"""
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/events/metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/events/metrics/prometheus/').status_code, 403)
+
+    def test_metrics_count_clients_and_deliveries(self):
+        """Test that published and delivered events show up in the counters"""
+        client = ClientQueue()
+        sse_engine.register_client(client)
+        push_notification({'type': 'board_updated', 'board_id': 1})
+        push_notification({'type': 'board_updated', 'board_id': 2})
+        self.client.force_login(self.staff)
+
+        queued = self.client.get('/events/metrics/').json()
+        self.assertEqual(queued['clients'], 1)
+        self.assertEqual(queued['queue_depth'], {'total': 2, 'max': 2})
+        self.assertEqual(queued['events_published'], {'board_updated': 2})
+
+        events = client.pop_all()
+        metrics.record_delivered(events, events[-1].published_at + 0.002)
+        delivered = self.client.get('/events/metrics/').json()
+        self.assertEqual(delivered['queue_depth']['total'], 0)
+        self.assertEqual(delivered['frames_delivered'], 2)
+        self.assertEqual(delivered['bytes_delivered'], sum(len(e.frame) for e in events))
+        self.assertEqual(delivered['delivery_latency_seconds']['count'], 2)
+
+    def test_prometheus_exposition(self):
+        """Test that the Prometheus view renders gauges, counters and histograms"""
+        push_notification({'type': 'paths_updated', 'board_id': 3})
+        metrics.record_heartbeat(3)
+        self.client.force_login(self.staff)
+
+        response = self.client.get('/events/metrics/prometheus/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE sse_clients gauge', body)
+        self.assertIn('sse_heartbeats_total 1', body)
+        self.assertIn('sse_events_published_total{type="paths_updated"} 1', body)
+        self.assertIn('sse_delivery_latency_seconds_bucket{le="+Inf"} 0', body)
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test that each bucket counts every observation at or below its bound"""
+        histogram = Histogram(buckets=(0.1, 1.0))
+        histogram.observe_many([0.05, 0.5, 0.5, 3.0])
+
+        data = histogram.as_dict()
+
+        self.assertEqual(data['buckets'], {'0.1': 1, '1.0': 3, '+Inf': 4})
+        self.assertEqual(data['count'], 4)
+
+
+class FileServingTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        self.data = bytes(range(256)) * 40
+        self.path = os.path.join(self.root.name, 'maps', 'forest.png')
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'wb') as f:
+            f.write(self.data)
+        mtime = time.time() - 3600
+        os.utime(self.path, (mtime, mtime))
+        self.server = file_serving.FileServer([('/media/', self.root.name, 'media')])
+
+    def respond(self, url='/media/maps/forest.png', method='GET', **headers):
+        return self.server.respond(method, url, headers.get)
+
+    def body(self, result):
+        return b''.join(result.chunks())
+
+    def header(self, result, name):
+        return dict(result.headers).get(name)
+
+    def write(self, name, data):
+        path = os.path.join(self.root.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_whole_file(self):
+        """Test that a file is served with validators and a short cache lifetime"""
+        result = self.respond()
+
+        self.assertEqual(result.status, 200)
+        self.assertEqual(self.body(result), self.data)
+        self.assertEqual(self.header(result, 'Content-Type'), 'image/png')
+        self.assertEqual(self.header(result, 'Content-Length'), str(len(self.data)))
+        self.assertEqual(self.header(result, 'Accept-Ranges'), 'bytes')
+        self.assertEqual(self.header(result, 'Cache-Control'), 'public, max-age=60')
+        self.assertTrue(self.header(result, 'ETag').startswith('"'))
+
+    def test_missing_files_fall_through(self):
+        """Test that missing files, directories and other prefixes are left to Django"""
+        self.assertIsNone(self.respond('/media/maps/missing.png'))
+        self.assertIsNone(self.respond('/media/maps'))
+        self.assertIsNone(self.respond('/media/../secret.txt'))
+        self.assertIsNone(self.respond('/routes/'))
+
+    def test_not_modified(self):
+        """Test that matching ETag or If-Modified-Since validators give 304"""
+        etag = self.header(self.respond(), 'ETag')
+
+        by_etag = self.respond(**{'If-None-Match': etag})
+        by_date = self.respond(**{'If-Modified-Since': http_date(time.time())})
+        stale = self.respond(**{'If-None-Match': '"other"', 'If-Modified-Since': http_date(time.time())})
+
+        self.assertEqual(by_etag.status, 304)
+        self.assertIsNone(by_etag.path)
+        self.assertEqual(by_date.status, 304)
+        self.assertEqual(stale.status, 200)
+
+    def test_byte_ranges(self):
+        """Test that single ranges give 206, and unsatisfiable ones 416"""
+        middle = self.respond(Range='bytes=100-199')
+        suffix = self.respond(Range='bytes=-10')
+        outside = self.respond(Range=f'bytes={len(self.data)}-')
+
+        self.assertEqual(middle.status, 206)
+        self.assertEqual(self.body(middle), self.data[100:200])
+        self.assertEqual(self.header(middle, 'Content-Range'), f'bytes 100-199/{len(self.data)}')
+        self.assertEqual(self.header(middle, 'Content-Length'), '100')
+        self.assertEqual(self.body(suffix), self.data[-10:])
+        self.assertEqual(outside.status, 416)
+        self.assertEqual(self.header(outside, 'Content-Range'), f'bytes */{len(self.data)}')
+
+    def test_if_range_mismatch_sends_whole_file(self):
+        """Test that a range is ignored when If-Range names another version"""
+        etag = self.header(self.respond(), 'ETag')
+
+        current = self.respond(Range='bytes=0-9', **{'If-Range': etag})
+        changed = self.respond(Range='bytes=0-9', **{'If-Range': '"changed"'})
+
+        self.assertEqual(current.status, 206)
+        self.assertEqual(changed.status, 200)
+        self.assertEqual(self.body(changed), self.data)
+
+    def test_precompressed_variant(self):
+        """Test that a .gz sibling is sent to clients accepting gzip"""
+        script = b'console.log("route editor");' * 50
+        self.write('app.js', script)
+        self.write('app.js.gz', gzip.compress(script))
+
+        plain = self.respond('/media/app.js')
+        compressed = self.respond('/media/app.js', **{'Accept-Encoding': 'gzip, br'})
+        refused = self.respond('/media/app.js', **{'Accept-Encoding': 'gzip;q=0'})
+
+        self.assertEqual(self.body(plain), script)
+        self.assertEqual(self.header(plain, 'Vary'), 'Accept-Encoding')
+        self.assertEqual(self.header(compressed, 'Content-Encoding'), 'gzip')
+        self.assertEqual(self.header(compressed, 'Content-Type'), 'text/javascript')
+        self.assertEqual(gzip.decompress(self.body(compressed)), script)
+        self.assertIsNone(self.header(refused, 'Content-Encoding'))
+
+    def test_fingerprinted_names_are_immutable(self):
+        """Test that hashed and content-addressed names are cached forever"""
+        self.write('app.3f2a9c1b7d4e.js', b'1')
+        self.write('a' * 64 + '.png', b'2')
+
+        for name in ('app.3f2a9c1b7d4e.js', 'a' * 64 + '.png'):
+            result = self.respond('/media/' + name)
+            self.assertEqual(self.header(result, 'Cache-Control'), file_serving.IMMUTABLE)
+
+    @override_settings(FILE_SERVING={'SENDFILE': 'x-accel-redirect', 'ACCEL_PREFIX': '/internal/'})
+    def test_accel_redirect(self):
+        """Test that nginx is handed the file instead of Python sending it"""
+        result = self.respond()
+
+        self.assertEqual(result.status, 200)
+        self.assertIsNone(result.path)
+        self.assertEqual(self.header(result, 'X-Accel-Redirect'), '/internal/media/maps/forest.png')
+        self.assertNotIn('Content-Length', dict(result.headers))
+
+    def test_wsgi_wrapper(self):
+        """Test that the WSGI wrapper answers files and passes other requests on"""
+        calls = []
+
+        def application(environ, start_response):
+            calls.append(environ['PATH_INFO'])
+            start_response('404 Not Found', [])
+            return [b'django']
+
+        def start_response(status, headers):
+            statuses.append(status)
+
+        statuses = []
+        wrapped = file_serving.FileServingWSGI(application, self.server.mounts)
+        environ = {'REQUEST_METHOD': 'GET', 'HTTP_RANGE': 'bytes=0-3'}
+
+        body = b''.join(wrapped(dict(environ, PATH_INFO='/media/maps/forest.png'), start_response))
+        missing = b''.join(wrapped(dict(environ, PATH_INFO='/media/nope.png'), start_response))
+
+        self.assertEqual(body, self.data[:4])
+        self.assertEqual(missing, b'django')
+        self.assertEqual(statuses, ['206 Partial Content', '404 Not Found'])
+        self.assertEqual(calls, ['/media/nope.png'])
+
+    def test_asgi_wrapper(self):
+        """Test that the ASGI wrapper streams files, or uses pathsend when offered"""
+        async def application(scope, receive, send):
+            raise AssertionError('Django should not be called')
+
+        async def call(extensions=None):
+            messages = []
+
+            async def send(message):
+                messages.append(message)
+
+            scope = {
+                'type': 'http', 'method': 'GET', 'path': '/media/maps/forest.png',
+                'headers': [(b'accept-encoding', b'gzip')], 'extensions': extensions,
+            }
+            await file_serving.FileServingASGI(application, self.server.mounts)(scope, None, send)
+            return messages
+
+        streamed = asyncio.run(call())
+        pathsend = asyncio.run(call({'http.response.pathsend': {}}))
+
+        self.assertEqual(streamed[0]['status'], 200)
+        self.assertEqual(b''.join(m.get('body', b'') for m in streamed[1:]), self.data)
+        self.assertEqual(pathsend[1], {'type': 'http.response.pathsend', 'path': self.path})
+
+    def test_serve_view(self):
+        """Test that /media/ requests through Django get the same responses"""
+        with override_settings(MEDIA_ROOT=self.root.name):
+            file_serving._server = None
+            self.addCleanup(setattr, file_serving, '_server', None)
+
+            response = self.client.get('/media/maps/forest.png', HTTP_RANGE='bytes=0-9')
+            missing = self.client.get('/media/maps/missing.png')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.data[:10])
+        self.assertEqual(missing.status_code, 404)
@@ -1,10 +1,12 @@
+import re
+
 from django.contrib import admin
 from django.urls import path, include, re_path
 from django.views.generic.base import TemplateView
 from django.conf import settings
-from django.conf.urls.static import static
+from . import file_serving
 from routes import views as routes_views
-from .views import sse_notifications_view
+from .views import sse_notifications_view, sse_metrics_view, sse_metrics_prometheus_view
 
 # Import APIs if using DRF
 from rest_framework import permissions
@@ -39,11 +41,16 @@ urlpatterns = [
     path('api/redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]
 
-# Always serve media files regardless of DEBUG setting
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Always serve media files regardless of DEBUG setting. wsgi.py and asgi.py
+# answer these before Django; this covers other servers and the test client
+urlpatterns += [
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), file_serving.serve),
+]
 
 urlpatterns += [
     path('events/', sse_notifications_view),
+    path('events/metrics/', sse_metrics_view, name='sse_metrics'),
+    path('events/metrics/prometheus/', sse_metrics_prometheus_view, name='sse_metrics_prometheus'),
 ]
 
 # Custom 404 handler
@@ -1,56 +1,137 @@
 from django.shortcuts import render
-from django.http import StreamingHttpResponse, JsonResponse, HttpResponseForbidden
-from django.contrib.auth.decorators import login_required
-from time import sleep
-import json
+from django.http import StreamingHttpResponse, JsonResponse, HttpResponse, HttpResponseForbidden, HttpResponseBadRequest
+from django.core.handlers.asgi import ASGIRequest
+from django.conf import settings
+import asyncio
+import logging
+import time
 
 
 from .sse_engine import (
+    HEARTBEAT_FRAME,
     ClientQueue,
+    board_topic,
+    owner_topic,
     register_client,
     unregister_client,
-    push_notification
+    push_notification,
+    stats
 )
+from .sse_metrics import metrics, render_prometheus
 
-def sse_notifications_view(request):
-    if not request.user.is_authenticated:
+logger = logging.getLogger(__name__)
+
+
+def subscription_topics(request, user):
+    """
+    Topics requested through the query string:
+    ``?board=<id>`` (repeatable), ``?owner=<username>`` (repeatable) and
+    ``?mine=1`` for boards owned by the current user. With none of them the
+    client receives every event, as before.
+    """
+    topics = set()
+    for board_id in request.GET.getlist('board'):
+        if not board_id.isdigit():
+            raise ValueError(f"Invalid board id: {board_id}")
+        topics.add(board_topic(int(board_id)))
+    for owner in request.GET.getlist('owner'):
+        topics.add(owner_topic(owner))
+    if request.GET.get('mine'):
+        topics.add(owner_topic(user.username))
+    return topics
+
+
+async def sse_notifications_view(request):
+    user = await request.auser()
+    if not user.is_authenticated:
         return HttpResponseForbidden("Authentication required for SSE.")
 
-    client = ClientQueue()
-    register_client(client)
-
-    def event_stream():
-        try:
-            while True:
-                messages = client.pop_all()
-
-                if messages:
-                    for message in messages:
-                        event_type = message.get("type", "message")
-                        if event_type == "board_created":
-                            yield f"event: newBoard\ndata: {json.dumps(message)}\n\n"
-                        elif event_type == "board_updated":
-                            yield f"event: boardUpdated\ndata: {json.dumps(message)}\n\n"
-                        elif event_type == "paths_created":
-                            yield f"event: newPaths\ndata: {json.dumps(message)}\n\n"
-                        elif event_type == "paths_updated":
-                            yield f"event: pathsUpdated\ndata: {json.dumps(message)}\n\n"
-                        else:
-                            yield f"event: message\ndata: {json.dumps(message)}\n\n"
-                else:
-                    yield f"event: heartbeat\ndata: {json.dumps({'type': 'heartbeat', 'msg': 'still alive'})}\n\n"
-
-                sleep(1)
-        except Exception as e:
-            import sys
-            print(f"SSE event_stream interrupted: {e}", file=sys.stderr)
-        finally:
-            unregister_client(client)
-
-    return StreamingHttpResponse(
-        event_stream(),
-        content_type='text/event-stream'
-    )
+    try:
+        topics = subscription_topics(request, user)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    heartbeat_interval = getattr(settings, 'SSE_HEARTBEAT_INTERVAL', 15)
+
+    if isinstance(request, ASGIRequest):
+        # Served by asgi.py: each subscriber is a coroutine parked on its queue
+        client = ClientQueue.from_settings(loop=asyncio.get_running_loop(), topics=topics)
+        stream = async_event_stream(client, heartbeat_interval)
+    else:
+        # Served by wsgi.py: the worker thread blocks until a message arrives
+        client = ClientQueue.from_settings(topics=topics)
+        stream = sync_event_stream(client, heartbeat_interval)
+    # EventSource sends Last-Event-ID automatically when it reconnects
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('lastEventId')
+    register_client(client, last_event_id)
+    metrics.record_connection()
+
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def async_event_stream(client, heartbeat_interval):
+    try:
+        while True:
+            if await client.wait(heartbeat_interval):
+                if client.closed:
+                    # Evicted as a slow consumer; the browser will reconnect
+                    break
+                events = client.pop_all()
+                metrics.record_delivered(events, time.time())
+                # Frames are pre-encoded and shared; just concatenate them
+                yield b"".join(event.frame for event in events)
+            else:
+                metrics.record_heartbeat(len(HEARTBEAT_FRAME))
+                yield HEARTBEAT_FRAME
+    except asyncio.CancelledError:
+        # The ASGI handler cancels the stream when the browser disconnects
+        logger.info("SSE client disconnected")
+        raise
+    except Exception:
+        logger.exception("SSE event_stream interrupted")
+    finally:
+        unregister_client(client)
+
+
+def sync_event_stream(client, heartbeat_interval):
+    try:
+        while True:
+            if client.wait_sync(heartbeat_interval):
+                if client.closed:
+                    # Evicted as a slow consumer; the browser will reconnect
+                    break
+                events = client.pop_all()
+                metrics.record_delivered(events, time.time())
+                # Frames are pre-encoded and shared; just concatenate them
+                yield b"".join(event.frame for event in events)
+            else:
+                metrics.record_heartbeat(len(HEARTBEAT_FRAME))
+                yield HEARTBEAT_FRAME
+    except GeneratorExit:
+        # The WSGI server closes the stream when the browser disconnects
+        logger.info("SSE client disconnected")
+        raise
+    except Exception:
+        logger.exception("SSE event_stream interrupted")
+    finally:
+        unregister_client(client)
+
+
+def sse_metrics_view(request):
+    """Staff-only JSON view of SSE connection and delivery metrics."""
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Staff access required.")
+    return JsonResponse(stats())
+
+
+def sse_metrics_prometheus_view(request):
+    """The same metrics in the Prometheus text exposition format."""
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Staff access required.")
+    return HttpResponse(render_prometheus(stats()), content_type='text/plain; version=0.0.4')
 
 
 def custom_404(request, exception):
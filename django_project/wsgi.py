@@ -2,6 +2,8 @@
 WSGI config for django_project project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
+Media and collected static files are answered by
+``django_project.file_serving`` before a request reaches Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
@@ -13,4 +15,8 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_project.settings")
 
-application = get_wsgi_application()
+django_application = get_wsgi_application()
+
+from .file_serving import FileServingWSGI  # noqa: E402  (needs settings)
+
+application = FileServingWSGI(django_application)
@@ -1,11 +1,32 @@
+from types import GeneratorType
+
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from django.db.models import Count, Max, Min
 from django.shortcuts import get_object_or_404
+from . import fast
+from .bulk import bulk_settings, insert_points, validate_points
+from .conditional import (
+    ConditionalMixin,
+    background_list_validators,
+    background_validators,
+    route_list_validators,
+    route_validators,
+)
+from .geometry import load, points_data, refresh_previews, route_points_data
 from .models import BackgroundImage, Route, RoutePoint
+from .ordering import delete_point, move_point, next_orders
+from .pagination import POINT_FIELDS, STREAM_FORMATS, RoutePointCursorPagination, stream_points
+from .parsers import NDJSONParser, PointCSVParser
+from .simplify import DOUGLAS_PEUCKER, MAX_ZOOM, METHODS, simplified_points, zoom_tolerance
 from .serializers import (
     BackgroundImageSerializer, 
     RouteSerializer, 
+    RouteListSerializer,
     RouteDetailSerializer,
     RoutePointSerializer
 )
@@ -21,56 +42,181 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
             return True
         
         # Write permissions are only allowed to the owner
+        # Compare ids so the owner's row is never fetched
         if isinstance(obj, RoutePoint):
-            return obj.route.user == request.user
-        return obj.user == request.user
+            return obj.route.user_id == request.user.id
+        return obj.user_id == request.user.id
+
+
+def route_points_response(request, route, view):
+    """
+    All of a route's points, or:
 
+    - a simplified subset for ``?tolerance=<float>`` or ``?zoom=<0-24>``;
+      ``?method=`` picks ``douglas-peucker`` (default) or ``visvalingam``
+    - a keyset-paginated page for ``?cursor=`` or ``?page_size=``
+    - a streamed export for ``?stream=ndjson`` or ``?stream=json``
+    """
+    params = request.query_params
+    modes = [
+        mode for mode, keys in (
+            ('simplify', ('tolerance', 'zoom')), ('paginate', ('cursor', 'page_size')), ('stream', ('stream',))
+        ) if any(key in params for key in keys)
+    ]
+    if len(modes) > 1:
+        raise ValidationError({'detail': [f'Cannot combine {" and ".join(modes)} parameters.']})
+    if 'stream' in modes:
+        if params['stream'] not in STREAM_FORMATS:
+            raise ValidationError({'stream': [f'Choose one of: {", ".join(STREAM_FORMATS)}.']})
+        return stream_points(request._request, route, params['stream'])
+    if 'paginate' in modes:
+        paginator = RoutePointCursorPagination()
+        points = RoutePoint.objects.filter(route_id=route.pk).values(*POINT_FIELDS)
+        page = paginator.paginate_queryset(points, request, view=view)
+        return paginator.get_paginated_response(page)
+    if not modes:
+        if fast.enabled():
+            return Response(fast.points_response_data(*load(route)[1:]))
+        return Response(route_points_data(route))
+    method = params.get('method', DOUGLAS_PEUCKER)
+    if method not in METHODS:
+        raise ValidationError({'method': [f'Choose one of: {", ".join(METHODS)}.']})
+    if 'tolerance' in params:
+        try:
+            tolerance = float(params['tolerance'])
+        except ValueError:
+            tolerance = -1.0
+        if not tolerance >= 0:
+            raise ValidationError({'tolerance': ['A non-negative number is required.']})
+    else:
+        zoom = params['zoom']
+        if not zoom.isdigit() or int(zoom) > MAX_ZOOM:
+            raise ValidationError({'zoom': [f'An integer from 0 to {MAX_ZOOM} is required.']})
+        tolerance = zoom_tolerance(int(zoom))
+    kept = simplified_points(route, tolerance, method)
+    if fast.enabled():
+        return Response(fast.points_response_data(*kept))
+    return Response(points_data(*kept))
+
+
+# Same renderers as the defaults, but pre-encoded fast path output passes
+# straight through
+FAST_RENDERER_CLASSES = [
+    fast.FastJSONRenderer if renderer is JSONRenderer else renderer
+    for renderer in api_settings.DEFAULT_RENDERER_CLASSES
+]
 
-class BackgroundImageViewSet(viewsets.ReadOnlyModelViewSet):
+
+class BackgroundImageViewSet(ConditionalMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint that allows background images to be viewed.
     """
     queryset = BackgroundImage.objects.all()
     serializer_class = BackgroundImageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = FAST_RENDERER_CLASSES
+
+    def get_object(self):
+        background = super().get_object()
+        self.check_preconditions(background_validators(background))
+        return background
 
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        self.check_preconditions(background_list_validators(queryset))
+        if not fast.enabled():
+            return super().list(request, *args, **kwargs)
+        rows = queryset.values_list(*fast.BACKGROUND_FIELDS)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(fast.backgrounds_data(page, request))
+        return Response(fast.backgrounds_data(rows, request))
 
-class RouteViewSet(viewsets.ModelViewSet):
+
+class RouteViewSet(ConditionalMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows routes to be viewed or edited.
     """
     serializer_class = RouteSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
+    renderer_classes = FAST_RENDERER_CLASSES
     
     def get_queryset(self):
         """
         This view should return a list of all the routes
         for the currently authenticated user.
         """
-        return Route.objects.filter(user=self.request.user)
+        queryset = Route.objects.filter(user=self.request.user)
+        if self.action == 'list':
+            # Everything RouteListSerializer shows comes from this one
+            # query; previews are refreshed in bulk by list()
+            return queryset.select_related('background').defer('geometry').annotate(
+                point_count=Count('points'),
+                min_x=Min('points__x'),
+                min_y=Min('points__y'),
+                max_x=Max('points__x'),
+                max_y=Max('points__y'),
+            )
+        # The packed geometry is fetched on its own when points are read
+        return queryset.select_related('background').defer('geometry')
     
     def get_serializer_class(self):
+        if self.action == 'list':
+            return RouteListSerializer
         if self.action == 'retrieve':
             return RouteDetailSerializer
         return RouteSerializer
+
+    def get_object(self):
+        # Reads answer 304 and stale writes 412 before any real work
+        route = super().get_object()
+        self.check_preconditions(route_validators(route))
+        return route
+
+    def list(self, request, *args, **kwargs):
+        self.check_preconditions(route_list_validators(Route.objects.filter(user=request.user)))
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        routes = page if page is not None else list(queryset)
+        # Stale previews in one query for the whole page, not one per route
+        refresh_previews(routes)
+        serializer = self.get_serializer(routes, many=True)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not fast.enabled():
+            return super().retrieve(request, *args, **kwargs)
+        route = self.get_object()
+        return Response(fast.route_detail_data(route, load(route)[1:], self.get_serializer_context()))
     
     @action(detail=True, methods=['get'])
     def points(self, request, pk=None):
         """
-        Returns a list of all the route points for the specified route.
+        Returns the route points for the specified route; see
+        route_points_response for simplified, paginated and streamed modes.
         """
-        route = self.get_object()
-        points = route.points.all().order_by('order')
-        serializer = RoutePointSerializer(points, many=True)
-        return Response(serializer.data)
+        return route_points_response(request, self.get_object(), self)
 
 
-class RoutePointViewSet(viewsets.ModelViewSet):
+class RoutePointViewSet(ConditionalMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows route points to be viewed or edited.
+
+    POSTing a JSON array, an NDJSON body (``application/x-ndjson``) or a
+    CSV body (``text/csv``) of ``x,y`` pairs appends all of them to the
+    route in one request.
+
+    Points share their route's validators: ``If-Match`` with the route's
+    ETag makes any point write conditional on nobody else having edited it.
     """
     serializer_class = RoutePointSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES + [NDJSONParser, PointCSVParser]
+    renderer_classes = FAST_RENDERER_CLASSES
+    # Listed whole by default; see route_points_response for cursor pages
+    pagination_class = None
     
     def get_queryset(self):
         """
@@ -79,40 +225,76 @@ class RoutePointViewSet(viewsets.ModelViewSet):
         """
         route_id = self.kwargs.get('route_pk')
         if route_id is not None:
-            route = get_object_or_404(Route, id=route_id, user=self.request.user)
-            return RoutePoint.objects.filter(route=route).order_by('order')
+            # One joined query; points of other users' routes simply don't match
+            return RoutePoint.objects.filter(
+                route_id=route_id, route__user=self.request.user
+            ).select_related('route__background').defer('route__geometry').order_by('order')
         return RoutePoint.objects.none()
+
+    def get_object(self):
+        point = super().get_object()
+        self.check_preconditions(route_validators(point.route))
+        return point
+
+    def get_route(self):
+        """The route named in the URL, if the current user owns it."""
+        routes = Route.objects.filter(user=self.request.user).select_related('background').only(
+            'id', 'user', 'version', 'geometry_version', 'updated', 'background__version', 'background__updated'
+        )
+        route = get_object_or_404(routes, id=self.kwargs.get('route_pk'))
+        self.check_preconditions(route_validators(route))
+        return route
     
-    def perform_create(self, serializer):
-        """
-        Associate the point with the specified route.
-        """
-        route_id = self.kwargs.get('route_pk')
-        route = get_object_or_404(Route, id=route_id, user=self.request.user)
-        # Set the order to be the last
-        order = route.points.count()
-        serializer.save(route=route, order=order)
-    
+    def list(self, request, *args, **kwargs):
+        return route_points_response(request, self.get_route(), self)
+
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
-        route = instance.route
-        instance.delete()
-        
-        # Reorder remaining points
-        for i, point in enumerate(route.points.all().order_by('order')):
-            if point.order != i:
-                point.order = i
-                point.save()
-        
+        # Order keys are sparse, so the remaining points need no renumbering
+        delete_point(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def move(self, request, *args, **kwargs):
+        """
+        Move a point to ``position`` (0-based) within its route.
+        """
+        instance = self.get_object()
+        try:
+            position = int(request.data.get('position'))
+        except (TypeError, ValueError):
+            return Response(
+                {'position': ['A valid integer is required.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        move_point(instance, max(position, 0))
+        return Response(self.get_serializer(instance).data)
     
     def create(self, request, *args, **kwargs):
         """
         Override create to ensure proper handling of POST requests.
         """
-        route_id = self.kwargs.get('route_pk')
-        route = get_object_or_404(Route, id=route_id, user=request.user)
+        route = self.get_route()
+        if isinstance(request.data, (list, GeneratorType)):
+            # A JSON array, or the NDJSON and CSV parsers' generators
+            return self.bulk_create(request, route)
+        if not isinstance(request.data, dict):
+            return Response({'errors': ['Expected a list of points.']}, status=status.HTTP_400_BAD_REQUEST)
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save(route=route, order=route.points.count())
+        serializer.save(route=route, order=next_orders(route)[0])
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def bulk_create(self, request, route):
+        """
+        Validate every uploaded point before writing any of them, then
+        insert them with ``bulk_create`` in chunks.
+        """
+        batch_size, max_points = bulk_settings()
+        coordinates, errors = validate_points(request.data, max_points)
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        start = insert_points(route, coordinates, batch_size)
+        return Response(
+            {'created': len(coordinates), 'first_order': start},
+            status=status.HTTP_201_CREATED
+        )
@@ -0,0 +1,137 @@
+"""
+Indexed form of ``GameBoard.dots``.
+
+``dots`` is a list of ``{row, col, color}`` objects, so asking what is at
+a cell means scanning it. ``BoardIndex`` holds the same dots as a dense
+row-major grid of palette indexes (0 for an empty cell) plus a
+colour -> pair table, so both lookups are constant time.
+
+Boards store the index in ``GameBoard.cells`` in a compact encoding,
+next to ``dots``::
+
+    {"v": 1, "palette": ["#ff0000", ...], "runs": [count, value, ...]}
+
+``runs`` is the run-length coded grid: ``count`` cells in a row holding
+``value``, where ``value`` is 0 for empty or ``i`` for ``palette[i - 1]``.
+Mostly empty boards encode to a few dozen numbers whatever their size.
+``draw_path.ts`` decodes the same format.
+
+Dots outside the grid or without a colour are not indexed. If two dots
+share a cell the first one wins, as with ``dots.find(...)``.
+"""
+from array import array
+
+ENCODING_VERSION = 1
+# Boards larger than this are refused rather than indexed
+MAX_CELLS = 1000 * 1000
+
+
+class BoardIndex:
+    def __init__(self, rows, cols, palette, cells, pairs):
+        self.rows = rows
+        self.cols = cols
+        # Distinct colours in order of first appearance
+        self.palette = palette
+        # array('H'): up to 65535 colours in two bytes a cell
+        self.cells = cells
+        # Colour -> [(row, col), ...]
+        self.pairs = pairs
+
+    @classmethod
+    def from_dots(cls, rows, cols, dots):
+        rows, cols = int(rows), int(cols)
+        if rows * cols > MAX_CELLS:
+            raise ValueError(f"A {rows}x{cols} board has more than {MAX_CELLS} cells")
+        cells = array('H', [0]) * max(rows * cols, 0)
+        palette = []
+        pairs = {}
+        codes = {}
+        for dot in dots or ():
+            try:
+                row, col, color = int(dot['row']), int(dot['col']), dot['color']
+            except (KeyError, TypeError, ValueError):
+                continue
+            if not (0 <= row < rows and 0 <= col < cols) or not color:
+                continue
+            position = row * cols + col
+            if cells[position]:
+                continue
+            if color not in codes:
+                palette.append(color)
+                codes[color] = len(palette)
+                pairs[color] = []
+            cells[position] = codes[color]
+            pairs[color].append((row, col))
+        return cls(rows, cols, palette, cells, pairs)
+
+    @classmethod
+    def decode(cls, rows, cols, data):
+        """Index from ``encode()`` output; ValueError if it does not fit the board."""
+        if not data or data.get('v') != ENCODING_VERSION:
+            raise ValueError("Unknown board encoding")
+        palette = list(data['palette'])
+        runs = data['runs']
+        total = sum(runs[0::2])
+        if total != rows * cols or len(runs) % 2:
+            raise ValueError(f"Encoded {total} cells for a {rows}x{cols} board")
+        cells = array('H', [0]) * total
+        pairs = {color: [] for color in palette}
+        position = 0
+        for count, value in zip(runs[0::2], runs[1::2]):
+            if count < 0 or not 0 <= value <= len(palette):
+                raise ValueError(f"Run of {count} x {value} does not fit the palette")
+            if value:
+                color = palette[value - 1]
+                for cell in range(position, position + count):
+                    cells[cell] = value
+                    pairs[color].append(divmod(cell, cols))
+            position += count
+        return cls(rows, cols, palette, cells, pairs)
+
+    @classmethod
+    def for_board(cls, board):
+        """The stored index of ``board``, or one built from its dots."""
+        try:
+            return cls.decode(board.rows, board.cols, board.cells)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return cls.from_dots(board.rows, board.cols, board.dots)
+
+    def encode(self):
+        runs = []
+        previous, count = None, 0
+        for value in self.cells:
+            if value == previous:
+                count += 1
+                continue
+            if count:
+                runs += (count, previous)
+            previous, count = value, 1
+        if count:
+            runs += (count, previous)
+        return {'v': ENCODING_VERSION, 'palette': list(self.palette), 'runs': runs}
+
+    def color_at(self, row, col):
+        """Colour of the dot at a cell, or None if it is empty or off the board."""
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            return None
+        value = self.cells[row * self.cols + col]
+        return self.palette[value - 1] if value else None
+
+    def dot_at(self, row, col):
+        color = self.color_at(row, col)
+        return None if color is None else {'row': row, 'col': col, 'color': color}
+
+    def pair(self, color):
+        """``(row, col)`` cells of the dots of one colour."""
+        return self.pairs.get(color, [])
+
+    def to_dots(self):
+        return [
+            {'row': row, 'col': col, 'color': color}
+            for color in self.palette for row, col in self.pairs[color]
+        ]
+
+
+def encode_dots(rows, cols, dots):
+    """The ``GameBoard.cells`` value for a board's dots."""
+    return BoardIndex.from_dots(rows, cols, dots).encode()
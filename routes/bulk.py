@@ -0,0 +1,85 @@
+"""
+Validation and insertion for bulk route point uploads.
+"""
+import math
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import RoutePoint, invalidate_route_geometry
+from .ordering import next_orders
+
+# Stop collecting errors after this many; the client has enough to go on
+MAX_REPORTED_ERRORS = 50
+
+
+def bulk_settings():
+    options = getattr(settings, 'ROUTE_POINTS_BULK', {})
+    return options.get('BATCH_SIZE', 1000), options.get('MAX_POINTS', 100000)
+
+
+def _coordinate(value):
+    """Mirror ``FloatField`` validation without building a serializer per point."""
+    if isinstance(value, bool):
+        raise ValueError('A valid number is required.')
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('A valid number is required.')
+    if not math.isfinite(number):
+        raise ValueError('A finite number is required.')
+    return number
+
+
+def validate_points(items, max_points):
+    """
+    Check every item in one pass. Returns ``(coordinates, errors)`` where
+    ``coordinates`` is a list of ``(x, y)`` floats and ``errors`` a list of
+    ``{'index': i, 'errors': {...}}`` entries.
+    """
+    coordinates = []
+    errors = []
+    for index, item in enumerate(items):
+        if index >= max_points:
+            errors.append({'index': index, 'errors': {
+                'non_field_errors': [f'At most {max_points} points can be uploaded at once.']
+            }})
+            break
+        if not isinstance(item, dict):
+            item_errors = {'non_field_errors': ['Expected an object with x and y.']}
+        else:
+            item_errors = {}
+            point = []
+            for field in ('x', 'y'):
+                if item.get(field) in (None, ''):
+                    item_errors[field] = ['This field is required.']
+                    continue
+                try:
+                    point.append(_coordinate(item[field]))
+                except ValueError as exc:
+                    item_errors[field] = [str(exc)]
+            if not item_errors:
+                coordinates.append(tuple(point))
+                continue
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({'index': index, 'errors': item_errors})
+    return coordinates, errors
+
+
+def insert_points(route, coordinates, batch_size):
+    """
+    Append ``coordinates`` to ``route`` with increasing ``order`` keys, in
+    ``batch_size`` INSERTs inside one transaction. Returns the first order
+    assigned.
+    """
+    with transaction.atomic():
+        orders = next_orders(route, len(coordinates))
+        RoutePoint.objects.bulk_create(
+            (
+                RoutePoint(route=route, x=x, y=y, order=order)
+                for order, (x, y) in zip(orders, coordinates)
+            ),
+            batch_size=batch_size,
+        )
+        invalidate_route_geometry(route.pk)
+    return orders.start
@@ -0,0 +1,138 @@
+"""
+HTTP validators for route, background and board responses.
+
+Each representation gets a strong ETag built from version counters and a
+Last-Modified date. Both come from the row itself, or from a single
+aggregate query, without loading points or paths. A GET whose
+``If-None-Match`` or ``If-Modified-Since`` still matches is answered with
+304 before anything is serialized. A write whose ``If-Match`` no longer
+matches is refused with 412, which gives clients optimistic concurrency.
+"""
+from django.db.models import Count, Max, Q, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import permissions
+
+from .models import GameBoard
+
+
+def _etag(*parts):
+    return quote_etag('-'.join(str(part) for part in parts))
+
+
+def _timestamp(*dates):
+    dates = [date for date in dates if date is not None]
+    return int(max(dates).timestamp()) if dates else None
+
+
+def route_validators(route):
+    """
+    Validators for a route's detail and points. Needs ``version``,
+    ``geometry_version``, ``updated`` and the background's ``version``
+    and ``updated``, but neither the points nor the packed geometry.
+    """
+    background = route.background
+    etag = _etag('route', route.pk, route.version, route.geometry_version, background.pk, background.version)
+    return etag, _timestamp(route.updated, background.updated)
+
+
+def route_list_validators(routes):
+    """Validators for a list of routes, from one aggregate query."""
+    summary = routes.order_by().aggregate(
+        count=Count('id'),
+        last_id=Max('id'),
+        versions=Sum('version'),
+        geometry_versions=Sum('geometry_version'),
+        background_versions=Sum('background__version'),
+        updated=Max('updated'),
+        background_updated=Max('background__updated'),
+    )
+    etag = _etag(
+        'routes', summary['count'], summary['last_id'], summary['versions'],
+        summary['geometry_versions'], summary['background_versions']
+    )
+    return etag, _timestamp(summary['updated'], summary['background_updated'])
+
+
+def background_validators(background):
+    return _etag('background', background.pk, background.version), _timestamp(background.updated)
+
+
+def background_list_validators(backgrounds):
+    summary = backgrounds.order_by().aggregate(
+        count=Count('id'), last_id=Max('id'), versions=Sum('version'), updated=Max('updated')
+    )
+    etag = _etag('backgrounds', summary['count'], summary['last_id'], summary['versions'])
+    return etag, _timestamp(summary['updated'])
+
+
+def board_validators(board_id, username=None):
+    """
+    Validators for ``board_snapshot``: the board's own version plus a
+    summary of the versions of the paths it shows. None for a missing board.
+    """
+    shown = Q(paths__user__username=username) if username else None
+    summary = GameBoard.objects.filter(pk=board_id).values('version', 'updated').annotate(
+        path_count=Count('paths', filter=shown),
+        path_versions=Sum('paths__version', filter=shown),
+        paths_updated=Max('paths__updated', filter=shown),
+    ).order_by('pk').first()
+    if summary is None:
+        return None
+    etag = _etag('board', board_id, summary['version'], summary['path_count'], summary['path_versions'] or 0)
+    return etag, _timestamp(summary['updated'], summary['paths_updated'])
+
+
+def conditional_response(request, validators):
+    """A 304 or 412 response if the request's preconditions say so, else None."""
+    if validators is None:
+        return None
+    etag, last_modified = validators
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def set_validators(response, validators):
+    if validators is None or not 200 <= response.status_code < 300:
+        return response
+    etag, last_modified = validators
+    response.headers.setdefault('ETag', etag)
+    if last_modified is not None:
+        response.headers.setdefault('Last-Modified', http_date(last_modified))
+    return response
+
+
+class PreconditionResponse(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+class ConditionalMixin:
+    """
+    For viewsets: call ``check_preconditions(validators)`` once the cheap
+    validators are known and before doing the expensive work. A matching
+    ``If-None-Match`` ends the request with 304, a stale ``If-Match`` with
+    412. Successful reads carry ``ETag`` and ``Last-Modified``.
+    """
+    validators = None
+
+    def check_preconditions(self, validators):
+        etag, last_modified = validators
+        # One URL serves JSON and the browsable API; keep their tags apart
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        if renderer is not None and renderer.format != 'json':
+            etag = f'{etag[:-1]}-{renderer.format}"'
+        self.validators = (etag, last_modified)
+        response = conditional_response(self.request, self.validators)
+        if response is not None:
+            raise PreconditionResponse(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, PreconditionResponse):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method in permissions.SAFE_METHODS:
+            set_validators(response, self.validators)
+        return response
@@ -0,0 +1,106 @@
+"""
+Compact diffs between two persisted states of a board or a set of paths.
+
+Notifications carry these diffs instead of the full ``dots`` list or
+``paths_data`` dict, tagged with the version they apply on top of.
+"""
+
+
+def _dot_key(dot):
+    return (dot.get('row'), dot.get('col'), dot.get('color'))
+
+
+def diff_dots(old, new):
+    """
+    Return the dots added and removed between two ``GameBoard.dots`` lists.
+    A dot that changed colour shows up as removed and re-added.
+    """
+    old_keys = {_dot_key(dot) for dot in old}
+    new_keys = {_dot_key(dot) for dot in new}
+    return {
+        'added': [dot for dot in new if _dot_key(dot) not in old_keys],
+        'removed': [dot for dot in old if _dot_key(dot) not in new_keys],
+    }
+
+
+def apply_dots_delta(dots, delta):
+    removed = {_dot_key(dot) for dot in delta['removed']}
+    return [dot for dot in dots if _dot_key(dot) not in removed] + delta['added']
+
+
+def _common_prefix(old, new):
+    length = min(len(old), len(new))
+    for i in range(length):
+        if old[i] != new[i]:
+            return i
+    return length
+
+
+def diff_paths(old, new):
+    """
+    Return per-colour edits between two ``GamePath.paths_data`` dicts.
+
+    Each changed colour maps to ``{'keep': n, 'append': [...]}``: keep the
+    first ``n`` cells of the old path, then append the new cells. A colour
+    whose path was removed keeps nothing and appends nothing.
+    """
+    delta = {}
+    for color in old.keys() | new.keys():
+        old_path = old.get(color, [])
+        new_path = new.get(color, [])
+        if old_path == new_path:
+            continue
+        keep = _common_prefix(old_path, new_path)
+        delta[color] = {'keep': keep, 'append': new_path[keep:]}
+    return delta
+
+
+def apply_paths_delta(paths, delta):
+    result = dict(paths)
+    for color, edit in delta.items():
+        path = result.get(color, [])[:edit['keep']] + edit['append']
+        if path:
+            result[color] = path
+        else:
+            result.pop(color, None)
+    return result
+
+
+def compose_paths_deltas(first, second):
+    """Combine two consecutive path deltas into one equivalent delta."""
+    result = dict(first)
+    for color, edit in second.items():
+        earlier = first.get(color)
+        if earlier is None or edit['keep'] <= earlier['keep']:
+            result[color] = edit
+        else:
+            # The second edit keeps part of what the first one appended
+            kept = earlier['append'][:edit['keep'] - earlier['keep']]
+            result[color] = {'keep': earlier['keep'], 'append': kept + edit['append']}
+    return result
+
+
+def merge_path_messages(older, newer):
+    """
+    Merge two pending notifications for the same player's paths on the
+    same board into one that takes a client from ``older``'s base state
+    straight to ``newer``'s.
+    """
+    if 'paths_data' in older and 'paths_data' not in newer:
+        # Keep the snapshot, with keys deltas do not carry, and bring it
+        # up to date
+        merged = dict(older)
+        merged['paths_data'] = apply_paths_delta(older['paths_data'], newer['paths_delta'])
+        merged['version'] = newer['version']
+        if 'completed' in newer:
+            merged['completed'] = newer['completed']
+        return merged
+    merged = dict(newer)
+    # A client that has not yet heard about the paths must still be told
+    # they were created
+    merged['type'] = older['type']
+    if 'paths_data' in newer:
+        return merged
+    merged['base_version'] = older['base_version']
+    merged['paths_delta'] = compose_paths_deltas(older['paths_delta'], newer['paths_delta'])
+    return merged
@@ -0,0 +1,221 @@
+"""
+Resized, re-encoded copies of background images.
+
+Uploads are often multi-megabyte PNGs or JPEGs, while the background
+picker only shows 200px cards. Each upload is rendered once into a
+thumbnail, a medium and a full-size copy, each as WebP and as JPEG.
+The copies are stored under a name derived from the SHA-256 of the
+original, so they can be cached forever and are shared by identical
+uploads.
+
+``BackgroundImage.derivative_hash`` records which source the stored
+copies belong to. Until it is set, URLs point at the ``background_derivative``
+view, which renders on first request. Choose when rendering happens with
+``BACKGROUND_DERIVATIVES['MODE']``:
+
+- ``'thread'`` (default): in a worker pool once the upload commits
+- ``'inline'``: on the saving request
+- ``'lazy'``: only on first request
+"""
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, models, transaction
+from django.db.models.functions import Now
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Name, bounding box in pixels (None keeps the original size)
+SIZES = (('thumbnail', 400), ('medium', 1280), ('full', None))
+SIZE_NAMES = tuple(name for name, _ in SIZES)
+
+# Extension, Pillow format, encoder options
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+)
+FORMAT_NAMES = tuple(ext for ext, _, _ in FORMATS)
+
+DIRECTORY = 'backgrounds/derivatives'
+
+_pool = None
+_pool_pid = None
+_pending = {}
+_lock = threading.Lock()
+
+
+def derivative_settings():
+    config = getattr(settings, 'BACKGROUND_DERIVATIVES', {})
+    return config.get('MODE', 'thread'), config.get('WORKERS', 2)
+
+
+def derivative_name(digest, size, ext):
+    return f'{DIRECTORY}/{digest[:2]}/{digest}-{size}.{ext}'
+
+
+def derivative_urls(background_id, digest, request=None):
+    """
+    ``{size: {ext: url}}`` for one background. Stored copies are linked
+    directly; missing ones go through the rendering view.
+    """
+    urls = {}
+    for size in SIZE_NAMES:
+        urls[size] = {}
+        for ext in FORMAT_NAMES:
+            if digest:
+                url = default_storage.url(derivative_name(digest, size, ext))
+            else:
+                url = reverse('background_derivative', args=[background_id, size, ext])
+            urls[size][ext] = request.build_absolute_uri(url) if request is not None else url
+    return urls
+
+
+def _scaled(image, box):
+    if box is None or max(image.size) <= box:
+        return image
+    scaled = image.copy()
+    # reducing_gap shrinks by whole factors first, which is much faster
+    scaled.thumbnail((box, box), Image.LANCZOS, reducing_gap=3.0)
+    return scaled
+
+
+def _flatten(image):
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        # JPEG has no alpha; maps are shown on white
+        rgba = image.convert('RGBA')
+        flat = Image.new('RGB', rgba.size, 'white')
+        flat.paste(rgba, mask=rgba.getchannel('A'))
+        return flat
+    return image.convert('RGB')
+
+
+def render(source_name, digest='', storage=default_storage):
+    """
+    Write every derivative of ``source_name`` that is not stored yet and
+    return the content hash naming them. ``digest`` is the source's
+    SHA-256 if already known; the source is then only read when a
+    derivative is missing.
+    """
+    data = None
+    if not digest:
+        data = _read(source_name, storage)
+        digest = hashlib.sha256(data).hexdigest()
+    missing = [
+        (size, box) for size, box in SIZES
+        if not all(storage.exists(derivative_name(digest, size, ext)) for ext in FORMAT_NAMES)
+    ]
+    if not missing:
+        return digest
+    if data is None:
+        data = _read(source_name, storage)
+    with Image.open(BytesIO(data)) as original:
+        image = _flatten(original)
+    # Largest first, each size scaled down from the previous one
+    for size, box in reversed(missing):
+        image = _scaled(image, box)
+        for ext, pillow_format, options in FORMATS:
+            name = derivative_name(digest, size, ext)
+            if storage.exists(name):
+                continue
+            buffer = BytesIO()
+            image.save(buffer, pillow_format, **options)
+            storage.save(name, ContentFile(buffer.getvalue()))
+    return digest
+
+
+def _read(source_name, storage):
+    with storage.open(source_name, 'rb') as source:
+        return source.read()
+
+
+def _render_and_record(model, pk, source_name, content_hash):
+    digest = render(source_name, content_hash)
+    # Only if the image was not replaced meanwhile; the new URLs change
+    # the representation, so count it as a new version
+    model.objects.filter(pk=pk, image=source_name).update(
+        derivative_hash=digest, version=models.F('version') + 1, updated=Now()
+    )
+    return digest
+
+
+def _render_in_worker(*key):
+    try:
+        return _render_and_record(*key)
+    finally:
+        # Pool threads outlive requests; don't hold a connection open
+        connection.close()
+
+
+def _get_pool(workers):
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='derivatives')
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def _report(future):
+    error = future.exception()
+    if error is not None:
+        logger.error("Background derivatives failed", exc_info=error)
+
+
+def _key(background):
+    return (type(background), background.pk, background.image.name, background.content_hash)
+
+
+def submit(background):
+    """Start rendering ``background``'s derivatives in the worker pool."""
+    key = _key(background)
+    _, workers = derivative_settings()
+    with _lock:
+        future = _pending.get(key)
+        if future is None:
+            future = _get_pool(workers).submit(_render_in_worker, *key)
+            _pending[key] = future
+            future.add_done_callback(_report)
+            future.add_done_callback(lambda done: _forget(key, done))
+    return future
+
+
+def _forget(key, future):
+    with _lock:
+        if _pending.get(key) is future:
+            del _pending[key]
+
+
+def schedule(background):
+    """Render derivatives for a freshly uploaded image, per ``MODE``."""
+    mode, _ = derivative_settings()
+    if mode == 'lazy' or not background.image:
+        return
+    if mode == 'inline':
+        background.derivative_hash = _render_and_record(*_key(background))
+        background.version += 1
+    else:
+        transaction.on_commit(lambda: submit(background))
+
+
+def ensure(background):
+    """
+    The content hash of ``background``'s derivatives, rendering them on
+    this thread if need be. Waits for a render already running in the
+    pool rather than starting a second one.
+    """
+    if background.derivative_hash:
+        return background.derivative_hash
+    with _lock:
+        future = _pending.get(_key(background))
+    if future is not None:
+        return future.result()
+    return _render_and_record(*_key(background))
@@ -0,0 +1,95 @@
+"""
+Fast serialization for the read-heavy route endpoints.
+
+The DRF serializers run every field of every object through
+``to_representation``. For the route detail, the point lists and the
+background list this module builds the same output directly from packed
+columns or ``values_list`` tuples, byte for byte what ``JSONRenderer``
+would produce. Turn it off with ``ROUTES_FAST_SERIALIZERS = False``.
+"""
+import json
+
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+
+from .derivatives import derivative_urls
+from .models import BackgroundImage
+from .tiles import tiles_url
+from .serializers import RouteDetailSerializer
+
+# JSONRenderer's compact separators; repr() of a finite float is exactly
+# what json.dumps writes for it
+POINT_TEMPLATE = '{{"id":{0},"x":{1!r},"y":{2!r},"order":{3}}}'
+
+
+def enabled():
+    return getattr(settings, 'ROUTES_FAST_SERIALIZERS', True)
+
+
+class RawJSON(bytes):
+    """Response data that is already encoded JSON."""
+
+
+class FastJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` that passes ``RawJSON`` through untouched."""
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, RawJSON):
+            if self.get_indent(accepted_media_type, renderer_context or {}) is None:
+                return bytes(data)
+            # Indented output was asked for; re-encode the slow way
+            data = json.loads(data)
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+def points_json(ids, xs, ys, orders):
+    """Encode packed point columns as a JSON array of point objects."""
+    return '[' + ','.join(map(POINT_TEMPLATE.format, ids, xs, ys, orders)) + ']'
+
+
+def points_response_data(ids, xs, ys, orders):
+    return RawJSON(points_json(ids, xs, ys, orders).encode())
+
+
+class RouteHeaderSerializer(RouteDetailSerializer):
+    """Everything RouteDetailSerializer shows except the points."""
+    points = None
+
+    class Meta(RouteDetailSerializer.Meta):
+        fields = [field for field in RouteDetailSerializer.Meta.fields if field != 'points']
+
+
+def route_detail_data(route, columns, context):
+    """
+    The route detail with its points spliced in as pre-encoded JSON. The
+    header is one object, so it still goes through DRF; ``points`` is the
+    last field, so it is appended before the closing brace.
+    """
+    header = JSONRenderer().render(RouteHeaderSerializer(route, context=context).data)
+    return RawJSON(header[:-1] + b',"points":' + points_json(*columns).encode() + b'}')
+
+
+BACKGROUND_FIELDS = (
+    'id', 'title', 'image', 'width', 'height', 'file_size', 'dominant_color', 'derivative_hash'
+)
+
+
+def backgrounds_data(rows, request):
+    """
+    ``BackgroundImageSerializer`` output for ``values_list(*BACKGROUND_FIELDS)``
+    tuples, without building a model instance or a field file per row.
+    """
+    storage = BackgroundImage._meta.get_field('image').storage
+    data = []
+    for pk, title, name, width, height, file_size, color, digest in rows:
+        url = None
+        if name:
+            url = storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+        data.append({
+            'id': pk, 'title': title, 'image': url,
+            'width': width, 'height': height, 'file_size': file_size, 'dominant_color': color,
+            'derivatives': derivative_urls(pk, digest, request),
+            'tiles': tiles_url(pk, name, request),
+        })
+    return data
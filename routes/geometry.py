@@ -0,0 +1,188 @@
+"""
+Packed route geometry.
+
+``Route.geometry`` caches a route's points as one blob so a read is a
+single column fetch and an ``array`` decode instead of one model instance
+per point. Layout (little-endian)::
+
+    header   magic b'RPG1', geometry_version (uint32), point count (uint32)
+    ids      int64  x count
+    orders   int64  x count
+    xs       float64 x count
+    ys       float64 x count
+
+Coordinates stay float64 so they round-trip ``RoutePoint.x``/``y`` exactly.
+
+The blob is stamped with the ``Route.geometry_version`` it was built
+from. Every point edit bumps the version (see ``invalidate_route_geometry``),
+and a blob whose stamp no longer matches is rebuilt on the next read.
+
+``Route.preview`` holds the few points list views draw, stamped the same
+way and written with the blob, so listing routes never reads the blob.
+"""
+import struct
+import sys
+from array import array
+from collections import namedtuple
+
+from .models import Route, RoutePoint
+
+HEADER = struct.Struct('<4sII')
+MAGIC = b'RPG1'
+
+# Points in the polyline shown for each route in list views
+PREVIEW_POINTS = 32
+
+PackedPoint = namedtuple('PackedPoint', ['id', 'x', 'y', 'order'])
+
+
+def _to_bytes(values):
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def columns(rows):
+    """Split ``(id, x, y, order)`` rows into ``(ids, xs, ys, orders)`` arrays."""
+    ids, xs, ys, orders = array('q'), array('d'), array('d'), array('q')
+    for point_id, x, y, order in rows:
+        ids.append(point_id)
+        xs.append(x)
+        ys.append(y)
+        orders.append(order)
+    return ids, xs, ys, orders
+
+
+def pack(version, rows):
+    """Pack ``(id, x, y, order)`` rows, already in route order."""
+    ids, xs, ys, orders = columns(rows)
+    return b''.join([
+        HEADER.pack(MAGIC, version, len(ids)),
+        _to_bytes(ids), _to_bytes(orders), _to_bytes(xs), _to_bytes(ys),
+    ])
+
+
+def unpack(blob):
+    """Return ``(version, ids, xs, ys, orders)``, or None for a foreign blob."""
+    blob = bytes(blob)
+    if len(blob) < HEADER.size:
+        return None
+    magic, version, count = HEADER.unpack_from(blob)
+    if magic != MAGIC or len(blob) != HEADER.size + count * 32:
+        return None
+    size = count * 8
+    offset = HEADER.size
+    ids = _from_bytes('q', blob[offset:offset + size])
+    orders = _from_bytes('q', blob[offset + size:offset + 2 * size])
+    xs = _from_bytes('d', blob[offset + 2 * size:offset + 3 * size])
+    ys = _from_bytes('d', blob[offset + 3 * size:])
+    return version, ids, xs, ys, orders
+
+
+def _rebuild(route_id, version):
+    rows = list(
+        RoutePoint.objects.filter(route_id=route_id)
+        .order_by('order', 'id')
+        .values_list('id', 'x', 'y', 'order')
+    )
+    # Only store the blob if no edit has landed since ``version`` was read
+    Route.objects.filter(pk=route_id, geometry_version=version).update(
+        geometry=pack(version, rows), preview=preview(version, rows)
+    )
+    return columns(rows)
+
+
+def load(route):
+    """
+    Return ``(version, ids, xs, ys, orders)`` for ``route``, decoded from
+    the packed geometry and rebuilding it first if it is stale.
+    """
+    version, blob = Route.objects.filter(pk=route.pk).values_list('geometry_version', 'geometry').get()
+    decoded = unpack(blob) if blob else None
+    if decoded is None or decoded[0] != version:
+        return (version,) + _rebuild(route.pk, version)
+    return decoded
+
+
+def route_points(route):
+    """The route's points as ``PackedPoint`` tuples in route order."""
+    _, ids, xs, ys, orders = load(route)
+    return list(map(PackedPoint, ids, xs, ys, orders))
+
+
+def points_data(ids, xs, ys, orders):
+    """Columns shaped like ``RoutePointSerializer(many=True).data``."""
+    return [
+        {'id': point_id, 'x': x, 'y': y, 'order': order}
+        for point_id, x, y, order in zip(ids, xs, ys, orders)
+    ]
+
+
+def route_points_data(route):
+    return points_data(*load(route)[1:])
+
+
+def _sample(count, size):
+    if count <= size:
+        return range(count)
+    step = (count - 1) / (size - 1)
+    return [round(i * step) for i in range(size)]
+
+
+def preview(version, rows, size=PREVIEW_POINTS):
+    """The ``Route.preview`` value for ``(id, x, y, order)`` rows in route order."""
+    return {'version': version, 'points': [[rows[i][1], rows[i][2]] for i in _sample(len(rows), size)]}
+
+
+def _current_preview(route):
+    stored = route.preview
+    if stored and stored.get('version') == route.geometry_version:
+        return stored['points']
+    return None
+
+
+def refresh_previews(routes):
+    """
+    Rebuild the geometry of every route in ``routes`` whose preview is
+    stale: one query for all their points and one bulk UPDATE, however
+    many routes there are.
+    """
+    stale = {route.pk: route for route in routes if _current_preview(route) is None}
+    if not stale:
+        return
+    rows = {pk: [] for pk in stale}
+    points = (
+        RoutePoint.objects.filter(route_id__in=stale)
+        .order_by('route_id', 'order', 'id')
+        .values_list('route_id', 'id', 'x', 'y', 'order')
+    )
+    for route_id, *row in points:
+        rows[route_id].append(row)
+    for pk, route in stale.items():
+        # Stamped with the version read with the route: if an edit landed
+        # since, the stamp no longer matches and the next read rebuilds
+        route.geometry = pack(route.geometry_version, rows[pk])
+        route.preview = preview(route.geometry_version, rows[pk])
+    Route.objects.bulk_update(stale.values(), ['geometry', 'preview'])
+
+
+def route_preview(route):
+    """
+    Up to ``PREVIEW_POINTS`` evenly spaced ``[x, y]`` pairs along
+    ``route``. Call ``refresh_previews`` first when listing many routes;
+    otherwise a stale preview is rebuilt here.
+    """
+    points = _current_preview(route)
+    if points is None:
+        refresh_previews([route])
+        points = route.preview['points']
+    return points
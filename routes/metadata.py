@@ -0,0 +1,85 @@
+"""
+Facts about an uploaded background, worked out once at upload time.
+
+Dimensions, byte size, SHA-256 and a dominant colour are stored on
+``BackgroundImage``, so listing and rendering backgrounds never opens
+the image files. The SHA-256 also names the stored file
+(``backgrounds/<sha256>.<ext>``), so uploading the same map twice
+stores it once.
+"""
+import hashlib
+import os
+
+from PIL import Image
+
+# Work out the dominant colour on a copy no larger than this
+COLOR_SAMPLE_SIZE = 64
+COLOR_PALETTE = 8
+CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def dominant_color(image):
+    """The most common of a few quantised colours, as ``#rrggbb``."""
+    sample = image.convert('RGB')
+    sample.thumbnail((COLOR_SAMPLE_SIZE, COLOR_SAMPLE_SIZE))
+    palette = sample.quantize(colors=COLOR_PALETTE)
+    _, index = max(palette.getcolors())
+    red, green, blue = palette.getpalette()[index * 3:index * 3 + 3]
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def read_metadata(file):
+    """
+    ``width``, ``height``, ``file_size``, ``content_hash`` and
+    ``dominant_color`` of an open image file, as model field values.
+    """
+    digest = content_hash(file)
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        # JPEGs can be decoded at a fraction of their size for the colour
+        image.draft('RGB', (COLOR_SAMPLE_SIZE * 4, COLOR_SAMPLE_SIZE * 4))
+        color = dominant_color(image)
+    file.seek(0)
+    return {
+        'width': width,
+        'height': height,
+        'file_size': size,
+        'content_hash': digest,
+        'dominant_color': color,
+    }
+
+
+def content_name(directory, digest, original_name):
+    """Storage name addressing a file by its content, keeping its extension."""
+    extension = os.path.splitext(original_name)[1].lower()
+    return f'{directory.rstrip("/")}/{digest}{extension}'
+
+
+def store_upload(instance, field_name='image'):
+    """
+    Fill in ``instance``'s metadata from its pending upload and store the
+    file under its content address, unless an identical file is already
+    stored there.
+    """
+    field_file = getattr(instance, field_name)
+    for name, value in read_metadata(field_file).items():
+        setattr(instance, name, value)
+    field = field_file.field
+    name = content_name(field.upload_to, instance.content_hash, field_file.name)
+    if not field.storage.exists(name):
+        name = field.storage.save(name, field_file.file, max_length=field.max_length)
+    # Assigning the name marks the file as committed, so the field's
+    # pre_save leaves storage alone
+    setattr(instance, field_name, name)
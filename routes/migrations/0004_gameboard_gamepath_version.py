@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-17 20:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0003_gamepath'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameboard',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='gamepath',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
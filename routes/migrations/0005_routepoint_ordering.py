@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-17 20:11
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0004_gameboard_gamepath_version'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='routepoint',
+            options={'ordering': ['order', 'id']},
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.1 on 2026-10-17 20:12
+
+from django.db import migrations, models
+from django.db.models import Max
+
+# routes.ordering.ORDER_STEP at the time of this migration
+ORDER_STEP = 1024
+
+
+def seed_next_order(apps, schema_editor):
+    """Start each existing route's counter one step past its last point."""
+    Route = apps.get_model('routes', 'Route')
+    for route in Route.objects.annotate(last=Max('points__order')).exclude(last=None):
+        Route.objects.filter(pk=route.pk).update(next_order=route.last + ORDER_STEP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0005_routepoint_ordering'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='next_order',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='routepoint',
+            index=models.Index(fields=['route', 'order'], name='routes_rout_route_i_9d8f92_idx'),
+        ),
+        migrations.RunPython(seed_next_order, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-17 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0006_route_next_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='geometry',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='geometry_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
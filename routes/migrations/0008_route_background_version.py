@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-17 20:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0007_route_geometry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backgroundimage',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='backgroundimage',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-17 20:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0008_route_background_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backgroundimage',
+            name='derivative_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
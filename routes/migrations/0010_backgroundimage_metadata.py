@@ -0,0 +1,89 @@
+# Generated by Django 5.0.1 on 2026-10-17 20:33
+
+import hashlib
+import os
+
+from django.db import migrations, models
+from PIL import Image, UnidentifiedImageError
+
+# routes.metadata as of this migration, frozen so that later changes to it
+# cannot change what the migration does
+COLOR_SAMPLE_SIZE = 64
+COLOR_PALETTE = 8
+CHUNK_SIZE = 64 * 1024
+
+
+def read_metadata(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    size = file.tell()
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        image.draft('RGB', (COLOR_SAMPLE_SIZE * 4, COLOR_SAMPLE_SIZE * 4))
+        sample = image.convert('RGB')
+    sample.thumbnail((COLOR_SAMPLE_SIZE, COLOR_SAMPLE_SIZE))
+    palette = sample.quantize(colors=COLOR_PALETTE)
+    _, index = max(palette.getcolors())
+    red, green, blue = palette.getpalette()[index * 3:index * 3 + 3]
+    return {
+        'width': width,
+        'height': height,
+        'file_size': size,
+        'content_hash': digest.hexdigest(),
+        'dominant_color': f'#{red:02x}{green:02x}{blue:02x}',
+    }
+
+
+def backfill_metadata(apps, schema_editor):
+    """
+    Record metadata for images stored so far. File names are left alone
+    here; 0014 moves the files to their content addresses.
+    """
+    BackgroundImage = apps.get_model('routes', 'BackgroundImage')
+    for background in BackgroundImage.objects.exclude(image='').order_by('pk'):
+        try:
+            with background.image.open('rb') as file:
+                metadata = read_metadata(file)
+        except (OSError, UnidentifiedImageError):
+            # Missing or unreadable; stays without metadata
+            continue
+        BackgroundImage.objects.filter(pk=background.pk).update(**metadata)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0009_backgroundimage_derivative_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backgroundimage',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='backgroundimage',
+            name='dominant_color',
+            field=models.CharField(blank=True, default='', editable=False, max_length=7),
+        ),
+        migrations.AddField(
+            model_name='backgroundimage',
+            name='file_size',
+            field=models.PositiveBigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='backgroundimage',
+            name='height',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='backgroundimage',
+            name='width',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_metadata, migrations.RunPython.noop),
+    ]
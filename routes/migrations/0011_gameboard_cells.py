@@ -0,0 +1,69 @@
+# Generated by Django 5.0.1 on 2026-10-17 20:38
+
+from django.db import migrations, models
+
+# routes.board_index.encode_dots as of this migration, frozen so that later
+# changes to it cannot change what the migration does
+ENCODING_VERSION = 1
+MAX_CELLS = 1000 * 1000
+
+
+def encode_dots(rows, cols, dots):
+    rows, cols = int(rows), int(cols)
+    if rows * cols > MAX_CELLS:
+        raise ValueError(f"A {rows}x{cols} board has more than {MAX_CELLS} cells")
+    cells = [0] * max(rows * cols, 0)
+    palette = []
+    codes = {}
+    for dot in dots or ():
+        try:
+            row, col, color = int(dot['row']), int(dot['col']), dot['color']
+        except (KeyError, TypeError, ValueError):
+            continue
+        if not (0 <= row < rows and 0 <= col < cols) or not color:
+            continue
+        position = row * cols + col
+        if cells[position]:
+            continue
+        if color not in codes:
+            palette.append(color)
+            codes[color] = len(palette)
+        cells[position] = codes[color]
+    runs = []
+    previous, count = None, 0
+    for value in cells:
+        if value == previous:
+            count += 1
+            continue
+        if count:
+            runs += (count, previous)
+        previous, count = value, 1
+    if count:
+        runs += (count, previous)
+    return {'v': ENCODING_VERSION, 'palette': palette, 'runs': runs}
+
+
+def backfill_cells(apps, schema_editor):
+    GameBoard = apps.get_model('routes', 'GameBoard')
+    for board in GameBoard.objects.only('pk', 'rows', 'cols', 'dots').iterator():
+        try:
+            cells = encode_dots(board.rows, board.cols, board.dots)
+        except ValueError:
+            # Too large to index; readers fall back to the dots list
+            continue
+        GameBoard.objects.filter(pk=board.pk).update(cells=cells)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0010_backgroundimage_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameboard',
+            name='cells',
+            field=models.JSONField(default=dict, editable=False),
+        ),
+        migrations.RunPython(backfill_cells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.0.1 on 2026-10-17 20:41
+
+from django.db import migrations, models
+
+# What routes.solutions.validate_paths decided about completion as of this
+# migration, frozen so that later changes to it cannot change what the
+# migration does. No board required coverage yet.
+MAX_CELLS = 1000 * 1000
+
+
+def _cell(point, rows, cols):
+    try:
+        row, col = point['row'], point['col']
+    except (KeyError, TypeError):
+        return None
+    if type(row) is not int or type(col) is not int:
+        return None
+    if not (0 <= row < rows and 0 <= col < cols):
+        return None
+    return row, col
+
+
+def is_complete(rows, cols, dots, paths_data):
+    if rows * cols > MAX_CELLS or not isinstance(paths_data, dict):
+        return False
+    colors = {}
+    pairs = {}
+    for dot in dots or ():
+        try:
+            row, col, color = int(dot['row']), int(dot['col']), dot['color']
+        except (KeyError, TypeError, ValueError):
+            continue
+        if not (0 <= row < rows and 0 <= col < cols) or not color or (row, col) in colors:
+            continue
+        colors[(row, col)] = color
+        pairs.setdefault(color, []).append((row, col))
+    if not pairs or set(paths_data) != set(pairs):
+        return False
+    occupied = set()
+    for color, path in paths_data.items():
+        if len(pairs[color]) != 2 or not isinstance(path, list) or len(path) < 2:
+            return False
+        cells = [_cell(point, rows, cols) for point in path]
+        if None in cells or {cells[0], cells[-1]} != set(pairs[color]):
+            return False
+        for step, cell in enumerate(cells):
+            if step and abs(cell[0] - cells[step - 1][0]) + abs(cell[1] - cells[step - 1][1]) != 1:
+                return False
+            if cell in occupied or (cell in colors and 0 < step < len(cells) - 1):
+                return False
+            occupied.add(cell)
+    return True
+
+
+def backfill_completed(apps, schema_editor):
+    GamePath = apps.get_model('routes', 'GamePath')
+    for path in GamePath.objects.select_related('board').iterator():
+        board = path.board
+        if is_complete(board.rows, board.cols, board.dots, path.paths_data):
+            GamePath.objects.filter(pk=path.pk).update(completed=True)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0011_gameboard_cells'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameboard',
+            name='require_coverage',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='gamepath',
+            name='completed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(backfill_completed, migrations.RunPython.noop),
+    ]
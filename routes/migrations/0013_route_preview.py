@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-17 20:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0012_solution_validation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='preview',
+            field=models.JSONField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.1 on 2026-10-18 09:12
+
+import os
+
+from django.db import migrations, models
+from django.db.models.functions import Now
+
+
+def content_address_files(apps, schema_editor):
+    """
+    Point every row at a file named by its content hash, as uploads are
+    stored since 0010, so rows with identical images share one file. The
+    copies no row refers to any more are deleted.
+    """
+    BackgroundImage = apps.get_model('routes', 'BackgroundImage')
+    field = BackgroundImage._meta.get_field('image')
+    storage = field.storage
+    groups = {}
+    rows = BackgroundImage.objects.exclude(content_hash='').exclude(image='').order_by('pk')
+    for pk, name, digest in rows.values_list('pk', 'image', 'content_hash'):
+        groups.setdefault(digest, []).append((pk, name))
+
+    for digest, members in groups.items():
+        names = {name for _, name in members}
+        extension = os.path.splitext(members[0][1])[1].lower()
+        target = f'{field.upload_to.rstrip("/")}/{digest}{extension}'
+        if names == {target}:
+            continue
+        if not storage.exists(target):
+            source = next((name for _, name in members if storage.exists(name)), None)
+            if source is None:
+                # Nothing left on disk to move
+                continue
+            with storage.open(source, 'rb') as file:
+                storage.save(target, file)
+        # The image URL changes, so count it as a new version
+        BackgroundImage.objects.filter(pk__in=[pk for pk, _ in members]).exclude(image=target).update(
+            image=target, version=models.F('version') + 1, updated=Now()
+        )
+        for name in names - {target}:
+            if storage.exists(name) and not BackgroundImage.objects.filter(image=name).exists():
+                storage.delete(name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0013_route_preview'),
+    ]
+
+    operations = [
+        migrations.RunPython(content_address_files, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-17 21:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0014_backgroundimage_content_addressed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='route',
+            name='next_order',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='routepoint',
+            name='order',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
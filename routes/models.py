@@ -1,74 +1,223 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.functions import Now
+from django.db.models.signals import post_delete, pre_save, post_save
 from django.dispatch import receiver
-from django_project.sse_engine import push_notification
+from django_project.sse_engine import push_notification_on_commit
+from . import derivatives, tiles
+from .metadata import store_upload
+from .board_index import BoardIndex, encode_dots
+from .deltas import diff_dots, diff_paths, merge_path_messages
 
 # Create your models here.
 class BackgroundImage(models.Model):
     title = models.CharField(max_length=200)
     image = models.ImageField(upload_to="backgrounds/")
+    # Bumped on every save; part of the HTTP validators, see routes.conditional
+    version = models.PositiveIntegerField(default=0, editable=False)
+    updated = models.DateTimeField(auto_now=True)
+    # Content hash naming the stored thumbnails, see routes.derivatives;
+    # empty until they have been rendered for the current image
+    derivative_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
+    # Worked out at upload time by routes.metadata so that nothing needs to
+    # open the file; null for images stored before it existed
+    width = models.PositiveIntegerField(null=True, editable=False)
+    height = models.PositiveIntegerField(null=True, editable=False)
+    file_size = models.PositiveBigIntegerField(null=True, editable=False)
+    # SHA-256 of the file, which is also stored under this name
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True, editable=False)
+    dominant_color = models.CharField(max_length=7, blank=True, default='', editable=False)
     
     def __str__(self):
         return self.title
     
     def save(self, *args, **kwargs):
-        # Make sure Pillow processes the image properly
+        _bump_version(self, kwargs)
+        # A new upload; stored files are already committed
+        uploaded = bool(self.image) and not self.image._committed
+        if uploaded:
+            store_upload(self)
+            self.derivative_hash = ''
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], *UPLOAD_FIELDS}
         super().save(*args, **kwargs)
+        if uploaded:
+            derivatives.schedule(self)
+            tiles.schedule(self)
+
+    @property
+    def derivative_urls(self):
+        """``{size: {ext: url}}``, e.g. ``derivative_urls.thumbnail.webp`` in templates."""
+        return derivatives.derivative_urls(self.pk, self.derivative_hash)
+
+
+UPLOAD_FIELDS = (
+    'image', 'derivative_hash', 'width', 'height', 'file_size', 'content_hash', 'dominant_color'
+)
+
+
+def _bump_version(instance, save_kwargs):
+    """Count a save, including saves restricted with ``update_fields``."""
+    instance.version += 1
+    update_fields = save_kwargs.get('update_fields')
+    if update_fields is not None:
+        save_kwargs['update_fields'] = {*update_fields, 'version', 'updated'}
 
 class Route(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     background = models.ForeignKey(BackgroundImage, on_delete=models.CASCADE)
     name = models.CharField(max_length=200, blank=True, null=True, default="Unnamed Route")
     created = models.DateTimeField(auto_now_add=True)
+    # Next free RoutePoint.order key, reserved atomically by routes.ordering
+    next_order = models.BigIntegerField(default=0)
+    # Points packed by routes.geometry, stamped with the geometry_version
+    # they were built from; bumped whenever a point changes
+    geometry = models.BinaryField(null=True, editable=False)
+    geometry_version = models.PositiveIntegerField(default=0)
+    # A few evenly spaced points of the same geometry for list views
+    preview = models.JSONField(null=True, editable=False)
+    # Bumped on every save of the route itself; point edits bump
+    # geometry_version instead. Both feed the HTTP validators
+    version = models.PositiveIntegerField(default=0, editable=False)
+    updated = models.DateTimeField(auto_now=True)
+
     def __str__(self):
         return f"{self.name or 'Route'} by {self.user}"
 
+    def save(self, *args, **kwargs):
+        _bump_version(self, kwargs)
+        super().save(*args, **kwargs)
+
+
+def invalidate_route_geometry(route_id):
+    """Mark a route's packed geometry stale after its points changed."""
+    Route.objects.filter(pk=route_id).update(geometry_version=models.F('geometry_version') + 1, updated=Now())
+
 class RoutePoint(models.Model):
     route = models.ForeignKey(Route, related_name="points", on_delete=models.CASCADE)
     x = models.FloatField()
     y = models.FloatField()
-    order = models.IntegerField(default=0)
+    # Sparse sort key, see routes.ordering
+    order = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['order', 'id']
+        indexes = [models.Index(fields=['route', 'order'])]
+
     def __str__(self):
         return f"({self.x}, {self.y})"
 
+@receiver(post_save, sender=RoutePoint)
+def routepoint_post_save(sender, instance, **kwargs):
+    # Bulk writes go through routes.ordering / routes.bulk, which
+    # invalidate explicitly
+    invalidate_route_geometry(instance.route_id)
+
+@receiver(post_delete, sender=RoutePoint)
+def routepoint_post_delete(sender, instance, origin=None, **kwargs):
+    # Covers ORM, admin and cascade deletes alike
+    if isinstance(origin, Route) or getattr(origin, 'model', None) is Route:
+        # The route is being deleted along with its points
+        return
+    # One UPDATE per route per delete() call, however many points it removed
+    invalidated = getattr(origin, '_invalidated_routes', None)
+    if invalidated is None:
+        invalidated = set()
+        if origin is not None:
+            origin._invalidated_routes = invalidated
+    if instance.route_id not in invalidated:
+        invalidated.add(instance.route_id)
+        invalidate_route_geometry(instance.route_id)
+
 class GameBoard(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='game_boards')
     title = models.CharField(max_length=100)
     rows = models.IntegerField()
     cols = models.IntegerField()
     dots = models.JSONField(default=list)  # Make sure we're using JSONField
+    # The dots as an encoded BoardIndex, kept in step with them on save
+    cells = models.JSONField(default=dict, editable=False)
+    # Solutions must also fill every cell, see routes.solutions
+    require_coverage = models.BooleanField(default=False)
+    # Bumped on every save; notifications carry diffs between versions
+    version = models.PositiveIntegerField(default=0)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.title} ({self.rows}x{self.cols})"
 
+    def save(self, *args, **kwargs):
+        # Holds the row lock taken by _reserve_version until the save lands
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(type(self), instance=self)):
+            super().save(*args, **kwargs)
+
+    def snapshot(self):
+        """Full state for clients that missed a delta."""
+        return {
+            "board_id": self.id,
+            "version": self.version,
+            "user": self.user.username,
+            "board_owner": self.user.username,
+            "title": self.title,
+            "rows": self.rows,
+            "cols": self.cols,
+            "dots": self.dots,
+            "cells": self.cells,
+            "updated": self.updated.isoformat()
+        }
+
+    def dot_index(self):
+        """A BoardIndex for constant-time lookups of this board's dots."""
+        return BoardIndex.for_board(self)
+
+def _reserve_version(sender, instance, field, using):
+    """
+    Bump the stored version and return ``field`` and the version as they
+    were before this save, or None for a new row.
+
+    The UPDATE locks the row until the save's transaction commits, so
+    concurrent saves read each other's results and get distinct versions.
+    """
+    instance.version = 1
+    if instance.pk is None:
+        return None
+    rows = sender.objects.using(using).filter(pk=instance.pk)
+    if not rows.update(version=models.F('version') + 1):
+        return None
+    previous = rows.values(field, 'version').get()
+    instance.version = previous['version']
+    previous['version'] -= 1
+    return previous
+
+@receiver(pre_save, sender=GameBoard)
+def gameboard_pre_save(sender, instance, using, **kwargs):
+    # Remember the persisted dots so post_save can broadcast a diff
+    instance._previous_state = _reserve_version(sender, instance, 'dots', using)
+    instance.cells = encode_dots(instance.rows, instance.cols, instance.dots)
+
 @receiver(post_save, sender=GameBoard)
 def gameboard_post_save(sender, instance, created, **kwargs):
-    if created:
-        push_notification({
-            "type": "board_created",
-            "user": instance.user.username,
-            "board_id": instance.id,
-            "title": instance.title,
-            "rows": instance.rows,
-            "cols": instance.cols,
-            "dots": instance.dots,
-            "updated": instance.updated.isoformat()
-        })
+    previous = getattr(instance, '_previous_state', None)
+    if created or previous is None:
+        message = instance.snapshot()
+        message["type"] = "board_created" if created else "board_updated"
     else:
-        push_notification({
+        message = {
             "type": "board_updated",
             "user": instance.user.username,
+            "board_owner": instance.user.username,
             "board_id": instance.id,
             "title": instance.title,
             "rows": instance.rows,
             "cols": instance.cols,
-            "dots": instance.dots,
+            "version": instance.version,
+            "base_version": previous["version"],
+            "dots_delta": diff_dots(previous["dots"], instance.dots),
             "updated": instance.updated.isoformat()
-        })
+        }
+    push_notification_on_commit(message)
 
 class GamePath(models.Model):
     """
@@ -79,6 +228,9 @@ class GamePath(models.Model):
     board = models.ForeignKey(GameBoard, on_delete=models.CASCADE, related_name='paths')
     # Store different paths for each color pair
     paths_data = models.JSONField(default=dict)  # Format: {'#color': [{row: x, col: y}, ...], ...}
+    # Set by the server when the paths solve the board, see routes.solutions
+    completed = models.BooleanField(default=False)
+    version = models.PositiveIntegerField(default=0)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
     
@@ -88,21 +240,54 @@ class GamePath(models.Model):
         
     def __str__(self):
         return f"Paths by {self.user.username} on {self.board.title}"
-    
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(type(self), instance=self)):
+            super().save(*args, **kwargs)
+
+    def board_owner(self):
+        if GamePath.board.is_cached(self):
+            return self.board.user.username
+        # One query instead of loading the board and then its owner
+        return GameBoard.objects.filter(pk=self.board_id).values_list('user__username', flat=True).first()
+
+    def snapshot(self):
+        """Full state for clients that missed a delta."""
+        return {
+            "user": self.user.username,
+            "board_id": self.board_id,
+            "board_owner": self.board_owner(),
+            "version": self.version,
+            "paths_data": self.paths_data,
+            "completed": self.completed,
+        }
+
+@receiver(pre_save, sender=GamePath)
+def gamepath_pre_save(sender, instance, using, **kwargs):
+    instance._previous_state = _reserve_version(sender, instance, 'paths_data', using)
+
 # Add this signal for GamePath
 @receiver(post_save, sender=GamePath)
 def gamepath_post_save(sender, instance, created, **kwargs):
-    if created:
-        push_notification({
-            "type": "paths_created",
-            "user": instance.user.username,
-            "board_id": instance.board.id,
-            "paths_data": instance.paths_data
-        })
+    previous = getattr(instance, '_previous_state', None)
+    if created or previous is None:
+        message = instance.snapshot()
+        message["type"] = "paths_created" if created else "paths_updated"
     else:
-        push_notification({
+        message = {
             "type": "paths_updated",
             "user": instance.user.username,
-            "board_id": instance.board.id,
-            "paths_data": instance.paths_data
-        })
\ No newline at end of file
+            "board_id": instance.board_id,
+            # Lets "my boards" subscribers see play on their boards
+            "board_owner": instance.board_owner(),
+            "version": instance.version,
+            "base_version": previous["version"],
+            "paths_delta": diff_paths(previous["paths_data"], instance.paths_data),
+            "completed": instance.completed,
+        }
+    # Repeated saves while playing collapse into one notification per window
+    push_notification_on_commit(
+        message,
+        debounce_key=("paths", instance.board_id, instance.user_id),
+        merge=merge_path_messages,
+    )
\ No newline at end of file
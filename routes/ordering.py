@@ -0,0 +1,117 @@
+"""
+Sparse ordering keys for route points.
+
+``RoutePoint.order`` is a sort key, not an index: consecutive points are
+``ORDER_STEP`` apart, so appending, deleting and moving a point touch only
+that point. A move that lands between two adjacent keys renumbers the
+route once (``rebalance``), which restores the gaps for the next
+``ORDER_STEP`` moves into the same spot and winds ``Route.next_order``
+back to just past the last point.
+
+New keys come from ``Route.next_order``, bumped with an ``F()`` UPDATE,
+so concurrent appends to one route never share a key and never count
+the route's points.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from .models import Route, RoutePoint, invalidate_route_geometry
+
+ORDER_STEP = 1024
+
+REBALANCE_BATCH_SIZE = 1000
+
+
+def next_orders(route, count=1):
+    """
+    Reserve keys for ``count`` points appended to ``route``. The UPDATE
+    locks the route row until the surrounding transaction ends, so a
+    concurrent append waits and then reserves the following keys.
+    """
+    with transaction.atomic():
+        Route.objects.filter(pk=route.pk).update(next_order=F('next_order') + count * ORDER_STEP)
+        end = Route.objects.filter(pk=route.pk).values_list('next_order', flat=True).get()
+    route.next_order = end
+    return range(end - count * ORDER_STEP, end, ORDER_STEP)
+
+
+def append_point(point, route):
+    """Save ``point`` as the last point of ``route``."""
+    with transaction.atomic():
+        point.route = route
+        point.order = next_orders(route)[0]
+        point.save()
+    return point
+
+
+def delete_point(point):
+    """Delete ``point``; the remaining keys are still in order, so nothing else is written."""
+    # The post_delete receiver marks the route's geometry stale
+    point.delete()
+
+
+def rebalance(route):
+    """
+    Renumber every point of ``route`` ``ORDER_STEP`` apart, keeping their
+    order, and restart ``Route.next_order`` right after the last of them.
+    """
+    with transaction.atomic():
+        # Lock the route first: appends reserve keys under the same lock,
+        # so none can be pending while the counter is reset
+        Route.objects.select_for_update().filter(pk=route.pk).values_list('pk').get()
+        points = list(route.points.order_by('order', 'id').only('id', 'route', 'order'))
+        changed = []
+        for index, point in enumerate(points):
+            if point.order != index * ORDER_STEP:
+                point.order = index * ORDER_STEP
+                changed.append(point)
+        RoutePoint.objects.bulk_update(changed, ['order'], batch_size=REBALANCE_BATCH_SIZE)
+        route.next_order = len(points) * ORDER_STEP
+        Route.objects.filter(pk=route.pk).update(next_order=route.next_order)
+        if changed:
+            invalidate_route_geometry(route.pk)
+    return len(changed)
+
+
+def _neighbour_orders(point, position):
+    others = point.route.points.exclude(pk=point.pk).order_by('order', 'id')
+    if position <= 0:
+        return None, others.values_list('order', flat=True).first()
+    window = list(others.values_list('order', flat=True)[position - 1:position + 1])
+    if not window:
+        # Past the end: move to the back
+        return others.values_list('order', flat=True).last(), None
+    return window[0], window[1] if len(window) > 1 else None
+
+
+def _key_between(before, after):
+    if before is None and after is None:
+        return 0
+    if before is None:
+        return after - ORDER_STEP
+    if after is None:
+        return before + ORDER_STEP
+    if after - before < 2:
+        return None
+    return (before + after) // 2
+
+
+def move_point(point, position):
+    """
+    Move ``point`` so it becomes the ``position``-th point (0-based) of its
+    route. Only ``point`` is updated unless its new neighbours have no gap
+    left between them.
+    """
+    with transaction.atomic():
+        before, after = _neighbour_orders(point, position)
+        if after is None and before is not None:
+            # Moving to the back is an append; keep the counter ahead of it
+            order = next_orders(point.route)[0]
+        else:
+            order = _key_between(before, after)
+        if order is None:
+            rebalance(point.route)
+            order = _key_between(*_neighbour_orders(point, position))
+        point.order = order
+        point.save(update_fields=['order'])
+    return point
@@ -0,0 +1,93 @@
+"""
+Pagination and streaming for route point listings.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.pagination import CursorPagination
+
+from .models import RoutePoint
+
+POINT_FIELDS = ('id', 'x', 'y', 'order')
+
+# Rows fetched per database round trip while streaming
+STREAM_CHUNK_SIZE = 2000
+
+# Coordinates are validated finite on the way in, so repr() is already valid
+# JSON and far cheaper than json.dumps per row
+ROW_TEMPLATE = '{{"id": {0}, "x": {1!r}, "y": {2!r}, "order": {3}}}'
+
+
+class RoutePointCursorPagination(CursorPagination):
+    """
+    Keyset pagination over ``(order, id)``: each page is an index range
+    scan from the previous page's last key, never an OFFSET.
+    """
+    ordering = ('order', 'id')
+    page_size = 1000
+    page_size_query_param = 'page_size'
+    max_page_size = 10000
+
+
+def point_rows(route):
+    return (
+        RoutePoint.objects.filter(route_id=route.pk)
+        .order_by('order', 'id')
+        .values_list(*POINT_FIELDS)
+        .iterator(chunk_size=STREAM_CHUNK_SIZE)
+    )
+
+
+def _encoded(rows, separator):
+    """Encode rows as JSON objects, one chunk of text per fetched batch."""
+    batch = []
+    for row in rows:
+        batch.append(ROW_TEMPLATE.format(*row))
+        if len(batch) == STREAM_CHUNK_SIZE:
+            yield separator.join(batch)
+            batch = []
+    if batch:
+        yield separator.join(batch)
+
+
+def _ndjson(rows):
+    for chunk in _encoded(rows, '\n'):
+        yield chunk + '\n'
+
+
+def _json_array(rows):
+    yield '['
+    first = True
+    for chunk in _encoded(rows, ','):
+        yield chunk if first else ',' + chunk
+        first = False
+    yield ']'
+
+
+STREAM_FORMATS = {
+    'ndjson': (_ndjson, 'application/x-ndjson'),
+    'json': (_json_array, 'application/json'),
+}
+
+
+async def _iterate_async(chunks):
+    # Under ASGI a plain iterator would be drained into a list before the
+    # first byte is sent; pull one chunk at a time on the sync thread instead
+    done = object()
+    while True:
+        chunk = await sync_to_async(next)(chunks, done)
+        if chunk is done:
+            return
+        yield chunk
+
+
+def stream_points(request, route, stream_format):
+    """
+    Stream every point of ``route`` without holding them all in memory:
+    rows come from a server-side cursor in ``STREAM_CHUNK_SIZE`` batches.
+    """
+    encode, content_type = STREAM_FORMATS[stream_format]
+    chunks = encode(point_rows(route))
+    if isinstance(request, ASGIRequest):
+        chunks = _iterate_async(chunks)
+    return StreamingHttpResponse(chunks, content_type=content_type)
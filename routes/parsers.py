@@ -0,0 +1,55 @@
+"""
+Streaming parsers for bulk route point uploads.
+
+Both parsers return a generator that decodes the request body line by
+line, so a trace with tens of thousands of points is never held in memory
+as one string or one decoded document.
+"""
+import codecs
+import csv
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+def _lines(stream, parser_context):
+    encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+    return codecs.iterdecode(stream, encoding)
+
+
+class NDJSONParser(BaseParser):
+    """One JSON object per line, e.g. ``{"x": 0.1, "y": 0.2}``."""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return self._iter_items(_lines(stream, parser_context))
+
+    def _iter_items(self, lines):
+        for number, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                raise ParseError(f'NDJSON parse error on line {number}: {exc}')
+
+
+class PointCSVParser(BaseParser):
+    """``x,y`` rows, with an optional ``x,y`` header line."""
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return self._iter_items(_lines(stream, parser_context))
+
+    def _iter_items(self, lines):
+        for number, row in enumerate(csv.reader(lines), start=1):
+            if not row:
+                continue
+            if number == 1 and [cell.strip().lower() for cell in row[:2]] == ['x', 'y']:
+                continue
+            if len(row) < 2:
+                raise ParseError(f'CSV parse error on line {number}: expected x,y')
+            yield {'x': row[0].strip(), 'y': row[1].strip()}
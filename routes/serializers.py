@@ -1,27 +1,60 @@
+import math
+
 from rest_framework import serializers
+from .derivatives import derivative_urls
+from .geometry import route_preview, route_points_data
+from .tiles import tiles_url
 from .models import BackgroundImage, Route, RoutePoint
 
 
 class BackgroundImageSerializer(serializers.ModelSerializer):
+    # Thumbnail, medium and full-size WebP/JPEG copies; see routes.derivatives
+    derivatives = serializers.SerializerMethodField()
+    # Deep Zoom descriptor; see routes.tiles
+    tiles = serializers.SerializerMethodField()
+
     class Meta:
         model = BackgroundImage
-        fields = ['id', 'title', 'image']
+        fields = ['id', 'title', 'image', 'width', 'height', 'file_size', 'dominant_color', 'derivatives', 'tiles']
+
+    def get_derivatives(self, obj):
+        return derivative_urls(obj.pk, obj.derivative_hash, self.context.get('request'))
+
+    def get_tiles(self, obj):
+        return tiles_url(obj.pk, obj.image.name, self.context.get('request'))
 
 
 class RoutePointSerializer(serializers.ModelSerializer):
     class Meta:
         model = RoutePoint
         fields = ['id', 'x', 'y', 'order']
-        read_only_fields = ['id']
+        # Sparse sort keys owned by routes.ordering; use the move endpoint
+        read_only_fields = ['id', 'order']
+
+    def _finite(self, value):
+        # Same rule as routes.bulk; NaN and infinity are not valid JSON
+        if not math.isfinite(value):
+            raise serializers.ValidationError('A finite number is required.')
+        return value
+
+    validate_x = validate_y = _finite
+
+    def validate(self, attrs):
+        # order is read-only; say so rather than let an old client think
+        # its PUT or PATCH moved the point
+        if self.instance is not None and 'order' in self.initial_data:
+            raise serializers.ValidationError({'order': [
+                'Points are reordered with the move endpoint: POST {"position": n} to .../move/.'
+            ]})
+        return attrs
 
 
 class RouteSerializer(serializers.ModelSerializer):
-    points = RoutePointSerializer(many=True, read_only=True)
     background_detail = BackgroundImageSerializer(source='background', read_only=True)
     
     class Meta:
         model = Route
-        fields = ['id', 'name', 'background', 'background_detail', 'created', 'points']
+        fields = ['id', 'name', 'background', 'background_detail', 'created']
         read_only_fields = ['id', 'created', 'background_detail']
     
     def create(self, validated_data):
@@ -29,12 +62,52 @@ class RouteSerializer(serializers.ModelSerializer):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
 
+    def update(self, instance, validated_data):
+        # Write only the edited columns: next_order and geometry_version are
+        # bumped concurrently by point edits and must not be overwritten
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
+
+
+class RouteListSerializer(serializers.ModelSerializer):
+    """
+    Lean representation for listing routes: a point count, bounding box
+    and preview polyline instead of every point. Expects the queryset
+    annotations added by RouteViewSet, and previews refreshed in bulk
+    with ``refresh_previews``.
+    """
+    background_detail = BackgroundImageSerializer(source='background', read_only=True)
+    point_count = serializers.IntegerField(read_only=True)
+    bounds = serializers.SerializerMethodField()
+    preview = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Route
+        fields = ['id', 'name', 'background', 'background_detail', 'created', 'point_count', 'bounds', 'preview']
+        read_only_fields = fields
+
+    def get_bounds(self, obj):
+        if not obj.point_count:
+            return None
+        return {'min_x': obj.min_x, 'min_y': obj.min_y, 'max_x': obj.max_x, 'max_y': obj.max_y}
+
+    def get_preview(self, obj):
+        if not obj.point_count:
+            return []
+        return route_preview(obj)
+
 
 class RouteDetailSerializer(serializers.ModelSerializer):
-    points = RoutePointSerializer(many=True, read_only=True)
+    # Decoded from the packed geometry rather than one RoutePoint per row
+    points = serializers.SerializerMethodField()
     background = BackgroundImageSerializer(read_only=True)
     
     class Meta:
         model = Route
         fields = ['id', 'name', 'background', 'created', 'points']
         read_only_fields = ['id', 'created', 'background']
+
+    def get_points(self, obj):
+        return route_points_data(obj)
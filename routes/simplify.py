@@ -0,0 +1,117 @@
+"""
+Route simplification for zoomed-out views.
+
+Both algorithms work on the packed ``xs``/``ys`` arrays from
+``routes.geometry`` and return the indices of the points to keep, always
+including the first and last point. Coordinates are normalised to the
+background image, so a tolerance of ``1 / 256`` is one pixel of a 256px
+wide map.
+
+Results are cached per route, geometry version, method and tolerance, so
+any point edit (which bumps ``Route.geometry_version``) invalidates them.
+"""
+import heapq
+from array import array
+
+from django.core.cache import cache
+
+from .geometry import load
+
+DOUGLAS_PEUCKER = 'douglas-peucker'
+VISVALINGAM = 'visvalingam'
+METHODS = (DOUGLAS_PEUCKER, VISVALINGAM)
+
+# One pixel of a 256px wide map at zoom 0; each zoom level halves it
+ZOOM_0_TOLERANCE = 1 / 256
+MAX_ZOOM = 24
+
+CACHE_TIMEOUT = 60 * 60
+
+
+def zoom_tolerance(zoom):
+    return ZOOM_0_TOLERANCE / 2 ** zoom
+
+
+def douglas_peucker(xs, ys, tolerance):
+    """Keep every point further than ``tolerance`` from the simplified line."""
+    count = len(xs)
+    if count < 3:
+        return list(range(count))
+    keep = bytearray(count)
+    keep[0] = keep[-1] = 1
+    limit = tolerance * tolerance
+    # An explicit stack: recursion depth would follow the route length
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = xs[first], ys[first]
+        dx, dy = xs[last] - ax, ys[last] - ay
+        length = dx * dx + dy * dy
+        furthest, index = -1.0, first
+        for i in range(first + 1, last):
+            px, py = xs[i] - ax, ys[i] - ay
+            if length:
+                t = min(1.0, max(0.0, (px * dx + py * dy) / length))
+                px, py = px - t * dx, py - t * dy
+            distance = px * px + py * py
+            if distance > furthest:
+                furthest, index = distance, i
+        if furthest > limit:
+            keep[index] = 1
+            stack.append((index, last))
+            stack.append((first, index))
+    return [i for i in range(count) if keep[i]]
+
+
+def _area(xs, ys, a, b, c):
+    return abs((xs[b] - xs[a]) * (ys[c] - ys[a]) - (xs[c] - xs[a]) * (ys[b] - ys[a])) / 2
+
+
+def visvalingam(xs, ys, tolerance):
+    """Drop the point spanning the smallest triangle until all exceed ``tolerance``²."""
+    count = len(xs)
+    if count < 3:
+        return list(range(count))
+    limit = tolerance * tolerance
+    previous = array('q', range(-1, count - 1))
+    following = array('q', range(1, count + 1))
+    removed = bytearray(count)
+    heap = [(_area(xs, ys, i - 1, i, i + 1), i) for i in range(1, count - 1)]
+    heapq.heapify(heap)
+    current = {i: area for area, i in heap}
+    while heap:
+        area, i = heapq.heappop(heap)
+        if removed[i] or current.get(i) != area:
+            continue  # superseded by a recomputed area
+        if area >= limit:
+            break
+        removed[i] = 1
+        before, after = previous[i], following[i]
+        following[before], previous[after] = after, before
+        for j in (before, after):
+            if 0 < j < count - 1:
+                # Never let a neighbour drop out before the point just removed
+                current[j] = max(area, _area(xs, ys, previous[j], j, following[j]))
+                heapq.heappush(heap, (current[j], j))
+    return [i for i in range(count) if not removed[i]]
+
+
+ALGORITHMS = {DOUGLAS_PEUCKER: douglas_peucker, VISVALINGAM: visvalingam}
+
+
+def simplified_points(route, tolerance, method=DOUGLAS_PEUCKER):
+    """
+    Return ``(ids, xs, ys, orders)`` for the points of ``route`` kept at
+    ``tolerance``, using the cached indices for this geometry version when
+    there are any.
+    """
+    version, ids, xs, ys, orders = load(route)
+    key = f'route-lod:{route.pk}:{version}:{method}:{tolerance!r}'
+    cached = cache.get(key)
+    if cached is None:
+        kept = array('I', ALGORITHMS[method](xs, ys, tolerance))
+        cache.set(key, kept.tobytes(), CACHE_TIMEOUT)
+    else:
+        kept = array('I')
+        kept.frombytes(cached)
+    return tuple([column[i] for i in kept] for column in (ids, xs, ys, orders))
@@ -0,0 +1,118 @@
+"""
+Server-side checking of connect-the-dots solutions.
+
+``validate_paths`` checks a ``GamePath.paths_data`` submission against
+its board's ``BoardIndex``. It makes one pass over the submitted cells,
+marking them on an occupancy grid as it goes. A path must:
+
+- belong to a colour on the board that has exactly two dots
+- start on one of those dots and end on the other
+- step to an orthogonally adjacent cell each time
+- not pass through any other dot
+- not touch a cell that another path, or itself, already uses
+
+A valid submission may still be partial. It is complete when every
+colour on the board is connected, and, for boards with
+``require_coverage``, every cell is covered by a path.
+"""
+from array import array
+from typing import NamedTuple
+
+# Stop collecting errors after this many; one is enough to reject
+MAX_ERRORS = 20
+
+
+class SolutionResult(NamedTuple):
+    valid: bool
+    complete: bool
+    errors: list
+    covered: int
+
+
+def _cell(point, rows, cols):
+    """``(row, col)`` of a submitted point, or None if it is not on the board."""
+    try:
+        row, col = point['row'], point['col']
+    except (KeyError, TypeError):
+        return None
+    if type(row) is not int or type(col) is not int:
+        return None
+    if not (0 <= row < rows and 0 <= col < cols):
+        return None
+    return row, col
+
+
+def validate_paths(index, paths_data, require_coverage=False):
+    """Check ``paths_data`` (``{color: [{row, col}, ...]}``) against ``index``."""
+    if not isinstance(paths_data, dict):
+        return SolutionResult(False, False, ["paths_data must be an object"], 0)
+    if len(paths_data) > len(index.palette):
+        return SolutionResult(False, False, ["More paths than colours on this board"], 0)
+    rows, cols = index.rows, index.cols
+    dots = index.cells
+    # Number (from 1) of the path using each cell, 0 while free
+    occupied = array('H', [0]) * (rows * cols)
+    errors = []
+    covered = 0
+
+    for number, (color, path) in enumerate(paths_data.items(), 1):
+        if len(errors) >= MAX_ERRORS:
+            break
+        pair = index.pair(color)
+        if len(pair) != 2:
+            errors.append(f"{color}: not a colour with two dots on this board")
+            continue
+        if not isinstance(path, list) or len(path) < 2:
+            errors.append(f"{color}: a path needs at least two cells")
+            continue
+        ends = set(pair)
+        first = _cell(path[0], rows, cols)
+        last = _cell(path[-1], rows, cols)
+        if first not in ends or last not in ends or first == last:
+            errors.append(f"{color}: must run from one {color} dot to the other")
+            continue
+
+        previous = None
+        for step, point in enumerate(path):
+            cell = _cell(point, rows, cols)
+            if cell is None:
+                errors.append(f"{color}: step {step} is not a cell on the board")
+                break
+            row, col = cell
+            if previous is not None and abs(row - previous[0]) + abs(col - previous[1]) != 1:
+                errors.append(f"{color}: step {step} is not next to the one before")
+                break
+            position = row * cols + col
+            if occupied[position]:
+                other = 'itself' if occupied[position] == number else 'another path'
+                errors.append(f"{color}: crosses {other} at ({row}, {col})")
+                break
+            if dots[position] and 0 < step < len(path) - 1:
+                errors.append(f"{color}: passes through a dot at ({row}, {col})")
+                break
+            occupied[position] = number
+            previous = cell
+        else:
+            covered += len(path)
+
+    valid = not errors
+    connected = valid and bool(index.palette) and all(color in paths_data for color in index.palette)
+    complete = connected and (not require_coverage or covered == rows * cols)
+    return SolutionResult(valid, complete, errors, covered)
+
+
+def validate_board_paths(board, paths_data):
+    """``validate_paths`` for a ``GameBoard``, using its stored index."""
+    return validate_paths(board.dot_index(), paths_data, board.require_coverage)
+
+
+def revalidate_board(board):
+    """Recompute ``completed`` for every player's paths after ``board`` changed."""
+    index = board.dot_index()
+    changed = 0
+    for path in board.paths.only('pk', 'paths_data', 'completed'):
+        complete = validate_paths(index, path.paths_data, board.require_coverage).complete
+        if complete != path.completed:
+            # update() rather than save(): the paths themselves did not change
+            changed += type(path).objects.filter(pk=path.pk).update(completed=complete)
+    return changed
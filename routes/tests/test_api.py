@@ -1,8 +1,12 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
 from rest_framework.authtoken.models import Token
 from routes.models import BackgroundImage, Route, RoutePoint
+from routes.ordering import ORDER_STEP
 from django.core.files.uploadedfile import SimpleUploadedFile
 import io
 from PIL import Image
@@ -193,3 +197,105 @@ class ApiTestCase(TestCase):
         
         # Verify the point was not deleted
         self.assertTrue(RoutePoint.objects.filter(id=self.point2.id).exists())
+
+
+class BulkPointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='bulkuser',
+            email='bulk@example.com',
+            password='bulkpassword'
+        )
+        cls.background = BackgroundImage.objects.create(
+            title='Bulk Background',
+            image=ApiTestCase._create_test_image()
+        )
+        cls.route = Route.objects.create(
+            user=cls.user, background=cls.background, name='Trace', next_order=ORDER_STEP
+        )
+        RoutePoint.objects.create(route=cls.route, x=0.5, y=0.5, order=0)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('api-route-points', args=[self.route.id])
+
+    def orders(self):
+        return list(self.route.points.order_by('order').values_list('x', 'order'))
+
+    def test_json_array_appends_points_in_order(self):
+        """Test that a JSON array is inserted after the existing points"""
+        points = [{'x': i / 10, 'y': 0.0} for i in range(3)]
+
+        response = self.client.post(self.url, points, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'created': 3, 'first_order': ORDER_STEP})
+        self.assertEqual(self.orders(), [
+            (0.5, 0), (0.0, ORDER_STEP), (0.1, 2 * ORDER_STEP), (0.2, 3 * ORDER_STEP)
+        ])
+
+    def test_ndjson_and_csv_bodies(self):
+        """Test that streamed NDJSON and CSV bodies are accepted"""
+        ndjson = '{"x": 0.1, "y": 0.2}\n\n{"x": 0.3, "y": 0.4}\n'
+        response = self.client.generic('POST', self.url, ndjson, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+
+        csv_body = 'x,y\n0.6,0.7\n0.8,0.9\n'
+        response = self.client.generic('POST', self.url, csv_body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['first_order'], 3 * ORDER_STEP)
+        self.assertEqual([x for x, _ in self.orders()], [0.5, 0.1, 0.3, 0.6, 0.8])
+
+    def test_invalid_point_rejects_whole_upload(self):
+        """Test that one bad point means nothing is written"""
+        points = [{'x': 0.1, 'y': 0.1}, {'x': 'abc', 'y': 0.2}, {'y': 0.3}]
+
+        response = self.client.post(self.url, points, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual([e['index'] for e in errors], [1, 2])
+        self.assertIn('x', errors[1]['errors'])
+        self.assertEqual(self.route.points.count(), 1)
+
+    def test_body_that_is_not_a_list_is_rejected(self):
+        """Test that null, scalar and string bodies are refused rather than iterated"""
+        for body in ('null', '5', 'true', '"ab"'):
+            with self.subTest(body):
+                response = self.client.generic('POST', self.url, body, content_type='application/json')
+
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'errors': ['Expected a list of points.']})
+        self.assertEqual(self.route.points.count(), 1)
+
+    def test_malformed_ndjson_is_a_parse_error(self):
+        """Test that a broken NDJSON line is reported with its line number"""
+        response = self.client.generic(
+            'POST', self.url, '{"x": 0.1, "y": 0.1}\n{oops\n', content_type='application/x-ndjson'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('line 2', response.json()['detail'])
+        self.assertEqual(self.route.points.count(), 1)
+
+    @override_settings(ROUTE_POINTS_BULK={'BATCH_SIZE': 2, 'MAX_POINTS': 5})
+    def test_bulk_insert_is_chunked_and_capped(self):
+        """Test that inserts run in batches and oversized uploads are refused"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, [{'x': 0.0, 'y': 0.0}] * 5, format='json')
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(self.route.points.count(), 6)
+
+        response = self.client.post(self.url, [{'x': 0.0, 'y': 0.0}] * 6, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.route.points.count(), 6)
+
+    def test_single_point_must_be_finite(self):
+        """Test that the single-point create rejects NaN and infinity like bulk uploads"""
+        response = self.client.post(self.url, {'x': 'nan', 'y': 0.1}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('x', response.json())
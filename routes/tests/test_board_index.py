@@ -0,0 +1,111 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from routes.board_index import MAX_CELLS, BoardIndex, encode_dots
+from routes.models import GameBoard
+
+DOTS = [
+    {'row': 0, 'col': 0, 'color': '#f00'},
+    {'row': 1, 'col': 1, 'color': '#0f0'},
+    {'row': 2, 'col': 2, 'color': '#f00'},
+    {'row': 2, 'col': 3, 'color': '#0f0'},
+]
+
+
+class BoardIndexTests(TestCase):
+    def test_lookups(self):
+        """Test that cells and colour pairs are looked up without scanning the dots"""
+        index = BoardIndex.from_dots(3, 4, DOTS)
+
+        self.assertEqual(index.dot_at(1, 1), {'row': 1, 'col': 1, 'color': '#0f0'})
+        self.assertIsNone(index.dot_at(0, 1))
+        self.assertIsNone(index.color_at(5, 0))
+        self.assertEqual(index.pair('#f00'), [(0, 0), (2, 2)])
+        self.assertEqual(index.pair('#00f'), [])
+        self.assertEqual(index.palette, ['#f00', '#0f0'])
+
+    def test_run_length_encoding(self):
+        """Test that the grid is stored as runs of palette indexes and decodes back"""
+        encoded = encode_dots(3, 4, DOTS)
+
+        self.assertEqual(encoded, {
+            'v': 1, 'palette': ['#f00', '#0f0'], 'runs': [1, 1, 4, 0, 1, 2, 4, 0, 1, 1, 1, 2],
+        })
+        decoded = BoardIndex.decode(3, 4, encoded)
+        self.assertEqual(list(decoded.cells), list(BoardIndex.from_dots(3, 4, DOTS).cells))
+        self.assertEqual(sorted(decoded.to_dots(), key=str), sorted(DOTS, key=str))
+
+    def test_large_sparse_board_stays_small(self):
+        """Test that a mostly empty 200x200 board encodes to a handful of runs"""
+        dots = [{'row': 0, 'col': 0, 'color': '#f00'}, {'row': 199, 'col': 199, 'color': '#f00'}]
+
+        encoded = encode_dots(200, 200, dots)
+
+        self.assertEqual(encoded['runs'], [1, 1, 200 * 200 - 2, 0, 1, 1])
+        self.assertEqual(BoardIndex.decode(200, 200, encoded).pair('#f00'), [(0, 0), (199, 199)])
+
+    def test_invalid_dots_are_skipped(self):
+        """Test that off-board, colourless and malformed dots are not indexed"""
+        index = BoardIndex.from_dots(2, 2, [
+            {'row': 0, 'col': 1, 'color': '#f00'},
+            {'row': 0, 'col': 1, 'color': '#0f0'},
+            {'row': 2, 'col': 0, 'color': '#00f'},
+            {'row': 1, 'col': 1, 'color': ''},
+            {'row': 'x', 'col': 0, 'color': '#ff0'},
+            {'col': 0},
+        ])
+
+        self.assertEqual(index.to_dots(), [{'row': 0, 'col': 1, 'color': '#f00'}])
+
+    def test_decode_rejects_mismatched_encodings(self):
+        """Test that encodings for another board size or palette are refused"""
+        encoded = encode_dots(3, 4, DOTS)
+
+        with self.assertRaises(ValueError):
+            BoardIndex.decode(4, 4, encoded)
+        with self.assertRaises(ValueError):
+            BoardIndex.decode(3, 4, dict(encoded, palette=['#f00']))
+        with self.assertRaises(ValueError):
+            BoardIndex.decode(3, 4, {})
+
+    def test_oversized_boards_are_refused(self):
+        """Test that boards with more than MAX_CELLS cells are not indexed"""
+        with self.assertRaises(ValueError):
+            BoardIndex.from_dots(MAX_CELLS + 1, 1, [])
+
+
+class GameBoardCellsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='indexer', password='indexerpassword')
+
+    def test_cells_follow_dots_on_save(self):
+        """Test that saving a board stores the encoding of its current dots"""
+        board = GameBoard.objects.create(user=self.user, title='Indexed', rows=3, cols=4, dots=DOTS[:2])
+        board.dots = DOTS
+        board.save()
+
+        board.refresh_from_db()
+        self.assertEqual(board.cells, encode_dots(3, 4, DOTS))
+        self.assertEqual(board.dot_index().pair('#0f0'), [(1, 1), (2, 3)])
+
+    def test_boards_without_cells_fall_back_to_dots(self):
+        """Test that a board saved before the index existed is indexed from its dots"""
+        board = GameBoard.objects.create(user=self.user, title='Legacy', rows=3, cols=4, dots=DOTS)
+        GameBoard.objects.filter(pk=board.pk).update(cells={})
+        board.refresh_from_db()
+
+        self.assertEqual(board.dot_index().color_at(2, 2), '#f00')
+
+    def test_snapshot_and_play_page_serve_cells(self):
+        """Test that the snapshot and the play page carry the encoding next to the dots"""
+        board = GameBoard.objects.create(user=self.user, title='Served', rows=3, cols=4, dots=DOTS)
+        self.client.force_login(self.user)
+
+        snapshot = self.client.get(reverse('board_snapshot', args=[board.id])).json()
+        page = self.client.get(reverse('draw_path', args=[board.id]))
+
+        self.assertEqual(snapshot['dots'], DOTS)
+        self.assertEqual(snapshot['cells'], encode_dots(3, 4, DOTS))
+        self.assertContains(page, "'runs': [1, 1, 4, 0, 1, 2, 4, 0, 1, 1, 1, 2]")
@@ -0,0 +1,138 @@
+import json
+
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+from routes.bulk import insert_points
+from routes.models import BackgroundImage, GameBoard, GamePath, Route
+
+
+class RouteConditionalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='etaguser',
+            email='etag@example.com',
+            password='etagpassword'
+        )
+        cls.background = BackgroundImage.objects.create(title='ETag Background', image='backgrounds/etag.png')
+        cls.route = Route.objects.create(user=cls.user, name='Tagged', background=cls.background)
+        insert_points(cls.route, [(i / 10, 0.5) for i in range(10)], batch_size=100)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.detail_url = reverse('api-route-detail', args=[self.route.id])
+        self.points_url = reverse('api-route-points', args=[self.route.id])
+
+    def test_unchanged_route_is_not_modified(self):
+        """Test that repeating a GET with the ETag or date answers 304 with no body"""
+        first = self.client.get(self.detail_url)
+        self.assertIn('ETag', first)
+        self.assertIn('Last-Modified', first)
+
+        by_etag = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=first['ETag'])
+        by_date = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+
+        self.assertEqual(by_etag.status_code, 304)
+        self.assertEqual(by_etag.content, b'')
+        self.assertEqual(by_date.status_code, 304)
+
+    def test_etag_changes_with_route_points_and_background(self):
+        """Test that renames, point edits and background edits all change the ETag"""
+        etags = [self.client.get(self.detail_url)['ETag']]
+
+        self.client.patch(self.detail_url, {'name': 'Renamed'}, format='json')
+        etags.append(self.client.get(self.detail_url)['ETag'])
+        self.client.post(self.points_url, {'x': 0.1, 'y': 0.2}, format='json')
+        etags.append(self.client.get(self.detail_url)['ETag'])
+        self.background.title = 'Retitled'
+        self.background.save()
+        etags.append(self.client.get(self.detail_url)['ETag'])
+
+        self.assertEqual(len(set(etags)), 4)
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['background']['title'], 'Retitled')
+
+    def test_points_and_detail_share_validators(self):
+        """Test that the points list is conditional on the route's ETag"""
+        etag = self.client.get(self.detail_url)['ETag']
+
+        response = self.client.get(self.points_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_stale_if_match_is_refused(self):
+        """Test that writes with an outdated ETag get 412 and change nothing"""
+        etag = self.client.get(self.detail_url)['ETag']
+        self.client.patch(self.detail_url, {'name': 'First'}, format='json')
+
+        rename = self.client.patch(self.detail_url, {'name': 'Second'}, format='json', HTTP_IF_MATCH=etag)
+        point = self.client.post(self.points_url, {'x': 0.1, 'y': 0.2}, format='json', HTTP_IF_MATCH=etag)
+
+        self.assertEqual(rename.status_code, 412)
+        self.assertEqual(point.status_code, 412)
+        self.route.refresh_from_db()
+        self.assertEqual(self.route.name, 'First')
+        self.assertEqual(self.route.points.count(), 10)
+
+    def test_current_if_match_is_accepted(self):
+        """Test that a write with the current ETag goes through"""
+        etag = self.client.get(self.detail_url)['ETag']
+
+        response = self.client.patch(self.detail_url, {'name': 'Mine'}, format='json', HTTP_IF_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_lists_are_conditional(self):
+        """Test that route and background lists answer 304 until something changes"""
+        for url in (reverse('api-route-list'), reverse('api-background-list')):
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        etag = self.client.get(reverse('api-route-list'))['ETag']
+        Route.objects.create(user=self.user, background=self.background)
+        self.assertEqual(self.client.get(reverse('api-route-list'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class BoardConditionalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='boardetag',
+            email='boardetag@example.com',
+            password='boardetagpassword'
+        )
+        cls.board = GameBoard.objects.create(user=cls.user, title='Tagged', rows=3, cols=3)
+
+    def setUp(self):
+        self.client.login(username='boardetag', password='boardetagpassword')
+        self.url = reverse('board_snapshot', args=[self.board.id])
+
+    def test_snapshot_is_not_modified_until_paths_change(self):
+        """Test that a player's move invalidates the board snapshot's ETag"""
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        GamePath.objects.create(user=self.user, board=self.board, paths_data={'#f00': []})
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('boardetag', response.json()['paths'])
+
+    def test_stale_board_edit_is_refused(self):
+        """Test that editing a board with an outdated ETag gets 412"""
+        etag = self.client.get(self.url)['ETag']
+        self.board.title = 'Edited elsewhere'
+        self.board.save()
+
+        response = self.client.post(
+            reverse('connect_dots_edit', args=[self.board.id]),
+            json.dumps({'title': 'Mine'}), content_type='application/json', HTTP_IF_MATCH=etag
+        )
+
+        self.assertEqual(response.status_code, 412)
+        self.board.refresh_from_db()
+        self.assertEqual(self.board.title, 'Edited elsewhere')
@@ -0,0 +1,221 @@
+import json
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django_project import sse_engine
+from django_project.sse_engine import ClientQueue
+from routes.deltas import (
+    apply_dots_delta,
+    apply_paths_delta,
+    compose_paths_deltas,
+    diff_dots,
+    diff_paths,
+    merge_path_messages,
+)
+from routes.models import GameBoard, GamePath
+
+
+def received_messages(client):
+    return [json.loads(event.frame.split(b'data: ', 1)[1]) for event in client.pop_all()]
+
+
+class DeltaTests(TestCase):
+    def test_diff_dots_reports_added_and_removed(self):
+        """Test that only changed dots appear in the diff"""
+        old = [{'row': 0, 'col': 0, 'color': '#f00'}, {'row': 1, 'col': 1, 'color': '#0f0'}]
+        new = [{'row': 0, 'col': 0, 'color': '#f00'}, {'row': 2, 'col': 2, 'color': '#0f0'}]
+
+        delta = diff_dots(old, new)
+
+        self.assertEqual(delta['added'], [{'row': 2, 'col': 2, 'color': '#0f0'}])
+        self.assertEqual(delta['removed'], [{'row': 1, 'col': 1, 'color': '#0f0'}])
+        self.assertEqual(apply_dots_delta(old, delta), new)
+
+    def test_diff_paths_appends_and_truncates(self):
+        """Test that path edits are expressed as keep/append per colour"""
+        old = {
+            '#f00': [{'row': 0, 'col': 0}, {'row': 0, 'col': 1}],
+            '#0f0': [{'row': 1, 'col': 0}, {'row': 1, 'col': 1}, {'row': 1, 'col': 2}],
+            '#00f': [{'row': 2, 'col': 0}],
+        }
+        new = {
+            '#f00': [{'row': 0, 'col': 0}, {'row': 0, 'col': 1}, {'row': 0, 'col': 2}],
+            '#0f0': [{'row': 1, 'col': 0}],
+            '#00f': [{'row': 2, 'col': 0}],
+        }
+
+        delta = diff_paths(old, new)
+
+        self.assertEqual(delta['#f00'], {'keep': 2, 'append': [{'row': 0, 'col': 2}]})
+        self.assertEqual(delta['#0f0'], {'keep': 1, 'append': []})
+        self.assertNotIn('#00f', delta)
+        self.assertEqual(apply_paths_delta(old, delta), new)
+
+    def test_removed_colour_is_dropped_on_apply(self):
+        """Test that a path removed entirely disappears when the delta is applied"""
+        old = {'#f00': [{'row': 0, 'col': 0}]}
+        delta = diff_paths(old, {})
+
+        self.assertEqual(delta, {'#f00': {'keep': 0, 'append': []}})
+        self.assertEqual(apply_paths_delta(old, delta), {})
+
+
+def cells(*cols):
+    return [{'row': 0, 'col': c} for c in cols]
+
+
+class MergeTests(TestCase):
+    def test_composed_deltas_match_sequential_application(self):
+        """Test that composing two deltas equals applying them in turn"""
+        states = [
+            {'#f00': cells(0, 1, 2), '#0f0': cells(5)},
+            {'#f00': cells(0, 1, 2, 3, 4), '#0f0': cells(5, 6)},
+            {'#f00': cells(0, 1, 2, 3, 9), '#00f': cells(7)},
+        ]
+        first = diff_paths(states[0], states[1])
+        second = diff_paths(states[1], states[2])
+
+        composed = compose_paths_deltas(first, second)
+
+        self.assertEqual(apply_paths_delta(states[0], composed), states[2])
+
+    def test_merge_keeps_created_type_and_full_state(self):
+        """Test that an update merged into a create still reads as a create"""
+        created = {'type': 'paths_created', 'version': 1, 'paths_data': {'#f00': cells(0)}}
+        updated = {
+            'type': 'paths_updated', 'version': 2, 'base_version': 1,
+            'paths_delta': {'#f00': {'keep': 1, 'append': cells(1)}},
+        }
+
+        merged = merge_path_messages(created, updated)
+
+        self.assertEqual(merged['type'], 'paths_created')
+        self.assertEqual(merged['version'], 2)
+        self.assertEqual(merged['paths_data'], {'#f00': cells(0, 1)})
+        self.assertNotIn('paths_delta', merged)
+
+    def test_merge_into_snapshot_keeps_its_keys(self):
+        """Test that a delta merged into a snapshot keeps the snapshot's other fields"""
+        created = {
+            'type': 'paths_created', 'user': 'alice', 'board_id': 1, 'board_owner': 'bob',
+            'version': 1, 'paths_data': {'#f00': cells(0)}, 'completed': False,
+        }
+        updated = {
+            'type': 'paths_updated', 'user': 'alice', 'board_id': 1, 'board_owner': 'bob',
+            'version': 2, 'base_version': 1, 'completed': True,
+            'paths_delta': {'#f00': {'keep': 1, 'append': cells(1)}},
+        }
+
+        merged = merge_path_messages(created, updated)
+
+        self.assertEqual(merged, dict(created, version=2, completed=True, paths_data={'#f00': cells(0, 1)}))
+
+    def test_merge_spans_base_versions(self):
+        """Test that merged deltas apply from the first base version"""
+        first = {'type': 'paths_updated', 'version': 2, 'base_version': 1,
+                 'paths_delta': {'#f00': {'keep': 1, 'append': cells(1)}}}
+        second = {'type': 'paths_updated', 'version': 3, 'base_version': 2,
+                  'paths_delta': {'#f00': {'keep': 2, 'append': cells(2)}}}
+
+        merged = merge_path_messages(first, second)
+
+        self.assertEqual((merged['base_version'], merged['version']), (1, 3))
+        self.assertEqual(merged['paths_delta'], {'#f00': {'keep': 1, 'append': cells(1, 2)}})
+
+
+@override_settings(SSE_DISPATCHER={'MODE': 'inline'}, SSE_DEBOUNCE_INTERVAL=0)
+class DeltaNotificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='deltauser',
+            email='delta@example.com',
+            password='deltapassword'
+        )
+
+    def setUp(self):
+        self.listener = ClientQueue()
+        sse_engine.register_client(self.listener)
+
+    def tearDown(self):
+        sse_engine.unregister_all()
+
+    def test_board_update_broadcasts_dot_diff(self):
+        """Test that updating a board sends a versioned diff, not every dot"""
+        dots = [{'row': r, 'col': 0, 'color': '#f00'} for r in range(10)]
+        with self.captureOnCommitCallbacks(execute=True):
+            board = GameBoard.objects.create(user=self.user, title='Delta', rows=10, cols=10, dots=dots)
+        created = received_messages(self.listener)[0]
+        self.assertEqual(created['type'], 'board_created')
+        self.assertEqual(created['version'], 1)
+        self.assertEqual(len(created['dots']), 10)
+
+        board.dots = dots + [{'row': 0, 'col': 5, 'color': '#00f'}]
+        with self.captureOnCommitCallbacks(execute=True):
+            board.save()
+
+        updated = received_messages(self.listener)[0]
+        self.assertEqual(updated['type'], 'board_updated')
+        self.assertNotIn('dots', updated)
+        self.assertEqual((updated['base_version'], updated['version']), (1, 2))
+        self.assertEqual(updated['dots_delta'], {
+            'added': [{'row': 0, 'col': 5, 'color': '#00f'}],
+            'removed': [],
+        })
+
+    def test_path_update_broadcasts_path_diff(self):
+        """Test that extending a path sends only the appended cells"""
+        board = GameBoard.objects.create(user=self.user, title='Paths', rows=5, cols=5)
+        path = GamePath.objects.create(
+            user=self.user, board=board, paths_data={'#f00': [{'row': 0, 'col': 0}]}
+        )
+
+        path.paths_data = {'#f00': [{'row': 0, 'col': 0}, {'row': 0, 'col': 1}]}
+        with self.captureOnCommitCallbacks(execute=True):
+            path.save()
+
+        updated = received_messages(self.listener)[0]
+        self.assertEqual(updated['type'], 'paths_updated')
+        self.assertEqual((updated['base_version'], updated['version']), (1, 2))
+        self.assertEqual(updated['paths_delta'], {
+            '#f00': {'keep': 1, 'append': [{'row': 0, 'col': 1}]}
+        })
+
+    def test_concurrent_saves_reserve_distinct_versions(self):
+        """Test that the version is bumped in the database before the old state is read"""
+        board = GameBoard.objects.create(user=self.user, title='Race', rows=3, cols=3)
+        first, second = GameBoard.objects.get(pk=board.pk), GameBoard.objects.get(pk=board.pk)
+        first.dots = [{'row': 0, 'col': 0, 'color': '#f00'}]
+        second.dots = [{'row': 1, 'col': 1, 'color': '#00f'}]
+
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            first.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            second.save()
+
+        board_queries = [q['sql'] for q in queries if '"routes_gameboard"' in q['sql']]
+        self.assertTrue(board_queries[0].startswith('UPDATE "routes_gameboard" SET "version"'))
+        messages = received_messages(self.listener)
+        self.assertEqual([(m['base_version'], m['version']) for m in messages], [(1, 2), (2, 3)])
+        self.assertEqual(messages[1]['dots_delta']['removed'], first.dots)
+        self.assertEqual(GameBoard.objects.get(pk=board.pk).version, 3)
+
+    def test_snapshot_returns_full_state(self):
+        """Test that a lagging client can fetch the full board and paths"""
+        board = GameBoard.objects.create(
+            user=self.user, title='Snap', rows=3, cols=3,
+            dots=[{'row': 0, 'col': 0, 'color': '#f00'}]
+        )
+        GamePath.objects.create(user=self.user, board=board, paths_data={'#f00': []})
+        self.client.login(username='deltauser', password='deltapassword')
+
+        response = self.client.get(reverse('board_snapshot', args=[board.id]))
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['version'], 1)
+        self.assertEqual(data['dots'], [{'row': 0, 'col': 0, 'color': '#f00'}])
+        self.assertEqual(data['paths']['deltauser']['paths_data'], {'#f00': []})
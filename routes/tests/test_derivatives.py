@@ -0,0 +1,129 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+from PIL import Image
+from rest_framework.test import APIClient
+from routes import derivatives
+from routes.models import BackgroundImage
+
+
+def temporary_media(test, **overrides):
+    media = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media)
+    settings = override_settings(MEDIA_ROOT=media, **overrides)
+    settings.enable()
+    test.addCleanup(settings.disable)
+
+
+def upload(name='map.png', size=(1600, 900), mode='RGBA'):
+    buffer = BytesIO()
+    Image.new(mode, size, (10, 120, 200, 255)[:len(mode)]).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class DerivativeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='thumbuser',
+            email='thumb@example.com',
+            password='thumbpassword'
+        )
+
+    def setUp(self):
+        temporary_media(self, BACKGROUND_DERIVATIVES={'MODE': 'inline'}, BACKGROUND_TILES={'MODE': 'lazy'})
+        self.client.login(username='thumbuser', password='thumbpassword')
+
+    def test_upload_renders_every_size_and_format(self):
+        """Test that saving an upload stores bounded WebP and JPEG copies"""
+        background = BackgroundImage.objects.create(title='Map', image=upload())
+        background.refresh_from_db()
+
+        self.assertEqual(len(background.derivative_hash), 64)
+        for size, box in derivatives.SIZES:
+            for ext in derivatives.FORMAT_NAMES:
+                name = derivatives.derivative_name(background.derivative_hash, size, ext)
+                with default_storage.open(name) as stored, Image.open(stored) as image:
+                    self.assertEqual(image.format, 'WEBP' if ext == 'webp' else 'JPEG')
+                    self.assertEqual(image.size, (1600, 900) if box is None else (box, round(box * 900 / 1600)))
+
+    def test_identical_uploads_share_derivatives(self):
+        """Test that derivatives are named by content, not by upload"""
+        first = BackgroundImage.objects.create(title='One', image=upload('one.png'))
+        second = BackgroundImage.objects.create(title='Two', image=upload('two.png'))
+
+        self.assertEqual(first.derivative_hash, second.derivative_hash)
+        first.image = upload('three.png', size=(300, 200), mode='RGB')
+        first.save()
+        self.assertNotEqual(first.derivative_hash, second.derivative_hash)
+
+    def test_stored_hash_spares_reading_the_source(self):
+        """Test that the recorded content hash is used instead of re-reading the image"""
+        background = BackgroundImage.objects.create(title='Known', image=upload())
+        default_storage.delete(background.image.name)
+
+        digest = derivatives.render(background.image.name, background.content_hash)
+
+        self.assertEqual(digest, background.derivative_hash)
+        self.assertEqual(digest, background.content_hash)
+
+    @override_settings(BACKGROUND_DERIVATIVES={'MODE': 'lazy'})
+    def test_lazy_render_on_first_request(self):
+        """Test that missing derivatives are rendered by the view, then linked directly"""
+        background = BackgroundImage.objects.create(title='Lazy', image=upload())
+        url = background.derivative_urls['thumbnail']['webp']
+        self.assertEqual(url, reverse('background_derivative', args=[background.id, 'thumbnail', 'webp']))
+
+        response = self.client.get(url)
+
+        background.refresh_from_db()
+        self.assertRedirects(
+            response, background.derivative_urls['thumbnail']['webp'], fetch_redirect_response=False
+        )
+        self.assertTrue(default_storage.exists(
+            derivatives.derivative_name(background.derivative_hash, 'thumbnail', 'webp')
+        ))
+
+    def test_unknown_or_broken_derivative_is_404(self):
+        """Test that bad sizes and unreadable sources are not found"""
+        broken = BackgroundImage.objects.create(title='Gone', image='backgrounds/missing.png')
+
+        for size, ext in (('huge', 'webp'), ('thumbnail', 'gif'), ('thumbnail', 'webp')):
+            response = self.client.get(reverse('background_derivative', args=[broken.id, size, ext]))
+            self.assertEqual(response.status_code, 404)
+
+    def test_serializer_lists_derivative_urls(self):
+        """Test that the API exposes absolute URLs for each size and format"""
+        background = BackgroundImage.objects.create(title='Api', image=upload())
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        data = client.get(reverse('api-background-detail', args=[background.id])).json()
+
+        self.assertEqual(set(data['derivatives']), set(derivatives.SIZE_NAMES))
+        self.assertTrue(data['derivatives']['medium']['jpg'].startswith('http://testserver/media/'))
+        self.assertIn(background.derivative_hash, data['derivatives']['medium']['jpg'])
+
+
+class WorkerPoolTests(TransactionTestCase):
+    def setUp(self):
+        temporary_media(
+            self, BACKGROUND_DERIVATIVES={'MODE': 'thread', 'WORKERS': 1}, BACKGROUND_TILES={'MODE': 'lazy'}
+        )
+
+    def test_upload_is_rendered_in_the_pool(self):
+        """Test that the upload returns at once and a worker records the derivatives"""
+        background = BackgroundImage.objects.create(title='Pooled', image=upload())
+        self.assertEqual(background.derivative_hash, '')
+
+        digest = derivatives.submit(background).result(timeout=30)
+
+        background.refresh_from_db()
+        self.assertEqual(background.derivative_hash, digest)
+        self.assertEqual(derivatives.ensure(background), digest)
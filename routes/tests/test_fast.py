@@ -0,0 +1,72 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+from routes.bulk import insert_points
+from routes.models import BackgroundImage, Route
+
+
+class FastSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='fastuser',
+            email='fast@example.com',
+            password='fastpassword'
+        )
+        background = BackgroundImage.objects.create(title='Fast   Background', image='backgrounds/fast.png')
+        BackgroundImage.objects.create(title='No image', image='')
+        cls.route = Route.objects.create(user=cls.user, name='Fast é route', background=background)
+        # Awkward floats: long reprs, exponents, negative zero
+        coordinates = [(i / 7, 1e-7 * i) for i in range(500)] + [(-0.0, 0.1 + 0.2), (1e16, 123456789.125)]
+        insert_points(cls.route, coordinates, batch_size=100)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertSameAsDRF(self, url, params=None, **extra):
+        fast = self.client.get(url, params, **extra)
+        with override_settings(ROUTES_FAST_SERIALIZERS=False):
+            slow = self.client.get(url, params, **extra)
+
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.status_code, slow.status_code)
+        self.assertEqual(fast['Content-Type'], slow['Content-Type'])
+        self.assertEqual(fast.content, slow.content)
+        return fast
+
+    def test_route_detail_is_byte_identical(self):
+        """Test that the fast route detail matches the DRF serializer exactly"""
+        response = self.assertSameAsDRF(reverse('api-route-detail', args=[self.route.id]))
+
+        self.assertEqual(len(response.json()['points']), 502)
+
+    def test_points_are_byte_identical(self):
+        """Test that full and simplified point lists match the DRF output exactly"""
+        url = reverse('api-route-points', args=[self.route.id])
+
+        self.assertSameAsDRF(url)
+        self.assertSameAsDRF(url, {'zoom': 3})
+        self.assertSameAsDRF(url, {'tolerance': '0.01', 'method': 'visvalingam'})
+
+    def test_background_list_is_byte_identical(self):
+        """Test that the values_list background page matches the serializer"""
+        response = self.assertSameAsDRF(reverse('api-background-list'))
+
+        self.assertEqual(response.json()['count'], 2)
+
+    def test_empty_route_is_byte_identical(self):
+        """Test that a route without points still renders the same"""
+        route = Route.objects.create(user=self.user, name='Empty', background=self.route.background)
+
+        self.assertSameAsDRF(reverse('api-route-detail', args=[route.id]))
+        self.assertSameAsDRF(reverse('api-route-points', args=[route.id]))
+
+    def test_indented_output_falls_back(self):
+        """Test that an indent in the Accept header is still honoured"""
+        response = self.assertSameAsDRF(
+            reverse('api-route-detail', args=[self.route.id]), HTTP_ACCEPT='application/json; indent=2'
+        )
+
+        self.assertIn(b'\n  "points": [', response.content)
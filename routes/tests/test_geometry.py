@@ -0,0 +1,116 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+from routes.geometry import PackedPoint, pack, route_points, unpack
+from routes.models import BackgroundImage, Route, RoutePoint
+from routes.ordering import delete_point, move_point, next_orders
+
+
+class GeometryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='geomuser',
+            email='geom@example.com',
+            password='geompassword'
+        )
+        cls.background = BackgroundImage.objects.create(title='Geometry Background', image='backgrounds/geom.png')
+
+    def setUp(self):
+        self.route = Route.objects.create(user=self.user, background=self.background)
+        orders = next_orders(self.route, 3)
+        self.points = RoutePoint.objects.bulk_create(
+            RoutePoint(route=self.route, x=i / 3, y=1 - i / 3, order=order) for i, order in enumerate(orders)
+        )
+
+    def stored_version(self):
+        blob = Route.objects.values_list('geometry', flat=True).get(pk=self.route.pk)
+        return unpack(blob)[0] if blob else None
+
+    def test_pack_round_trip(self):
+        """Test that packing keeps ids, orders and float64 coordinates exact"""
+        rows = [(1, 0.1, 0.2, 0), (7, 1 / 3, 2 / 3, 1024)]
+
+        version, ids, xs, ys, orders = unpack(pack(5, rows))
+
+        self.assertEqual(version, 5)
+        self.assertEqual(list(zip(ids, xs, ys, orders)), rows)
+        self.assertIsNone(unpack(b'not a route'))
+
+    def test_first_read_builds_blob_and_later_reads_use_it(self):
+        """Test that a built blob is served without touching RoutePoint"""
+        expected = [PackedPoint(p.id, p.x, p.y, p.order) for p in self.points]
+        self.assertEqual(route_points(self.route), expected)
+        self.assertIsNotNone(self.stored_version())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(route_points(self.route), expected)
+
+    def test_edits_invalidate_the_blob(self):
+        """Test that every point mutation path leaves a stale blob behind"""
+        route_points(self.route)
+
+        point = self.points[0]
+        point.x = 0.9
+        point.save()
+        self.assertEqual(route_points(self.route)[0].x, 0.9)
+
+        move_point(self.points[2], 0)
+        self.assertEqual([p.id for p in route_points(self.route)][0], self.points[2].id)
+
+        delete_point(self.points[1])
+        self.assertEqual(len(route_points(self.route)), 2)
+
+    def test_orm_deletes_invalidate_the_blob(self):
+        """Test that deleting points outside routes.ordering leaves a stale blob behind"""
+        route_points(self.route)
+
+        RoutePoint.objects.filter(route=self.route).first().delete()
+        self.assertEqual(len(route_points(self.route)), 2)
+
+        # One invalidation for the route, however many points go
+        with self.assertNumQueries(3):
+            RoutePoint.objects.filter(route=self.route).delete()
+        self.assertEqual(route_points(self.route), [])
+
+    def test_route_delete_cascades_without_invalidating(self):
+        """Test that deleting a route does not update it once per point"""
+        route_points(self.route)
+        route_id = self.route.pk
+
+        with CaptureQueriesContext(connection) as queries:
+            self.route.delete()
+
+        self.assertFalse(RoutePoint.objects.filter(route_id=route_id).exists())
+        self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE "routes_route"')])
+
+    def test_detail_and_points_action_read_packed_geometry(self):
+        """Test that the API serves points from the blob in a fixed number of queries"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        route_points(self.route)
+
+        with self.assertNumQueries(2):
+            # route joined with its background, packed geometry
+            response = client.get(reverse('api-route-detail', args=[self.route.id]))
+        self.assertEqual(response.json()['points'][1], {
+            'id': self.points[1].id, 'x': self.points[1].x, 'y': self.points[1].y,
+            'order': self.points[1].order,
+        })
+
+        with self.assertNumQueries(2):
+            # route ownership check, packed geometry
+            response = client.get(reverse('api-route-points', args=[self.route.id]))
+        self.assertEqual([p['id'] for p in response.json()], [p.id for p in self.points])
+
+    def test_edit_route_renders_packed_points(self):
+        """Test that the editor lists the points from the packed geometry"""
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('edit_route', args=[self.route.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'data-point-id="{self.points[2].id}"')
@@ -0,0 +1,78 @@
+import importlib
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.base import ContentFile
+
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import User
+from routes.models import BackgroundImage
+from routes.tests.test_derivatives import temporary_media, upload
+
+
+class MetadataTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='metauser',
+            email='meta@example.com',
+            password='metapassword'
+        )
+
+    def setUp(self):
+        temporary_media(self, BACKGROUND_DERIVATIVES={'MODE': 'lazy'}, BACKGROUND_TILES={'MODE': 'lazy'})
+
+    def test_upload_records_metadata(self):
+        """Test that dimensions, size, hash and colour are stored at upload"""
+        background = BackgroundImage.objects.create(title='Meta', image=upload(size=(320, 240), mode='RGB'))
+
+        background.refresh_from_db()
+        self.assertEqual((background.width, background.height), (320, 240))
+        self.assertEqual(background.file_size, default_storage.size(background.image.name))
+        self.assertEqual(background.image.name, f'backgrounds/{background.content_hash}.png')
+        self.assertEqual(background.dominant_color, '#0a78c8')
+
+    def test_identical_uploads_share_one_file(self):
+        """Test that re-uploading the same content stores no second copy"""
+        first = BackgroundImage.objects.create(title='One', image=upload('community-map.png'))
+        second = BackgroundImage.objects.create(title='Two', image=upload('community-map.png'))
+        other = BackgroundImage.objects.create(title='Other', image=upload('other.png', size=(10, 10)))
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        _, files = default_storage.listdir('backgrounds')
+        self.assertEqual(len(files), 2)
+
+    def test_listing_never_opens_images(self):
+        """Test that the background list is rendered from stored metadata alone"""
+        BackgroundImage.objects.create(title='Listed', image=upload())
+        self.client.login(username='metauser', password='metapassword')
+        # Let the static files storage read its manifest first
+        staticfiles_storage.url('js/dist/draw_path.js')
+
+        with mock.patch.object(FileSystemStorage, 'open', side_effect=AssertionError('opened')) as opened:
+            page = self.client.get(reverse('choose_background'))
+            api = self.client.get(reverse('api-background-list')).json()
+
+        self.assertContains(page, 'width="1600" height="900"')
+        self.assertEqual(api['results'][0]['width'], 1600)
+        opened.assert_not_called()
+
+    def test_migration_collapses_identical_files(self):
+        """Test that rows with identical images end up sharing one file named by its hash"""
+        migration = importlib.import_module('routes.migrations.0014_backgroundimage_content_addressed')
+        data = upload().read()
+        names = [default_storage.save(f'backgrounds/community-map{n}.png', ContentFile(data)) for n in (1, 2)]
+        rows = [BackgroundImage.objects.create(title=name, image=name) for name in names]
+        digest = BackgroundImage.objects.create(title='Hashed', image=upload()).content_hash
+        BackgroundImage.objects.filter(pk__in=[row.pk for row in rows]).update(content_hash=digest)
+
+        migration.content_address_files(apps, None)
+
+        target = f'backgrounds/{digest}.png'
+        self.assertEqual(set(BackgroundImage.objects.values_list('image', flat=True)), {target})
+        self.assertEqual(default_storage.listdir('backgrounds')[1], [f'{digest}.png'])
+        self.assertEqual(BackgroundImage.objects.get(pk=rows[0].pk).version, rows[0].version + 1)
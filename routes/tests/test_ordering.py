@@ -0,0 +1,169 @@
+import threading
+import time
+
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+from routes.models import BackgroundImage, Route, RoutePoint
+from routes.ordering import ORDER_STEP, append_point, move_point, next_orders, rebalance
+
+
+class OrderingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='orderuser',
+            email='order@example.com',
+            password='orderpassword'
+        )
+        cls.background = BackgroundImage.objects.create(title='Order Background', image='backgrounds/order.png')
+        cls.route = Route.objects.create(user=cls.user, background=cls.background)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_points(self, count):
+        orders = next_orders(self.route, count)
+        return RoutePoint.objects.bulk_create(
+            RoutePoint(route=self.route, x=i, y=0.0, order=order) for i, order in enumerate(orders)
+        )
+
+    def sequence(self):
+        return [int(x) for x in self.route.points.values_list('x', flat=True)]
+
+    def test_delete_leaves_other_points_untouched(self):
+        """Test that deleting the first point issues no UPDATEs"""
+        points = self.add_points(50)
+        url = reverse('api-route-point-detail', args=[self.route.id, points[0].id])
+
+        with self.assertNumQueries(3):
+            # point lookup, the DELETE and the geometry version bump
+            response = self.client.delete(url)
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.sequence(), list(range(1, 50)))
+        self.assertEqual(self.route.points.first().order, ORDER_STEP)
+
+    def test_delete_view_and_api_agree(self):
+        """Test that the HTML delete view keeps the same order as the API"""
+        points = self.add_points(3)
+        self.client.force_login(self.user)
+        self.client.get(reverse('delete_route_point', args=[points[1].id]))
+
+        self.client.post(reverse('api-route-points', args=[self.route.id]), {'x': 9, 'y': 0}, format='json')
+
+        self.assertEqual(self.sequence(), [0, 2, 9])
+
+    def test_move_updates_only_the_moved_point(self):
+        """Test that a move between two spaced keys writes a single row"""
+        points = self.add_points(5)
+        url = reverse('api-route-point-move', args=[self.route.id, points[4].id])
+
+        response = self.client.post(url, {'position': 1}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.sequence(), [0, 4, 1, 2, 3])
+        self.assertEqual(response.json()['order'], ORDER_STEP // 2)
+        unchanged = RoutePoint.objects.filter(id__in=[p.id for p in points[:4]])
+        self.assertEqual(sorted(unchanged.values_list('order', flat=True)), [0, 1024, 2048, 3072])
+
+    def test_move_to_the_ends(self):
+        """Test moving a point to the front and past the back"""
+        points = self.add_points(3)
+
+        move_point(points[2], 0)
+        move_point(points[1], 10)
+
+        self.assertEqual(self.sequence(), [2, 0, 1])
+
+    def test_exhausted_gap_triggers_rebalance(self):
+        """Test that a move into adjacent keys renumbers the route first"""
+        points = RoutePoint.objects.bulk_create(
+            RoutePoint(route=self.route, x=i, y=0.0, order=i) for i in range(3)
+        )
+
+        move_point(points[2], 1)
+
+        self.assertEqual(self.sequence(), [0, 2, 1])
+        self.assertEqual(
+            list(self.route.points.values_list('order', flat=True)), [0, ORDER_STEP // 2, ORDER_STEP]
+        )
+        self.assertEqual(rebalance(self.route), 2)
+
+    def test_append_after_rebalance_continues_from_the_last_point(self):
+        """Test that rebalancing winds the append counter back and appends follow on"""
+        points = self.add_points(100)
+        RoutePoint.objects.filter(pk__in=[p.pk for p in points[::2]]).delete()
+
+        rebalance(self.route)
+        self.assertEqual(Route.objects.get(pk=self.route.pk).next_order, 50 * ORDER_STEP)
+        appended = append_point(RoutePoint(x=100, y=0.0), self.route)
+
+        self.assertEqual(appended.order, 50 * ORDER_STEP)
+        self.assertEqual(self.sequence(), list(range(1, 100, 2)) + [100])
+
+    def test_update_with_order_points_to_move(self):
+        """Test that sending order in an update is refused instead of ignored"""
+        points = self.add_points(2)
+        url = reverse('api-route-point-detail', args=[self.route.id, points[1].id])
+
+        for method in (self.client.put, self.client.patch):
+            response = method(url, {'x': 5, 'y': 0.0, 'order': 0}, format='json')
+
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('move', response.json()['order'][0])
+        self.assertEqual(self.sequence(), [0, 1])
+        self.assertEqual(self.client.patch(url, {'x': 5}, format='json').status_code, 200)
+
+    def test_move_requires_position(self):
+        """Test that a move without a valid position is rejected"""
+        point = self.add_points(1)[0]
+        url = reverse('api-route-point-move', args=[self.route.id, point.id])
+
+        response = self.client.post(url, {'position': 'first'}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class ConcurrentAppendTests(TransactionTestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='racer', password='racerpassword')
+        background = BackgroundImage.objects.create(title='Race Background', image='backgrounds/race.png')
+        self.route = Route.objects.create(user=user, background=background)
+
+    def append(self, barrier, errors):
+        try:
+            barrier.wait()
+            for _ in range(10):
+                while True:
+                    try:
+                        append_point(RoutePoint(x=0.0, y=0.0), self.route)
+                        break
+                    except OperationalError:
+                        # The in-memory SQLite test database reports a
+                        # competing writer at once instead of waiting
+                        time.sleep(0.001)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def test_parallel_appends_get_unique_contiguous_orders(self):
+        """Test that appends racing on one route never share an order key"""
+        threads = 8
+        barrier = threading.Barrier(threads)
+        errors = []
+        workers = [
+            threading.Thread(target=self.append, args=(barrier, errors)) for _ in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        orders = list(self.route.points.values_list('order', flat=True))
+        self.assertEqual(orders, [i * ORDER_STEP for i in range(threads * 10)])
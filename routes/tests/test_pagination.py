@@ -0,0 +1,80 @@
+import json
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+from routes.bulk import insert_points
+from routes.models import BackgroundImage, Route
+from routes.pagination import STREAM_CHUNK_SIZE, RoutePointCursorPagination
+
+
+class PointPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='pageuser',
+            email='page@example.com',
+            password='pagepassword'
+        )
+        background = BackgroundImage.objects.create(title='Page Background', image='backgrounds/page.png')
+        cls.route = Route.objects.create(user=cls.user, background=background)
+        cls.size = STREAM_CHUNK_SIZE + 500
+        insert_points(cls.route, [(i / cls.size, 0.5) for i in range(cls.size)], batch_size=1000)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('api-route-points', args=[self.route.id])
+
+    def expected_ids(self):
+        return list(self.route.points.values_list('id', flat=True))
+
+    def test_cursor_pages_cover_every_point_once(self):
+        """Test that following next links visits each point exactly once, in order"""
+        ids = []
+        url, params = self.url, {'page_size': 1000}
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                page = self.client.get(url, params).json()
+                ids += [point['id'] for point in page['results']]
+                url, params = page['next'], None
+
+        self.assertEqual(ids, self.expected_ids())
+        pages = [q['sql'] for q in queries.captured_queries if 'routes_routepoint' in q['sql']]
+        self.assertEqual(len(pages), 3)
+        # Later pages seek past the previous key instead of skipping rows
+        self.assertIn('"order" > ', pages[1])
+        self.assertNotIn('OFFSET', pages[1])
+
+    def test_page_size_is_capped(self):
+        """Test that clients cannot ask for unbounded pages"""
+        with mock.patch.object(RoutePointCursorPagination, 'max_page_size', 100):
+            page = self.client.get(self.url, {'page_size': 10 ** 6}).json()
+
+        self.assertEqual(len(page['results']), 100)
+
+    def test_ndjson_stream_matches_full_list(self):
+        """Test that the NDJSON export yields every point as its own line"""
+        response = self.client.get(self.url, {'stream': 'ndjson'})
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 1)
+        lines = b''.join(chunks).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], self.expected_ids())
+
+    def test_json_stream_is_one_array(self):
+        """Test that the JSON export parses as the same list the plain endpoint returns"""
+        streamed = json.loads(b''.join(self.client.get(self.url, {'stream': 'json'}).streaming_content))
+
+        self.assertEqual(streamed, self.client.get(self.url).json())
+
+    def test_modes_cannot_be_combined(self):
+        """Test that conflicting or unknown mode parameters are rejected"""
+        for params in ({'stream': 'ndjson', 'zoom': 1}, {'cursor': 'x', 'stream': 'json'}, {'stream': 'xml'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
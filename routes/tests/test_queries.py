@@ -0,0 +1,130 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from routes.bulk import insert_points
+from routes.geometry import route_points
+from routes.models import BackgroundImage, Route, invalidate_route_geometry
+
+
+class QueryCountTests(TestCase):
+    """
+    Query budgets for every API endpoint. Authentication is forced, so the
+    counts cover only the view's own work. Writes inside transaction.atomic
+    show up with a SAVEPOINT/RELEASE pair here because each test runs in a
+    transaction.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='queryuser',
+            email='query@example.com',
+            password='querypassword'
+        )
+        cls.background = BackgroundImage.objects.create(title='Query Background', image='backgrounds/query.png')
+        cls.route = cls.make_route(points=50)
+
+    @classmethod
+    def make_route(cls, points, build=True):
+        route = Route.objects.create(user=cls.user, background=cls.background, name='Query Route')
+        insert_points(route, [(i / points, i / points) for i in range(points)], batch_size=1000)
+        if build:
+            route_points(route)  # build the packed geometry
+        return route
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.point = self.route.points.first()
+
+    def assertQueries(self, count, method, url, data=None):
+        with self.assertNumQueries(count):
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 300, response.content)
+        return response
+
+    def test_route_list_is_constant(self):
+        """Test that listing routes costs the same however many routes and points exist"""
+        url = reverse('api-route-list')
+        invalidate_route_geometry(self.route.pk)
+        with CaptureQueriesContext(connection) as one_stale:
+            self.client.get(url)
+
+        for size in (10, 500, 2000):
+            self.make_route(points=size, build=False)
+        with CaptureQueriesContext(connection) as many_stale:
+            response = self.client.get(url)
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get(url)
+
+        # validators, count, page, then for stale previews: their points
+        # and one bulk UPDATE
+        self.assertEqual(len(one_stale), len(many_stale))
+        self.assertEqual(len(many_stale), 5)
+        self.assertEqual(len(warm), 3)
+        self.assertFalse([q for q in warm if '"geometry"' in q['sql']])
+        listed = {route['point_count']: route for route in response.json()['results']}
+        self.assertNotIn('points', listed[2000])
+        self.assertEqual(listed[2000]['bounds']['max_x'], 1999 / 2000)
+        self.assertEqual(len(listed[2000]['preview']), 32)
+        self.assertEqual(listed[10]['preview'][-1], [0.9, 0.9])
+
+    def test_route_detail(self):
+        response = self.assertQueries(2, 'get', reverse('api-route-detail', args=[self.route.id]))
+        self.assertEqual(len(response.json()['points']), 50)
+
+    def test_route_points(self):
+        self.assertQueries(2, 'get', reverse('api-route-points', args=[self.route.id]))
+        self.assertQueries(2, 'get', reverse('api-route-points', args=[self.route.id]), {'zoom': 0})
+        self.assertQueries(2, 'get', reverse('api-route-points', args=[self.route.id]), {'page_size': 10})
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('api-route-points', args=[self.route.id]), {'stream': 'ndjson'})
+            b''.join(response.streaming_content)
+
+    def test_route_create_update_delete(self):
+        created = self.assertQueries(2, 'post', reverse('api-route-list'), {
+            'name': 'Budget', 'background': self.background.id
+        }).json()
+        url = reverse('api-route-detail', args=[created['id']])
+        # lookup, UPDATE of the name column only
+        self.assertQueries(2, 'patch', url, {'name': 'Renamed'})
+        self.assertQueries(3, 'delete', url)
+
+    def test_background_list_and_detail(self):
+        # validators, count, page
+        self.assertQueries(3, 'get', reverse('api-background-list'))
+        self.assertQueries(1, 'get', reverse('api-background-detail', args=[self.background.id]))
+
+    def test_not_modified_skips_the_payload(self):
+        """Test that a matching If-None-Match costs only the validator query"""
+        url = reverse('api-route-detail', args=[self.route.id])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_point_create_and_bulk_create(self):
+        url = reverse('api-route-points', args=[self.route.id])
+        # route, reserve order (2 + savepoints), INSERT, geometry version
+        self.assertQueries(7, 'post', url, {'x': 0.5, 'y': 0.5})
+        # the same plus an outer savepoint, with one INSERT for all the rows
+        self.assertQueries(9, 'post', url, [{'x': i / 100, 'y': 0.5} for i in range(100)])
+
+    def test_point_detail_update_move_delete(self):
+        url = reverse('api-route-point-detail', args=[self.route.id, self.point.id])
+        self.assertQueries(1, 'get', url)
+        self.assertQueries(3, 'patch', url, {'x': 0.25})
+        move = reverse('api-route-point-move', args=[self.route.id, self.point.id])
+        # point, neighbours, UPDATE, geometry version (+ savepoints)
+        self.assertQueries(6, 'post', move, {'position': 10})
+        self.assertQueries(3, 'delete', url)
+
+    def test_token(self):
+        Token.objects.create(user=self.user)
+        client = APIClient()
+        with self.assertNumQueries(2):
+            response = client.post(reverse('api-token'), {'username': 'queryuser', 'password': 'querypassword'})
+        self.assertEqual(response.status_code, 200)
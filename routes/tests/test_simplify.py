@@ -0,0 +1,98 @@
+import math
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+from routes.bulk import insert_points
+from routes.models import BackgroundImage, Route
+from routes.simplify import douglas_peucker, simplified_points, visvalingam, zoom_tolerance
+
+
+def zigzag(count, amplitude):
+    """A straight line along x with a small wiggle in y."""
+    return (
+        [i / count for i in range(count)],
+        [0.5 + (amplitude if i % 2 else -amplitude) for i in range(count)],
+    )
+
+
+class SimplifyTests(TestCase):
+    def test_douglas_peucker_keeps_corners(self):
+        """Test that collinear points go and the corner of an L stays"""
+        xs = [0.0, 0.25, 0.5, 0.5, 0.5]
+        ys = [0.0, 0.0, 0.0, 0.25, 0.5]
+
+        self.assertEqual(douglas_peucker(xs, ys, 0.01), [0, 2, 4])
+
+    def test_visvalingam_drops_small_triangles(self):
+        """Test that points spanning tiny areas are removed first"""
+        xs = [0.0, 0.25, 0.5, 0.5, 0.5]
+        ys = [0.0, 0.0001, 0.0, 0.25, 0.5]
+
+        self.assertEqual(visvalingam(xs, ys, 0.01), [0, 2, 4])
+
+    def test_wiggles_below_tolerance_collapse(self):
+        """Test that a zigzag smaller than the tolerance becomes its end points"""
+        xs, ys = zigzag(1000, 0.0001)
+
+        for simplify in (douglas_peucker, visvalingam):
+            self.assertEqual(simplify(xs, ys, 0.01), [0, 999])
+            self.assertEqual(len(simplify(xs, ys, 0.00001)), 1000)
+
+    def test_short_routes_are_untouched(self):
+        """Test that routes with fewer than three points come back whole"""
+        self.assertEqual(douglas_peucker([0.1, 0.2], [0.1, 0.2], 1), [0, 1])
+        self.assertEqual(visvalingam([], [], 1), [])
+
+
+class LevelOfDetailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='loduser',
+            email='lod@example.com',
+            password='lodpassword'
+        )
+        cls.background = BackgroundImage.objects.create(title='LOD Background', image='backgrounds/lod.png')
+
+    def setUp(self):
+        cache.clear()
+        self.route = Route.objects.create(user=self.user, background=self.background)
+        # A circle sampled far more densely than any zoomed-out view needs
+        insert_points(self.route, [
+            (0.5 + 0.4 * math.cos(i / 2000 * math.tau), 0.5 + 0.4 * math.sin(i / 2000 * math.tau))
+            for i in range(2000)
+        ], batch_size=1000)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('api-route-points', args=[self.route.id])
+
+    def test_zoom_reduces_points(self):
+        """Test that a zoomed-out request gets a few dozen points, not thousands"""
+        far = self.client.get(self.url, {'zoom': 0}).json()
+        near = self.client.get(self.url, {'zoom': 8}).json()
+        full = self.client.get(self.url).json()
+
+        self.assertLess(len(far), 100)
+        self.assertLess(len(far), len(near))
+        self.assertEqual(len(full), 2000)
+        self.assertEqual((far[0], far[-1]), (full[0], full[-1]))
+
+    def test_levels_are_cached_until_points_change(self):
+        """Test that a repeated level skips the algorithm and an edit recomputes it"""
+        first = simplified_points(self.route, zoom_tolerance(2))
+        with self.assertNumQueries(1):
+            self.assertEqual(simplified_points(self.route, zoom_tolerance(2)), first)
+
+        insert_points(self.route, [(0.95, 0.95)], batch_size=1000)
+
+        _, xs, ys, _ = simplified_points(self.route, zoom_tolerance(2))
+        self.assertEqual((xs[-1], ys[-1]), (0.95, 0.95))
+
+    def test_invalid_parameters(self):
+        """Test that bad tolerance, zoom or method values are rejected"""
+        for params in ({'tolerance': '-1'}, {'tolerance': 'nan'}, {'zoom': '99'}, {'zoom': 0, 'method': 'x'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
@@ -0,0 +1,184 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from routes.board_index import BoardIndex
+from routes.models import GameBoard, GamePath
+from routes.solutions import validate_paths
+
+
+def serpentine_board(rows, cols, segments):
+    """
+    Dots and a full-coverage solution made by cutting a boustrophedon walk
+    over the grid into ``segments`` paths.
+    """
+    walk = [
+        (row, col)
+        for row in range(rows)
+        for col in (range(cols) if row % 2 == 0 else range(cols - 1, -1, -1))
+    ]
+    length = len(walk) // segments
+    dots, paths = [], {}
+    for i in range(segments):
+        cells = walk[i * length:(i + 1) * length if i < segments - 1 else len(walk)]
+        color = f'#{i:06x}'
+        dots += [{'row': r, 'col': c, 'color': color} for r, c in (cells[0], cells[-1])]
+        paths[color] = [{'row': r, 'col': c} for r, c in cells]
+    return dots, paths
+
+
+def cells(*points):
+    return [{'row': row, 'col': col} for row, col in points]
+
+
+class ValidatePathsTests(TestCase):
+    def setUp(self):
+        # Two colours on a 3x3 board:
+        #   R . G
+        #   . . .
+        #   R . G
+        self.index = BoardIndex.from_dots(3, 3, [
+            {'row': 0, 'col': 0, 'color': 'R'}, {'row': 2, 'col': 0, 'color': 'R'},
+            {'row': 0, 'col': 2, 'color': 'G'}, {'row': 2, 'col': 2, 'color': 'G'},
+        ])
+
+    def test_complete_solution(self):
+        """Test that connecting every colour completes the board"""
+        result = validate_paths(self.index, {
+            'R': cells((0, 0), (1, 0), (2, 0)),
+            'G': cells((2, 2), (1, 2), (0, 2)),
+        })
+
+        self.assertTrue(result.valid)
+        self.assertTrue(result.complete)
+        self.assertEqual(result.covered, 6)
+
+    def test_partial_solution_is_valid_but_incomplete(self):
+        """Test that progress on some colours is accepted without completing"""
+        result = validate_paths(self.index, {'R': cells((0, 0), (1, 0), (2, 0))})
+
+        self.assertTrue(result.valid)
+        self.assertFalse(result.complete)
+
+    def test_coverage_required(self):
+        """Test that boards requiring coverage are incomplete while cells are empty"""
+        paths = {
+            'R': cells((0, 0), (0, 1), (1, 1), (1, 0), (2, 0)),
+            'G': cells((0, 2), (1, 2), (2, 2)),
+        }
+
+        self.assertTrue(validate_paths(self.index, paths).complete)
+        result = validate_paths(self.index, paths, require_coverage=True)
+        self.assertTrue(result.valid)
+        self.assertFalse(result.complete)
+        self.assertEqual(result.covered, 8)
+
+    def test_full_coverage_on_generated_board(self):
+        """Test that a generated 30x30 board covered by its paths is complete"""
+        dots, paths = serpentine_board(30, 30, 12)
+        index = BoardIndex.from_dots(30, 30, dots)
+
+        result = validate_paths(index, paths, require_coverage=True)
+
+        self.assertTrue(result.complete)
+        self.assertEqual(result.covered, 900)
+
+    def test_invalid_paths(self):
+        """Test that broken, crossing and mis-ended paths are rejected"""
+        cases = {
+            'diagonal step': {'R': cells((0, 0), (1, 1), (2, 0))},
+            'wrong end': {'R': cells((0, 0), (0, 1))},
+            'same dot twice': {'R': cells((0, 0), (1, 0), (0, 0))},
+            'through a dot': {'R': cells((0, 0), (0, 1), (0, 2), (1, 2), (1, 1), (1, 0), (2, 0))},
+            'off the board': {'R': cells((0, 0), (-1, 0), (2, 0))},
+            'unknown colour': {'B': cells((0, 0), (1, 0))},
+            'too short': {'R': cells((0, 0))},
+            'not a list': {'R': 'everything'},
+            'crossing': {
+                'R': cells((0, 0), (0, 1), (1, 1), (2, 1), (2, 0)),
+                'G': cells((0, 2), (1, 2), (1, 1), (2, 1), (2, 2)),
+            },
+        }
+        for name, paths in cases.items():
+            with self.subTest(name):
+                result = validate_paths(self.index, paths)
+                self.assertFalse(result.valid)
+                self.assertFalse(result.complete)
+                self.assertTrue(result.errors)
+
+    def test_self_crossing(self):
+        """Test that a path may not revisit its own cells"""
+        index = BoardIndex.from_dots(3, 3, [
+            {'row': 0, 'col': 0, 'color': 'R'}, {'row': 2, 'col': 2, 'color': 'R'},
+        ])
+
+        result = validate_paths(index, {'R': cells((0, 0), (0, 1), (1, 1), (0, 1), (0, 2), (1, 2), (2, 2))})
+
+        self.assertEqual(result.errors, ['R: crosses itself at (0, 1)'])
+
+
+class DrawPathSubmissionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='setter', password='setterpassword')
+        cls.player = User.objects.create_user(username='solver', password='solverpassword')
+        cls.dots, cls.paths = serpentine_board(4, 4, 2)
+        cls.board = GameBoard.objects.create(user=cls.owner, title='Puzzle', rows=4, cols=4, dots=cls.dots)
+
+    def setUp(self):
+        self.client.force_login(self.player)
+
+    def submit(self, paths_data):
+        return self.client.post(
+            reverse('draw_path', args=[self.board.id]),
+            json.dumps({'paths_data': paths_data}),
+            content_type='application/json',
+        )
+
+    def test_completed_flag_is_stored(self):
+        """Test that the server decides and stores whether the board is solved"""
+        first = next(iter(self.paths))
+        partial = self.submit({first: self.paths[first]})
+        self.assertEqual(partial.json(), {'success': True, 'completed': False})
+
+        solved = self.submit(self.paths)
+
+        self.assertEqual(solved.json(), {'success': True, 'completed': True})
+        path = GamePath.objects.get(user=self.player, board=self.board)
+        self.assertTrue(path.completed)
+        self.assertTrue(path.snapshot()['completed'])
+
+    def test_play_page_names_the_player_for_resync(self):
+        """Test that the page tells draw_path whose paths to refetch from the snapshot"""
+        response = self.client.get(reverse('draw_path', args=[self.board.id]))
+
+        self.assertContains(response, 'player: "solver"')
+        snapshot = self.client.get(reverse('board_snapshot', args=[self.board.id]), {'user': 'solver'})
+        self.assertEqual(snapshot.json()['dots'], self.dots)
+
+    def test_invalid_submission_is_rejected(self):
+        """Test that invalid paths are refused and nothing is stored"""
+        first = next(iter(self.paths))
+
+        path = self.paths[first]
+        response = self.submit({first: path[:2] + path[3:]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+        self.assertIn('not next to', response.json()['errors'][0])
+        self.assertFalse(GamePath.objects.filter(user=self.player, board=self.board).exists())
+
+    def test_editing_the_board_revalidates_solutions(self):
+        """Test that moving the dots clears completions that no longer hold"""
+        self.submit(self.paths)
+        self.client.force_login(self.owner)
+
+        self.client.post(
+            reverse('connect_dots_edit', args=[self.board.id]),
+            json.dumps({'dots': self.dots[:-1] + [dict(self.dots[-1], row=0, col=1)]}),
+            content_type='application/json',
+        )
+
+        self.assertFalse(GamePath.objects.get(user=self.player, board=self.board).completed)
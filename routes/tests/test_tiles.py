@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import User
+from PIL import Image
+from rest_framework.test import APIClient
+from routes import tiles
+from routes.models import BackgroundImage
+from routes.tests.test_derivatives import temporary_media, upload
+
+
+class PyramidTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.source = os.path.join(self.root, 'source.png')
+        Image.new('RGB', (600, 300), 'navy').save(self.source)
+
+    def test_pyramid_follows_deep_zoom_layout(self):
+        """Test that every level halves the previous one down to a single pixel"""
+        path = tiles.build_pyramid(self.source, os.path.join(self.root, 'pyramid'), 256, 'jpg')
+
+        info = tiles.pyramid_info(path)
+        self.assertEqual((info['width'], info['height'], info['max_level']), (600, 300, 10))
+        self.assertEqual(sorted(os.listdir(os.path.join(path, '10'))), ['0_0.jpg', '0_1.jpg', '1_0.jpg',
+                                                                         '1_1.jpg', '2_0.jpg', '2_1.jpg'])
+        with Image.open(os.path.join(path, '10', '2_1.jpg')) as corner:
+            self.assertEqual(corner.size, (600 - 512, 300 - 256))
+        with Image.open(os.path.join(path, '9', '1_0.jpg')) as tile:
+            self.assertEqual(tile.size, (300 - 256, 150))
+        with Image.open(os.path.join(path, '0', '0_0.jpg')) as top:
+            self.assertEqual(top.size, (1, 1))
+        self.assertFalse([name for name in os.listdir(self.root) if name.endswith('.tmp')])
+
+    def test_least_recently_used_pyramids_are_evicted(self):
+        """Test that eviction deletes the oldest pyramids first and spares kept ones"""
+        paths = [tiles.build_pyramid(self.source, os.path.join(self.root, f'p{i}'), 256, 'jpg') for i in range(3)]
+        size = tiles.pyramid_info(paths[0])['bytes']
+        now = time.time()
+        for age, path in zip((300, 200, 100), paths):
+            os.utime(os.path.join(path, tiles.DESCRIPTOR), (now - age, now - age))
+
+        evicted = tiles.evict(self.root, max_bytes=size, keep={paths[0]})
+
+        self.assertEqual(evicted, paths[1:])
+        self.assertTrue(os.path.isdir(paths[0]))
+
+    def test_pool_builds_pyramid(self):
+        """Test that the process pool builds a pyramid without the database"""
+        future = tiles._get_pool(1).submit(
+            tiles.build_pyramid, self.source, os.path.join(self.root, 'pooled'), 512, 'png'
+        )
+
+        path = future.result(timeout=60)
+
+        self.assertEqual(tiles.pyramid_info(path)['format'], 'png')
+
+
+class TileViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='tileuser',
+            email='tile@example.com',
+            password='tilepassword'
+        )
+
+    def setUp(self):
+        cache = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache)
+        temporary_media(
+            self,
+            BACKGROUND_DERIVATIVES={'MODE': 'lazy'},
+            BACKGROUND_TILES={'ROOT': cache, 'TILE_SIZE': 256, 'FORMAT': 'jpg', 'MODE': 'inline'},
+        )
+        self.background = BackgroundImage.objects.create(title='Tiled', image=upload(size=(600, 300)))
+        self.key = tiles.pyramid_key(self.background.id, self.background.image.name)
+        self.client.login(username='tileuser', password='tilepassword')
+
+    def test_descriptor_and_tiles_are_cached_forever(self):
+        """Test that the .dzi and its tiles are served with immutable cache headers"""
+        descriptor = self.client.get(reverse('background_tiles', args=[self.background.id, self.key]))
+        tile = self.client.get(reverse('background_tile', args=[self.background.id, self.key, 10, 2, 1, 'jpg']))
+
+        self.assertEqual(descriptor.status_code, 200)
+        self.assertIn(b'TileSize="256"', descriptor.content)
+        self.assertIn(b'<Size Width="600" Height="300"/>', descriptor.content)
+        self.assertEqual(tile.status_code, 200)
+        for response in (descriptor, tile):
+            self.assertIn('immutable', response['Cache-Control'])
+            self.assertIn('max-age=31536000', response['Cache-Control'])
+
+    def test_stale_key_and_missing_tile_are_404(self):
+        """Test that a replaced image's tiles and out-of-range tiles are not found"""
+        stale = self.client.get(reverse('background_tiles', args=[self.background.id, 'stale']))
+        missing = self.client.get(reverse('background_tile', args=[self.background.id, self.key, 10, 9, 9, 'jpg']))
+
+        self.assertEqual(stale.status_code, 404)
+        self.assertEqual(missing.status_code, 404)
+
+    def test_evicted_pyramid_is_rebuilt(self):
+        """Test that a request after eviction builds the pyramid again"""
+        path = tiles.ensure(self.background)
+        shutil.rmtree(path)
+
+        response = self.client.get(reverse('background_tile', args=[self.background.id, self.key, 0, 0, 0, 'jpg']))
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_build_in_progress_is_503(self):
+        """Test that clients are asked to retry while the pool is still building"""
+        with mock.patch.object(tiles, 'ensure', side_effect=TimeoutError):
+            response = self.client.get(reverse('background_tiles', args=[self.background.id, self.key]))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+
+    def test_api_links_descriptor(self):
+        """Test that the background API exposes the .dzi URL"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        data = client.get(reverse('api-background-detail', args=[self.background.id])).json()
+
+        self.assertEqual(data['tiles'], 'http://testserver' + reverse(
+            'background_tiles', args=[self.background.id, self.key]
+        ))
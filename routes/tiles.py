@@ -0,0 +1,251 @@
+"""
+Deep Zoom tile pyramids of background images.
+
+Instead of downloading and decoding a whole map before the first click, a
+viewer can fetch only the tiles it shows, at the level it shows them. The
+layout is Deep Zoom (``.dzi``):
+
+- level ``n`` is the image scaled by ``2 ** (n - max_level)``
+- the top level is full size and level 0 is 1x1
+- each level is cut into ``TILE_SIZE`` squares named
+  ``<level>/<col>_<row>.<ext>``
+
+A pyramid is built once per uploaded image, in a process pool, into
+``BACKGROUND_TILES['ROOT']/<key>/``. The key changes whenever the image
+or the tile settings do, so tile URLs can be cached forever. Pyramids
+form an on-disk LRU: serving a tile marks its pyramid as used, and once
+``MAX_BYTES`` is exceeded the least recently used pyramids are deleted.
+An evicted pyramid is rebuilt on its next request.
+
+Workers only need Pillow and file paths; they never touch the database.
+"""
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DESCRIPTOR = 'pyramid.json'
+# Serving a tile refreshes its pyramid's LRU position at most this often
+TOUCH_INTERVAL = 60
+
+FORMATS = {
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True}),
+    'png': ('PNG', {'optimize': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+
+_pool = None
+_pool_pid = None
+_pending = {}
+_lock = threading.Lock()
+
+
+def tile_settings():
+    config = getattr(settings, 'BACKGROUND_TILES', {})
+    return {
+        'ROOT': os.fspath(config.get('ROOT', os.path.join(settings.BASE_DIR, 'tile_cache'))),
+        'TILE_SIZE': config.get('TILE_SIZE', 256),
+        'FORMAT': config.get('FORMAT', 'jpg'),
+        'MODE': config.get('MODE', 'process'),
+        'WORKERS': config.get('WORKERS', 2),
+        'MAX_BYTES': config.get('MAX_BYTES', 2 * 1024 ** 3),
+        'WAIT': config.get('WAIT', 10),
+    }
+
+
+def pyramid_key(background_id, image_name, config=None):
+    """Directory name for a background's pyramid under its current settings."""
+    config = config or tile_settings()
+    digest = hashlib.sha256(f"{image_name}:{config['TILE_SIZE']}:{config['FORMAT']}".encode()).hexdigest()
+    return f'{background_id}-{digest[:16]}'
+
+
+def tiles_url(background_id, image_name, request=None):
+    """URL of the ``.dzi`` descriptor, or None for a background without an image."""
+    if not image_name:
+        return None
+    url = reverse('background_tiles', args=[background_id, pyramid_key(background_id, image_name)])
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def max_level(width, height):
+    return math.ceil(math.log2(max(width, height, 1)))
+
+
+def build_pyramid(source_path, target, tile_size, ext):
+    """
+    Cut ``source_path`` into a Deep Zoom pyramid at ``target``. Runs in a
+    pool worker. The pyramid is written beside ``target`` and renamed
+    into place, so a half-built one is never served.
+    """
+    pillow_format, options = FORMATS[ext]
+    staging = f'{target}.{uuid.uuid4().hex}.tmp'
+    os.makedirs(staging)
+    try:
+        with Image.open(source_path) as original:
+            image = ImageOps.exif_transpose(original)
+            image = image.convert('RGB' if pillow_format == 'JPEG' else 'RGBA')
+        width, height = image.size
+        top = max_level(width, height)
+        size = 0
+        for level in range(top, -1, -1):
+            level_dir = os.path.join(staging, str(level))
+            os.mkdir(level_dir)
+            for col in range(math.ceil(image.width / tile_size)):
+                for row in range(math.ceil(image.height / tile_size)):
+                    left, upper = col * tile_size, row * tile_size
+                    tile = image.crop((
+                        left, upper, min(left + tile_size, image.width), min(upper + tile_size, image.height)
+                    ))
+                    path = os.path.join(level_dir, f'{col}_{row}.{ext}')
+                    tile.save(path, pillow_format, **options)
+                    size += os.path.getsize(path)
+            if level:
+                # Box-filter halving; sizes round up as Deep Zoom expects
+                image = image.reduce(2)
+        with open(os.path.join(staging, DESCRIPTOR), 'w') as descriptor:
+            json.dump({
+                'width': width, 'height': height, 'tile_size': tile_size,
+                'format': ext, 'max_level': top, 'bytes': size,
+            }, descriptor)
+        try:
+            os.rename(staging, target)
+        except OSError:
+            # Another worker finished the same pyramid first
+            pass
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return target
+
+
+def pyramid_info(path):
+    """The descriptor of a finished pyramid, or None."""
+    try:
+        with open(os.path.join(path, DESCRIPTOR)) as descriptor:
+            return json.load(descriptor)
+    except (OSError, ValueError):
+        return None
+
+
+def touch(path):
+    """Record a use of the pyramid at ``path`` for LRU eviction."""
+    descriptor = os.path.join(path, DESCRIPTOR)
+    try:
+        if time.time() - os.stat(descriptor).st_mtime > TOUCH_INTERVAL:
+            os.utime(descriptor)
+    except OSError:
+        pass
+
+
+def evict(root, max_bytes, keep=()):
+    """Delete least recently used pyramids until they fit in ``max_bytes``."""
+    pyramids = []
+    try:
+        names = os.listdir(root)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        path = os.path.join(root, name)
+        info = pyramid_info(path)
+        if info is None:
+            continue
+        pyramids.append((os.stat(os.path.join(path, DESCRIPTOR)).st_mtime, info['bytes'], path))
+    total = sum(size for _, size, _ in pyramids)
+    evicted = []
+    for _, size, path in sorted(pyramids):
+        if total <= max_bytes:
+            break
+        if path in keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        evicted.append(path)
+    return evicted
+
+
+def _get_pool(workers):
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        # Forking a server process full of threads is unsafe; spawn clean workers
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def _finished(path, config):
+    def callback(future):
+        with _lock:
+            if _pending.get(path) is future:
+                del _pending[path]
+        error = future.exception()
+        if error is not None:
+            logger.error("Tile pyramid failed for %s", path, exc_info=error)
+        else:
+            evict(config['ROOT'], config['MAX_BYTES'], keep={path})
+    return callback
+
+
+def submit(background):
+    """
+    Start building ``background``'s pyramid in the process pool, or return
+    the future already building it.
+    """
+    config = tile_settings()
+    path = os.path.join(config['ROOT'], pyramid_key(background.pk, background.image.name, config))
+    with _lock:
+        future = _pending.get(path)
+        if future is None:
+            os.makedirs(config['ROOT'], exist_ok=True)
+            future = _get_pool(config['WORKERS']).submit(
+                build_pyramid, background.image.path, path, config['TILE_SIZE'], config['FORMAT']
+            )
+            _pending[path] = future
+            future.add_done_callback(_finished(path, config))
+    return future
+
+
+def schedule(background):
+    """Build the pyramid for a freshly uploaded image, per ``MODE``."""
+    mode = tile_settings()['MODE']
+    if mode == 'lazy' or not background.image:
+        return
+    if mode == 'inline':
+        ensure(background)
+    else:
+        transaction.on_commit(lambda: ensure(background, wait=False))
+
+
+def ensure(background, wait=True):
+    """
+    Path of ``background``'s finished pyramid, building it if need be.
+    With ``wait``, blocks up to ``WAIT`` seconds and raises TimeoutError
+    if the pool is still busy; without it, returns None unless ready.
+    """
+    config = tile_settings()
+    path = os.path.join(config['ROOT'], pyramid_key(background.pk, background.image.name, config))
+    if pyramid_info(path) is not None:
+        return path
+    if config['MODE'] == 'inline':
+        os.makedirs(config['ROOT'], exist_ok=True)
+        build_pyramid(background.image.path, path, config['TILE_SIZE'], config['FORMAT'])
+        evict(config['ROOT'], config['MAX_BYTES'], keep={path})
+        return path
+    future = submit(background)
+    if not wait:
+        return None
+    future.result(timeout=config['WAIT'])
+    return path
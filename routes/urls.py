@@ -17,6 +17,12 @@ urlpatterns = [
     # Existing routes
     path('routes/', views.user_routes, name='user_routes'),
     path('routes/choose_background/', views.choose_background, name='choose_background'),
+    path('backgrounds/<int:background_id>/<str:size>.<str:ext>', views.background_derivative,
+         name='background_derivative'),
+    path('backgrounds/<int:background_id>/tiles/<slug:key>.dzi', views.background_tiles,
+         name='background_tiles'),
+    path('backgrounds/<int:background_id>/tiles/<slug:key>_files/<int:level>/<int:col>_<int:row>.<slug:ext>',
+         views.background_tile, name='background_tile'),
     path('routes/create/<int:bg_id>/', views.create_route, name='create_route'),
     path('routes/edit/<int:route_id>/', views.edit_route, name='edit_route'),
     path('routes/points/<int:point_id>/delete/', views.delete_route_point, name='delete_route_point'),
@@ -30,14 +36,13 @@ urlpatterns = [
     # Connect Dots - Draw Paths
     path('play/', views.board_list, name='board_list_play'),
     path('play/<int:board_id>/', views.draw_path, name='draw_path'),
+    path('play/<int:board_id>/snapshot/', views.board_snapshot, name='board_snapshot'),
 ]
 
 # Add API URLs
 urlpatterns += [
-    # API root
-    path('api/', include(router.urls)),
-
-    # Route points nested under routes
+    # Route points nested under routes. Listed before the router so POSTs
+    # reach RoutePointViewSet rather than the read-only RouteViewSet.points
     path('api/routes/<int:route_pk>/points/',
          api_views.RoutePointViewSet.as_view({'get': 'list', 'post': 'create'}),
          name='api-route-points'),
@@ -49,6 +54,12 @@ urlpatterns += [
              'delete': 'destroy'
          }),
          name='api-route-point-detail'),
+    path('api/routes/<int:route_pk>/points/<int:pk>/move/',
+         api_views.RoutePointViewSet.as_view({'post': 'move'}),
+         name='api-route-point-move'),
+
+    # API root
+    path('api/', include(router.urls)),
 
     # API token authentication
     path('api/token/', obtain_auth_token, name='api-token'),
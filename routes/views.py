@@ -1,7 +1,16 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404
+from django.utils.cache import patch_cache_control
+from PIL import UnidentifiedImageError
+from . import derivatives, tiles
 from .models import BackgroundImage, Route, RoutePoint
 from .forms import RoutePointForm
+from .conditional import board_validators, conditional_response, set_validators
+from .geometry import route_points
+from .ordering import append_point, delete_point
+from .solutions import revalidate_board, validate_board_paths
 from django.http import HttpResponse, JsonResponse
 import json
 from .models import GameBoard, GamePath
@@ -21,6 +30,82 @@ def choose_background(request):
     backgrounds = BackgroundImage.objects.all()
     return render(request, "routes/choose_background.html", {"backgrounds": backgrounds})
 
+@login_required
+def background_derivative(request, background_id, size, ext):
+    """
+    Render a background's derivatives on first request, then redirect to
+    the stored file. Once rendered, API and template URLs point at the
+    file directly.
+    """
+    if size not in derivatives.SIZE_NAMES or ext not in derivatives.FORMAT_NAMES:
+        raise Http404("Unknown derivative")
+    background = get_object_or_404(BackgroundImage, id=background_id)
+    try:
+        digest = derivatives.ensure(background)
+    except (OSError, UnidentifiedImageError):
+        raise Http404("Background image unavailable")
+    return redirect(default_storage.url(derivatives.derivative_name(digest, size, ext)))
+
+def _tile_pyramid(background_id, key):
+    """Path of the finished pyramid named ``key``, building it if need be."""
+    background = get_object_or_404(BackgroundImage, id=background_id)
+    if not background.image or key != tiles.pyramid_key(background.id, background.image.name):
+        # An old key: the image or tile settings have changed since
+        raise Http404("Unknown tile pyramid")
+    try:
+        return tiles.ensure(background)
+    except TimeoutError:
+        # Still building; an OSError subclass, so let it through
+        raise
+    except (OSError, UnidentifiedImageError):
+        raise Http404("Background image unavailable")
+
+
+def _tiles_pending():
+    response = HttpResponse("Tiles are still being generated.", status=503)
+    response['Retry-After'] = '2'
+    return response
+
+
+def _cache_forever(response):
+    # Keys change with the image, so a tile URL never changes content
+    patch_cache_control(response, private=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    return response
+
+
+@login_required
+def background_tiles(request, background_id, key):
+    """The Deep Zoom (``.dzi``) descriptor of a background's tile pyramid."""
+    try:
+        path = _tile_pyramid(background_id, key)
+    except TimeoutError:
+        return _tiles_pending()
+    info = tiles.pyramid_info(path)
+    tiles.touch(path)
+    descriptor = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" '
+        f'Format="{info["format"]}" Overlap="0" TileSize="{info["tile_size"]}">'
+        f'<Size Width="{info["width"]}" Height="{info["height"]}"/></Image>'
+    )
+    return _cache_forever(HttpResponse(descriptor, content_type='application/xml'))
+
+
+@login_required
+def background_tile(request, background_id, key, level, col, row, ext):
+    """One tile, at ``<key>_files/<level>/<col>_<row>.<ext>`` as Deep Zoom expects."""
+    try:
+        path = _tile_pyramid(background_id, key)
+    except TimeoutError:
+        return _tiles_pending()
+    try:
+        tile = open(f'{path}/{level}/{col}_{row}.{ext}', 'rb')
+    except FileNotFoundError:
+        raise Http404("No such tile")
+    tiles.touch(path)
+    return _cache_forever(FileResponse(tile))
+
+
 @login_required
 def create_route(request, bg_id):
     background = get_object_or_404(BackgroundImage, id=bg_id)
@@ -29,27 +114,26 @@ def create_route(request, bg_id):
 
 @login_required
 def edit_route(request, route_id):
-    route = get_object_or_404(Route, id=route_id, user=request.user)
+    route = get_object_or_404(Route.objects.defer('geometry'), id=route_id, user=request.user)
     form = RoutePointForm(request.POST or None)
     if request.method == "POST":
         if "name" in request.POST:
             route.name = request.POST.get("name", "").strip()
-            route.save()
+            route.save(update_fields=["name"])
         elif form.is_valid():
-            point = form.save(commit=False)
-            point.route = route
-            point.order = route.points.count()
-            point.save()
+            append_point(form.save(commit=False), route)
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return HttpResponse(status=201)
         return redirect("edit_route", route_id=route.id)
-    return render(request, "routes/edit_route.html", {"route": route, "form": form})
+    return render(request, "routes/edit_route.html", {
+        "route": route, "points": route_points(route), "form": form
+    })
 
 @login_required
 def delete_route_point(request, point_id):
     point = get_object_or_404(RoutePoint, id=point_id, route__user=request.user)
-    route_id = point.route.id
-    point.delete()
+    route_id = point.route_id
+    delete_point(point)
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return HttpResponse(status=200)
     return redirect("edit_route", route_id=route_id)
@@ -57,6 +141,7 @@ def delete_route_point(request, point_id):
 @login_required
 def clear_route_points(request, route_id):
     route = get_object_or_404(Route, id=route_id, user=request.user)
+    # The post_delete receiver marks the geometry stale, once for the route
     route.points.all().delete()
     return redirect("edit_route", route_id=route_id)
 
@@ -89,7 +174,8 @@ def connect_dots_create(request):
                 title=data.get('title', 'Untitled Board'),
                 rows=data.get('rows', 5),
                 cols=data.get('cols', 5),
-                dots=data.get('dots', [])
+                dots=data.get('dots', []),
+                require_coverage=bool(data.get('require_coverage', False))
             )
             board.save()
             print(f"Created board with ID: {board.id}")
@@ -104,6 +190,10 @@ def connect_dots_edit(request, board_id):
     board = get_object_or_404(GameBoard, id=board_id, user=request.user)
     
     if request.method == 'POST':
+        # If-Match with a snapshot ETag refuses to overwrite someone else's edit
+        stale = conditional_response(request, board_validators(board.id))
+        if stale is not None:
+            return stale
         try:
             data = json.loads(request.body)
             print("Updating board with data:", data)  # Debug print
@@ -112,7 +202,10 @@ def connect_dots_edit(request, board_id):
             board.rows = data.get('rows', board.rows)
             board.cols = data.get('cols', board.cols)
             board.dots = data.get('dots', board.dots)
+            board.require_coverage = bool(data.get('require_coverage', board.require_coverage))
             board.save()
+            # Solutions of the old layout may no longer hold
+            revalidate_board(board)
             # Notification is now handled by post_save signal
             return JsonResponse({'success': True})
         except Exception as e:
@@ -151,20 +244,27 @@ def draw_path(request, board_id):
         try:
             data = json.loads(request.body)
             paths_data = data.get('paths_data', {})
+
+            # Completion is decided here, not by the browser
+            result = validate_board_paths(board, paths_data)
+            if not result.valid:
+                return JsonResponse({'success': False, 'errors': result.errors}, status=400)
             
             if user_path:
                 # Update existing paths
                 user_path.paths_data = paths_data
+                user_path.completed = result.complete
                 user_path.save()
             else:
                 # Create new paths
                 user_path = GamePath.objects.create(
                     user=request.user,
                     board=board,
-                    paths_data=paths_data
+                    paths_data=paths_data,
+                    completed=result.complete
                 )
             
-            return JsonResponse({'success': True})
+            return JsonResponse({'success': True, 'completed': result.complete})
         except Exception as e:
             print(f"Error saving paths: {str(e)}")
             return JsonResponse({'success': False, 'error': str(e)}, status=400)
@@ -175,4 +275,25 @@ def draw_path(request, board_id):
         'paths': user_path.paths_data if user_path else {}
     }
     
-    return render(request, 'connect_dots/draw_path.html', context)
\ No newline at end of file
+    return render(request, 'connect_dots/draw_path.html', context)
+
+@login_required
+def board_snapshot(request, board_id):
+    """
+    Full current state of a board and its paths, for clients whose
+    notification deltas no longer line up with what they hold.
+    Pass ?user=<username> to limit the paths to one player.
+
+    Carries an ETag and Last-Modified; pollers get 304 while nothing changed.
+    """
+    validators = board_validators(board_id, request.GET.get('user'))
+    not_modified = conditional_response(request, validators)
+    if not_modified is not None:
+        return not_modified
+    board = get_object_or_404(GameBoard.objects.select_related('user'), id=board_id)
+    paths = board.paths.select_related('user')
+    if request.GET.get('user'):
+        paths = paths.filter(user__username=request.GET['user'])
+    snapshot = board.snapshot()
+    snapshot['paths'] = {path.user.username: path.snapshot() for path in paths}
+    return set_validators(JsonResponse(snapshot), validators)
@@ -15,6 +15,8 @@ class ConnectDotsEditor {
         ];
         this.selectedColor = null;
         this.pendingDot = null;
+        // Dots changed since the last save; a resync keeps them
+        this.unsaved = false;
         // Initialize the state
         this.boardState = initialBoard || {
             title: 'New Board',
@@ -66,6 +68,8 @@ class ConnectDotsEditor {
         this.saveButton.addEventListener('click', this.handleSaveBoard.bind(this));
         // Clear dots button
         this.clearButton.addEventListener('click', this.handleClearDots.bind(this));
+        // Sent by sse_events when we missed updates and must refetch the board
+        document.addEventListener('sse:resync', this.handleResync.bind(this));
     }
     initializeUI() {
         // Create color picker
@@ -136,6 +140,7 @@ class ConnectDotsEditor {
         // Update board state
         this.boardState.rows = rows;
         this.boardState.cols = cols;
+        this.unsaved = true;
         // Generate the grid
         this.generateGrid();
     }
@@ -221,6 +226,7 @@ class ConnectDotsEditor {
             // Set as pending dot
             this.pendingDot = newDot;
         }
+        this.unsaved = true;
         // Update the UI
         this.renderDots();
         this.updateColorStatus();
@@ -229,10 +235,42 @@ class ConnectDotsEditor {
         if (confirm('Are you sure you want to clear all dots?')) {
             this.boardState.dots = [];
             this.pendingDot = null;
+            this.unsaved = true;
             this.renderDots();
             this.updateColorStatus();
         }
     }
+    handleResync() {
+        // A new board has nothing to refetch, and unsaved edits win
+        if (!this.boardState.id || this.unsaved)
+            return;
+        fetch(`/play/${this.boardState.id}/snapshot/`, {
+            headers: {
+                'X-Requested-With': 'XMLHttpRequest'
+            }
+        })
+            .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP error! Status: ${response.status}`);
+            }
+            return response.json();
+        })
+            .then(snapshot => {
+            this.boardState.title = snapshot.title;
+            this.boardState.rows = snapshot.rows;
+            this.boardState.cols = snapshot.cols;
+            this.boardState.dots = snapshot.dots;
+            this.titleInput.value = snapshot.title;
+            this.rowsInput.value = String(snapshot.rows);
+            this.colsInput.value = String(snapshot.cols);
+            this.pendingDot = null;
+            this.generateGrid();
+            this.updateColorStatus();
+        })
+            .catch(error => {
+            console.error('Resync failed:', error);
+        });
+    }
     handleSaveBoard() {
         // Get the title from the input
         this.boardState.title = this.titleInput.value.trim();
@@ -279,6 +317,7 @@ class ConnectDotsEditor {
                 }
                 else {
                     // If updating an existing board, show success message
+                    this.unsaved = false;
                     alert('Board saved successfully!');
                 }
             }
@@ -1,4 +1,69 @@
 "use strict";
+// Constant-time lookup of the dot at a cell
+class DotIndex {
+    constructor(rows, cols) {
+        this.rows = rows;
+        this.cols = cols;
+        this.palette = [];
+        this.codes = new Map();
+        this.cells = new Uint16Array(rows * cols);
+    }
+    static fromBoard(board) {
+        const index = new DotIndex(board.rows, board.cols);
+        if (!index.decode(board.cells)) {
+            // Boards saved before the encoding existed; index the list
+            index.reset();
+            board.dots.forEach(dot => index.add(dot));
+        }
+        return index;
+    }
+    reset() {
+        this.palette.length = 0;
+        this.cells.fill(0);
+        this.codes.clear();
+    }
+    decode(encoded) {
+        if (!encoded || encoded.v !== 1 || !encoded.palette || !encoded.runs)
+            return false;
+        const runs = encoded.runs;
+        let position = 0;
+        for (let i = 0; i + 1 < runs.length; i += 2) {
+            const count = runs[i];
+            const value = runs[i + 1];
+            if (count < 0 || value < 0 || value > encoded.palette.length || position + count > this.cells.length) {
+                return false;
+            }
+            for (let cell = position; value && cell < position + count; cell++) {
+                this.set(Math.floor(cell / this.cols), cell % this.cols, encoded.palette[value - 1]);
+            }
+            position += count;
+        }
+        return position === this.cells.length;
+    }
+    add(dot) {
+        if (dot.row < 0 || dot.row >= this.rows || dot.col < 0 || dot.col >= this.cols || !dot.color)
+            return;
+        // The first dot in a cell wins, as dots.find() did
+        if (this.cells[dot.row * this.cols + dot.col])
+            return;
+        this.set(dot.row, dot.col, dot.color);
+    }
+    set(row, col, color) {
+        let code = this.codes.get(color);
+        if (code === undefined) {
+            this.palette.push(color);
+            code = this.palette.length;
+            this.codes.set(color, code);
+        }
+        this.cells[row * this.cols + col] = code;
+    }
+    dotAt(row, col) {
+        if (row < 0 || row >= this.rows || col < 0 || col >= this.cols)
+            return null;
+        const value = this.cells[row * this.cols + col];
+        return value ? { row, col, color: this.palette[value - 1] } : null;
+    }
+}
 class PathDrawer {
     constructor(boardData, initialPaths = {}) {
         this.pathsData = {};
@@ -11,8 +76,11 @@ class PathDrawer {
         this.lastCell = null;
         // Track cells that already have paths
         this.occupiedCells = new Set();
+        // Paths changed since the last save; a resync keeps them
+        this.unsaved = false;
         // Store board data and paths
         this.boardData = boardData;
+        this.dotIndex = DotIndex.fromBoard(boardData);
         this.pathsData = initialPaths || {};
         // Get DOM elements
         const gridContainer = document.getElementById('grid-container');
@@ -82,6 +150,8 @@ class PathDrawer {
         this.saveButton.addEventListener('click', this.handleSavePaths.bind(this));
         // Clear button
         this.clearButton.addEventListener('click', this.handleClearPaths.bind(this));
+        // Sent by sse_events when we missed updates and must refetch the board
+        document.addEventListener('sse:resync', this.handleResync.bind(this));
     }
     handleDotClick(event) {
         let target = event.target;
@@ -97,7 +167,7 @@ class PathDrawer {
         if (row === -1 || col === -1)
             return;
         // Find the dot that was clicked
-        const clickedDot = this.boardData.dots.find(dot => dot.row === row && dot.col === col);
+        const clickedDot = this.dotIndex.dotAt(row, col);
         if (!clickedDot)
             return;
         // Check if we're already drawing
@@ -141,11 +211,10 @@ class PathDrawer {
         if (row === -1 || col === -1)
             return;
         // Check if this is a dot cell
-        const isDotCell = this.boardData.dots.some(dot => dot.row === row && dot.col === col);
+        const targetDot = this.dotIndex.dotAt(row, col);
         // If it's a dot, only allow if it's the second dot of the same color
-        if (isDotCell) {
-            const targetDot = this.boardData.dots.find(dot => dot.row === row && dot.col === col);
-            if (targetDot && targetDot.color === this.currentColor && !this.isSameDot(targetDot, this.startDot)) {
+        if (targetDot) {
+            if (targetDot.color === this.currentColor && !this.isSameDot(targetDot, this.startDot)) {
                 // Valid end dot found!
                 this.endDot = targetDot;
                 // Add this point to the path
@@ -196,6 +265,7 @@ class PathDrawer {
         console.log(`Completing path for color ${this.currentColor}`);
         // Store the completed path
         this.pathsData[this.currentColor] = [...this.currentPath];
+        this.unsaved = true;
         // Update occupied cells
         this.updateOccupiedCells();
         // Clear the current path state
@@ -372,9 +442,9 @@ class PathDrawer {
     }
     checkAllConnected() {
         // Get all unique colors of dots
-        const dotColors = new Set(this.boardData.dots.map(dot => dot.color));
+        const dotColors = this.dotIndex.palette;
         // Check if all colors have paths
-        const allConnected = Array.from(dotColors).every((color) => this.pathsData[color] && this.pathsData[color].length >= 2);
+        const allConnected = dotColors.every((color) => this.pathsData[color] && this.pathsData[color].length >= 2);
         if (allConnected) {
             this.statusElement.innerHTML = `
                 <div class="alert alert-success mt-3">
@@ -404,7 +474,8 @@ class PathDrawer {
             })
         })
             .then(response => {
-            if (!response.ok) {
+            // 400 carries the server's reasons for rejecting the paths
+            if (!response.ok && response.status !== 400) {
                 return response.text().then(text => {
                     console.error('Error response:', text);
                     throw new Error(`HTTP error! Status: ${response.status}`);
@@ -414,10 +485,11 @@ class PathDrawer {
         })
             .then(data => {
             if (data.success) {
-                alert('Paths saved successfully!');
+                this.unsaved = false;
+                alert(data.completed ? 'Paths saved. Board solved!' : 'Paths saved successfully!');
             }
             else {
-                alert(`Error: ${data.error || 'Unknown error'}`);
+                alert(`Error: ${data.errors ? data.errors.join('\n') : data.error || 'Unknown error'}`);
             }
         })
             .catch(error => {
@@ -425,10 +497,49 @@ class PathDrawer {
             alert('An error occurred while saving the paths. Check console for details.');
         });
     }
+    handleResync() {
+        // Leave a path being drawn alone; the next resync catches up
+        if (this.isDrawing)
+            return;
+        const player = this.boardData.player;
+        const query = player ? `?user=${encodeURIComponent(player)}` : '';
+        fetch(`/play/${this.boardData.id}/snapshot/${query}`, {
+            headers: {
+                'X-Requested-With': 'XMLHttpRequest'
+            }
+        })
+            .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP error! Status: ${response.status}`);
+            }
+            return response.json();
+        })
+            .then(snapshot => {
+            Object.assign(this.boardData, {
+                title: snapshot.title,
+                rows: snapshot.rows,
+                cols: snapshot.cols,
+                dots: snapshot.dots,
+                cells: snapshot.cells
+            });
+            this.dotIndex = DotIndex.fromBoard(this.boardData);
+            if (!this.unsaved && player) {
+                const saved = snapshot.paths[player];
+                this.pathsData = saved ? saved.paths_data : {};
+            }
+            this.initializeBoard();
+            this.updateOccupiedCells();
+            this.checkAllConnected();
+        })
+            .catch(error => {
+            console.error('Resync failed:', error);
+        });
+    }
     handleClearPaths() {
         if (confirm('Are you sure you want to clear all paths?')) {
             // Reset path data
             this.pathsData = {};
+            this.unsaved = true;
             // Reset state variables
             this.isDrawing = false;
             this.currentColor = null;
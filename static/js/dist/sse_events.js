@@ -98,6 +98,11 @@ class SSEClient {
                     showToast('Paths updated');
                 }
             });
+            // Sent instead of a replay when we were away too long to catch up.
+            // draw_path and connect_dots refetch their board from /play/<id>/snapshot/.
+            this.eventSource.addEventListener('resync', (event) => {
+                document.dispatchEvent(new CustomEvent('sse:resync'));
+            });
             this.eventSource.addEventListener('heartbeat', (event) => {
             });
             this.eventSource.onmessage = (event) => {
@@ -122,7 +127,9 @@ document.addEventListener('DOMContentLoaded', () => {
     // Only connect if user is authenticated
     // @ts-ignore
     if (window.USER_IS_AUTHENTICATED) {
-        new SSEClient('/events/');
+        // @ts-ignore
+        const query = window.SSE_QUERY || '';
+        new SSEClient(query ? `/events/?${query}` : '/events/');
     }
 });
 //# sourceMappingURL=sse_events.js.map
\ No newline at end of file
@@ -29,6 +29,8 @@ class ConnectDotsEditor {
     private boardState: BoardState;
     private selectedColor: string | null = null;
     private pendingDot: Dot | null = null;
+    // Dots changed since the last save; a resync keeps them
+    private unsaved: boolean = false;
     
     private boardForm: HTMLFormElement;
     private titleInput: HTMLInputElement;
@@ -103,6 +105,9 @@ class ConnectDotsEditor {
         
         // Clear dots button
         this.clearButton.addEventListener('click', this.handleClearDots.bind(this));
+
+        // Sent by sse_events when we missed updates and must refetch the board
+        document.addEventListener('sse:resync', this.handleResync.bind(this));
     }
     
     private initializeUI(): void {
@@ -189,6 +194,7 @@ class ConnectDotsEditor {
         // Update board state
         this.boardState.rows = rows;
         this.boardState.cols = cols;
+        this.unsaved = true;
         
         // Generate the grid
         this.generateGrid();
@@ -294,6 +300,8 @@ class ConnectDotsEditor {
             this.pendingDot = newDot;
         }
         
+        this.unsaved = true;
+        
         // Update the UI
         this.renderDots();
         this.updateColorStatus();
@@ -303,11 +311,43 @@ class ConnectDotsEditor {
         if (confirm('Are you sure you want to clear all dots?')) {
             this.boardState.dots = [];
             this.pendingDot = null;
+            this.unsaved = true;
             this.renderDots();
             this.updateColorStatus();
         }
     }
     
+    private handleResync(): void {
+        // A new board has nothing to refetch, and unsaved edits win
+        if (!this.boardState.id || this.unsaved) return;
+        fetch(`/play/${this.boardState.id}/snapshot/`, {
+            headers: {
+                'X-Requested-With': 'XMLHttpRequest'
+            }
+        })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP error! Status: ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(snapshot => {
+            this.boardState.title = snapshot.title;
+            this.boardState.rows = snapshot.rows;
+            this.boardState.cols = snapshot.cols;
+            this.boardState.dots = snapshot.dots;
+            this.titleInput.value = snapshot.title;
+            this.rowsInput.value = String(snapshot.rows);
+            this.colsInput.value = String(snapshot.cols);
+            this.pendingDot = null;
+            this.generateGrid();
+            this.updateColorStatus();
+        })
+        .catch(error => {
+            console.error('Resync failed:', error);
+        });
+    }
+    
     private handleSaveBoard(): void {
         // Get the title from the input
         this.boardState.title = this.titleInput.value.trim();
@@ -359,6 +399,7 @@ class ConnectDotsEditor {
                     window.location.href = `/connect_dots/edit/${data.id}/`;
                 } else {
                     // If updating an existing board, show success message
+                    this.unsaved = false;
                     alert('Board saved successfully!');
                 }
             } else {
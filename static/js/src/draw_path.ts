@@ -9,12 +9,91 @@ interface PathPoint {
     col: number;
 }
 
+// Run-length coded grid of palette indexes, see routes/board_index.py
+interface BoardCells {
+    v?: number;
+    palette?: string[];
+    runs?: number[];
+}
+
 interface BoardData {
     id: number;
     title: string;
     rows: number;
     cols: number;
     dots: Dot[];
+    cells?: BoardCells;
+    // Username of the player, to fetch their paths on resync
+    player?: string;
+}
+
+// Constant-time lookup of the dot at a cell
+class DotIndex {
+    readonly palette: string[] = [];
+    // Palette index + 1 per cell, row-major; 0 is empty
+    private cells: Uint16Array;
+    private codes: Map<string, number> = new Map();
+
+    constructor(private rows: number, private cols: number) {
+        this.cells = new Uint16Array(rows * cols);
+    }
+
+    static fromBoard(board: BoardData): DotIndex {
+        const index = new DotIndex(board.rows, board.cols);
+        if (!index.decode(board.cells)) {
+            // Boards saved before the encoding existed; index the list
+            index.reset();
+            board.dots.forEach(dot => index.add(dot));
+        }
+        return index;
+    }
+
+    private reset(): void {
+        this.palette.length = 0;
+        this.cells.fill(0);
+        this.codes.clear();
+    }
+
+    private decode(encoded?: BoardCells): boolean {
+        if (!encoded || encoded.v !== 1 || !encoded.palette || !encoded.runs) return false;
+        const runs = encoded.runs;
+        let position = 0;
+        for (let i = 0; i + 1 < runs.length; i += 2) {
+            const count = runs[i];
+            const value = runs[i + 1];
+            if (count < 0 || value < 0 || value > encoded.palette.length || position + count > this.cells.length) {
+                return false;
+            }
+            for (let cell = position; value && cell < position + count; cell++) {
+                this.set(Math.floor(cell / this.cols), cell % this.cols, encoded.palette[value - 1]);
+            }
+            position += count;
+        }
+        return position === this.cells.length;
+    }
+
+    private add(dot: Dot): void {
+        if (dot.row < 0 || dot.row >= this.rows || dot.col < 0 || dot.col >= this.cols || !dot.color) return;
+        // The first dot in a cell wins, as dots.find() did
+        if (this.cells[dot.row * this.cols + dot.col]) return;
+        this.set(dot.row, dot.col, dot.color);
+    }
+
+    private set(row: number, col: number, color: string): void {
+        let code = this.codes.get(color);
+        if (code === undefined) {
+            this.palette.push(color);
+            code = this.palette.length;
+            this.codes.set(color, code);
+        }
+        this.cells[row * this.cols + col] = code;
+    }
+
+    dotAt(row: number, col: number): Dot | null {
+        if (row < 0 || row >= this.rows || col < 0 || col >= this.cols) return null;
+        const value = this.cells[row * this.cols + col];
+        return value ? {row, col, color: this.palette[value - 1]} : null;
+    }
 }
 
 interface PathsData {
@@ -23,6 +102,7 @@ interface PathsData {
 
 class PathDrawer {
     private boardData: BoardData;
+    private dotIndex: DotIndex;
     private pathsData: PathsData = {};
     
     private gridContainer: HTMLDivElement;
@@ -42,10 +122,14 @@ class PathDrawer {
     
     // Track cells that already have paths
     private occupiedCells: Set<string> = new Set();
+
+    // Paths changed since the last save; a resync keeps them
+    private unsaved: boolean = false;
     
     constructor(boardData: BoardData, initialPaths: PathsData = {}) {
         // Store board data and paths
         this.boardData = boardData;
+        this.dotIndex = DotIndex.fromBoard(boardData);
         this.pathsData = initialPaths || {};
         
         // Get DOM elements
@@ -135,6 +219,9 @@ class PathDrawer {
         
         // Clear button
         this.clearButton.addEventListener('click', this.handleClearPaths.bind(this));
+
+        // Sent by sse_events when we missed updates and must refetch the board
+        document.addEventListener('sse:resync', this.handleResync.bind(this));
     }
     
     private handleDotClick(event: MouseEvent): void {
@@ -154,7 +241,7 @@ class PathDrawer {
         if (row === -1 || col === -1) return;
         
         // Find the dot that was clicked
-        const clickedDot = this.boardData.dots.find(dot => dot.row === row && dot.col === col);
+        const clickedDot = this.dotIndex.dotAt(row, col);
         if (!clickedDot) return;
         
         // Check if we're already drawing
@@ -205,12 +292,11 @@ class PathDrawer {
         if (row === -1 || col === -1) return;
         
         // Check if this is a dot cell
-        const isDotCell = this.boardData.dots.some(dot => dot.row === row && dot.col === col);
+        const targetDot = this.dotIndex.dotAt(row, col);
         
         // If it's a dot, only allow if it's the second dot of the same color
-        if (isDotCell) {
-            const targetDot = this.boardData.dots.find(dot => dot.row === row && dot.col === col);
-            if (targetDot && targetDot.color === this.currentColor && !this.isSameDot(targetDot, this.startDot!)) {
+        if (targetDot) {
+            if (targetDot.color === this.currentColor && !this.isSameDot(targetDot, this.startDot!)) {
                 // Valid end dot found!
                 this.endDot = targetDot;
                 
@@ -275,6 +361,7 @@ class PathDrawer {
         
         // Store the completed path
         this.pathsData[this.currentColor] = [...this.currentPath];
+        this.unsaved = true;
         
         // Update occupied cells
         this.updateOccupiedCells();
@@ -482,10 +569,10 @@ class PathDrawer {
     
     private checkAllConnected(): void {
         // Get all unique colors of dots
-        const dotColors = new Set(this.boardData.dots.map(dot => dot.color));
+        const dotColors = this.dotIndex.palette;
         
         // Check if all colors have paths
-        const allConnected = Array.from(dotColors).every((color: string) => 
+        const allConnected = dotColors.every((color: string) => 
             this.pathsData[color] && this.pathsData[color].length >= 2
         );
         
@@ -519,7 +606,8 @@ class PathDrawer {
             })
         })
         .then(response => {
-            if (!response.ok) {
+            // 400 carries the server's reasons for rejecting the paths
+            if (!response.ok && response.status !== 400) {
                 return response.text().then(text => {
                     console.error('Error response:', text);
                     throw new Error(`HTTP error! Status: ${response.status}`);
@@ -529,9 +617,10 @@ class PathDrawer {
         })
         .then(data => {
             if (data.success) {
-                alert('Paths saved successfully!');
+                this.unsaved = false;
+                alert(data.completed ? 'Paths saved. Board solved!' : 'Paths saved successfully!');
             } else {
-                alert(`Error: ${data.error || 'Unknown error'}`);
+                alert(`Error: ${data.errors ? data.errors.join('\n') : data.error || 'Unknown error'}`);
             }
         })
         .catch(error => {
@@ -540,10 +629,49 @@ class PathDrawer {
         });
     }
     
+    private handleResync(): void {
+        // Leave a path being drawn alone; the next resync catches up
+        if (this.isDrawing) return;
+        const player = this.boardData.player;
+        const query = player ? `?user=${encodeURIComponent(player)}` : '';
+        fetch(`/play/${this.boardData.id}/snapshot/${query}`, {
+            headers: {
+                'X-Requested-With': 'XMLHttpRequest'
+            }
+        })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP error! Status: ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(snapshot => {
+            Object.assign(this.boardData, {
+                title: snapshot.title,
+                rows: snapshot.rows,
+                cols: snapshot.cols,
+                dots: snapshot.dots,
+                cells: snapshot.cells
+            });
+            this.dotIndex = DotIndex.fromBoard(this.boardData);
+            if (!this.unsaved && player) {
+                const saved = snapshot.paths[player];
+                this.pathsData = saved ? saved.paths_data : {};
+            }
+            this.initializeBoard();
+            this.updateOccupiedCells();
+            this.checkAllConnected();
+        })
+        .catch(error => {
+            console.error('Resync failed:', error);
+        });
+    }
+    
     private handleClearPaths(): void {
         if (confirm('Are you sure you want to clear all paths?')) {
             // Reset path data
             this.pathsData = {};
+            this.unsaved = true;
             
             // Reset state variables
             this.isDrawing = false;
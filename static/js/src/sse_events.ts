@@ -102,6 +102,12 @@ class SSEClient {
                 }
             });
 
+            // Sent instead of a replay when we were away too long to catch up.
+            // draw_path and connect_dots refetch their board from /play/<id>/snapshot/.
+            this.eventSource.addEventListener('resync', (event: MessageEvent) => {
+                document.dispatchEvent(new CustomEvent('sse:resync'));
+            });
+
             this.eventSource.addEventListener('heartbeat', (event: MessageEvent) => {
             });
 
@@ -129,6 +135,8 @@ document.addEventListener('DOMContentLoaded', () => {
     // Only connect if user is authenticated
     // @ts-ignore
     if (window.USER_IS_AUTHENTICATED) {
-        new SSEClient('/events/');
+        // @ts-ignore
+        const query: string = window.SSE_QUERY || '';
+        new SSEClient(query ? `/events/?${query}` : '/events/');
     }
 });